@@ -0,0 +1,134 @@
+"""
+Shared helpers for the demo benchmarks (see the Benchmarks folder of each demo),
+which load the demo scripts with a regular Python interpreter, against a lightweight
+stand-in for the cave module instead of the Cave Engine.
+
+Each benchmark declares its own stand-in as a dict mapping the stub module names
+("__init__", "math", "network"...) to the "classes" and "functions" it provides.
+Every name in it is checked against the shipped API stubs (cave/*.pyi) before it is
+installed, so a stand-in can't silently drift away from the real engine API.
+"""
+
+import glob
+import importlib.util
+import json
+import os
+import platform
+import re
+import sys
+import time
+import types
+
+def readStubSurface(path: str):
+	"""
+	Reads a .pyi file, returning its function names and, for each class, the names
+	it declares (including the ones inherited from the classes in the same file).
+	The stubs are not always valid Python (default values such as "- 1 f"), so they
+	are read line by line instead of being parsed.
+	"""
+	functions = set()
+	declared, bases = {}, {}
+	current = None
+
+	with open(path, encoding="utf-8") as f:
+		for line in f:
+			match = re.match(r"class (\w+)(?:\((.*)\))?\s*:", line)
+			if match:
+				current = match.group(1)
+				declared[current] = set()
+				bases[current] = re.findall(r"\w+", re.sub(r"\[.*?\]", "", match.group(2) or ""))
+				continue
+
+			match = re.match(r"def (\w+)", line)
+			if match:
+				functions.add(match.group(1))
+				current = None
+				continue
+
+			match = re.match(r"\t(?:def (\w+)|(\w+)\s*:)", line)
+			if match and current:
+				declared[current].add(match.group(1) or match.group(2))
+
+	def collect(name, seen):
+		if name in seen or name not in declared:
+			return set()
+		seen.add(name)
+		names = set(declared[name])
+		for base in bases[name]:
+			names |= collect(base, seen)
+		return names
+
+	return functions, {name: collect(name, set()) for name in declared}
+
+def checkStandIn(standIn: dict, stubFolder: str):
+	"""
+	Makes sure that every public name of the stand-in exists in the API stubs.
+	"""
+	problems = []
+	for module, content in standIn.items():
+		functions, classes = readStubSurface(os.path.join(stubFolder, module + ".pyi"))
+
+		for function in content["functions"]:
+			if function.__name__ not in functions:
+				problems.append(f"cave.{module}.{function.__name__}" if module != "__init__" else f"cave.{function.__name__}")
+
+		for cls in content["classes"]:
+			if cls.__name__ not in classes:
+				problems.append(f"class {cls.__name__}")
+				continue
+
+			# Both the class and the instance attributes (private ones are implementation details):
+			names = [n for n in list(vars(cls)) + list(vars(cls())) if not n.startswith("_")]
+			problems += [f"{cls.__name__}.{n}" for n in names if n not in classes[cls.__name__]]
+
+	if problems:
+		raise RuntimeError("The cave stand-in doesn't match the API stubs: " + ", ".join(problems))
+
+def installStandIn(standIn: dict, stubFolder: str):
+	"""
+	Checks the stand-in and installs it as the cave module (and its submodules), so
+	the scripts loaded next import it.
+	"""
+	checkStandIn(standIn, stubFolder)
+
+	cave = types.ModuleType("cave")
+	cave.__path__ = []
+	for content in standIn["__init__"].values():
+		for obj in content:
+			setattr(cave, obj.__name__, obj)
+
+	for name in standIn:
+		if name == "__init__":
+			continue
+		module = types.ModuleType("cave." + name)
+		for content in standIn[name].values():
+			for obj in content:
+				setattr(module, obj.__name__, obj)
+		setattr(cave, name, module)
+		sys.modules["cave." + name] = module
+	sys.modules["cave"] = cave
+	return cave
+
+def loadScript(scriptsFolder: str, name: str):
+	"""
+	Loads the demo script with the given name (saved by the editor as "name (id).py").
+	"""
+	path = glob.glob(os.path.join(scriptsFolder, f"{name} (*).py"))[0]
+	spec = importlib.util.spec_from_file_location(name, path)
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	return module
+
+def saveResults(path: str, args, results: dict):
+	"""
+	Writes the results of a benchmark to a JSON file, along with the Python version,
+	platform, time and arguments of the run, so different runs can be compared.
+	"""
+	with open(path, "w") as f:
+		json.dump({
+			"python": platform.python_version(),
+			"platform": platform.platform(),
+			"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+			"args": vars(args),
+			**results,
+		}, f, indent=2)
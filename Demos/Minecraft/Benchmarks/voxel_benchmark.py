@@ -0,0 +1,828 @@
+"""
+Micro-benchmarks for the voxel subsystem of the Minecraft demo, runnable with a
+regular Python interpreter (no Cave Engine needed):
+
+	python "Demos/Minecraft/Benchmarks/voxel_benchmark.py" --json results.json
+
+The VoxelChunk script is loaded against a lightweight stand-in for the cave module,
+which only implements what the voxel code uses (see Demos/Benchmarks/cave_stand_in.py).
+
+First, it checks (raising an AssertionError on any failure) that greedy and naive
+meshing cover exactly the visible faces found by a brute force search, that voxels,
+meshes and cached chunks decode back to the same data, the bytes reported per chunk
+(live and released) and the ChunkPipeline with and without workers. From the
+VoxelSpawner script, it also checks raycastVoxels against a brute force search,
+RegionStore overwrites and compaction, the ChunkCache rejecting stale and corrupt
+chunks and the BlockSimulation settling sand and water.
+
+Then, for each grid size and terrain profile it reports the chunks generated per second,
+the faces (quads) meshed per second, the bytes used per chunk (dense voxels, encoded
+voxels and mesh buffers) and the latency of single (and of just their mesh uploads)
+and batched edits. Use --json to save the results and compare runs.
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+SCRIPTS = os.path.join(ROOT, "Demos", "Minecraft", "Scripts")
+API_STUBS = os.path.join(ROOT, "cave")
+
+sys.path.insert(0, os.path.join(ROOT, "Demos", "Benchmarks"))
+import cave_stand_in
+
+PROFILES = ("flat", "hills", "rough", "caves")
+
+# -----------------------------------------------------------------------------
+# cave stand-in
+# -----------------------------------------------------------------------------
+
+class Vector2:
+	def __init__(self, x=0.0, y=0.0):
+		self.x, self.y = float(x), float(y)
+
+class Vector3:
+	def __init__(self, x=0.0, y=None, z=None):
+		if y is None:
+			y = z = x
+		self.x, self.y, self.z = float(x), float(y), float(z)
+
+	def __repr__(self):
+		return f"Vector3({self.x}, {self.y}, {self.z})"
+
+	def copy(self):
+		return Vector3(self.x, self.y, self.z)
+
+	def length(self):
+		return math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
+
+	def normalize(self):
+		length = self.length()
+		if length > 0.0:
+			self.x, self.y, self.z = self.x / length, self.y / length, self.z / length
+
+	def __neg__(self):
+		return Vector3(-self.x, -self.y, -self.z)
+
+	def __add__(self, other):
+		return Vector3(self.x + other.x, self.y + other.y, self.z + other.z)
+
+	def __sub__(self, other):
+		return Vector3(self.x - other.x, self.y - other.y, self.z - other.z)
+
+	def __mul__(self, scalar):
+		return Vector3(self.x * scalar, self.y * scalar, self.z * scalar)
+
+	def __truediv__(self, scalar):
+		return Vector3(self.x / scalar, self.y / scalar, self.z / scalar)
+
+class Vertex:
+	def __init__(self, pos=None, nor=None, tan=None, _uv=None):
+		self.position = pos or Vector3()
+		self.normal = nor or Vector3()
+		self.tangent = tan or Vector3()
+		self.uv = _uv or Vector2()
+
+class Mesh:
+	"""
+	Stores the vertices as the engine does (copies), so uploads cost about the same
+	amount of Python work as in the editor.
+	"""
+
+	def __init__(self):
+		self.vertices = []
+		self.indices = []
+
+	def reset(self, resetData=True):
+		self.vertices = []
+		self.indices = []
+
+	def appendVertex(self, pos, normal, tangent, uv):
+		self.vertices.append(Vertex(
+			Vector3(pos.x, pos.y, pos.z), Vector3(normal.x, normal.y, normal.z),
+			Vector3(tangent.x, tangent.y, tangent.z), Vector2(uv.x, uv.y)
+		))
+
+	def recalculateTangents(self, useUVs=False):
+		pass
+
+	def reload(self):
+		pass
+
+class AssetHandler:
+	def __init__(self, asset=None):
+		self._asset = asset
+
+	def makeWeakRef(self, asset):
+		self._asset = asset
+
+	def makeLocalNew(self):
+		self._asset = Mesh()
+
+	def get(self, markAsDirty=True):
+		return self._asset
+
+	def setAsset(self, name, searchChildren=True):
+		pass
+
+class Component:
+	pass
+
+class MeshComponent(Component):
+	def __init__(self):
+		self.mesh = AssetHandler(Mesh())
+		self.visible = True
+		self.material = AssetHandler()
+
+	def reload(self):
+		pass
+
+class RigidBodyComponent(Component):
+	def __init__(self):
+		self.mesh = AssetHandler()
+
+	def reload(self):
+		pass
+
+class TransformComponent(Component):
+	def __init__(self):
+		self.worldPosition = Vector3()
+
+	def getWorldPosition(self, updateMatrix=True):
+		return self.worldPosition.copy()
+
+	def untransformVector(self, vec):
+		return vec - self.worldPosition
+
+class Entity:
+	def __init__(self):
+		self.properties = {}
+		self._transform = TransformComponent()
+		self._components = {}
+
+	def getTransform(self):
+		return self._transform
+
+	def add(self, cmpName):
+		component = {"MeshComponent": MeshComponent, "RigidBodyComponent": RigidBodyComponent}[cmpName]()
+		self._components[cmpName] = component
+		return component
+
+	def get(self, literalName, includePython=False):
+		return self._components.get(literalName)
+
+class Scene:
+	pass
+
+class Events:
+	pass
+
+def getDeltaTime():
+	return 1.0 / 60.0
+
+def getEvents():
+	return Events()
+
+def floor(value):
+	return float(math.floor(value))
+
+def perlin(x, y=0.0, z=0.0):
+	# A cheap, deterministic value noise (the voxel code uses its own gradient noise):
+	n = math.sin(x * 12.9898 + y * 78.233 + z * 37.719) * 43758.5453
+	return (n - math.floor(n)) * 2.0 - 1.0
+
+# Names provided by the stand-in, per stub module and class:
+STAND_IN = {
+	"__init__": {
+		"classes": [Vector2, Vector3, Vertex, Mesh, AssetHandler, Component, MeshComponent,
+			RigidBodyComponent, TransformComponent, Entity, Scene, Events],
+		"functions": [getDeltaTime, getEvents],
+	},
+	"math": {"classes": [], "functions": [floor]},
+	"random": {"classes": [], "functions": [perlin]},
+	"event": {"classes": [], "functions": []},
+}
+
+def installStandIn(stubFolder: str):
+	return cave_stand_in.installStandIn(STAND_IN, stubFolder)
+
+def loadScript(name: str):
+	return cave_stand_in.loadScript(SCRIPTS, name)
+
+# -----------------------------------------------------------------------------
+# Checks
+# -----------------------------------------------------------------------------
+
+def getFaceCells(voxelChunk, buffers) -> list:
+	"""
+	Splits every quad of the buffers into the unit voxel faces it covers, returned as
+	(x, y, z, faceIndex) cells (x, y, z being the voxel the face belongs to).
+	"""
+	cells = []
+	for quad, faceIndex in enumerate(buffers.faces):
+		corners = buffers.positions[quad * 12 : quad * 12 + 12]
+		lo = [int(min(corners[axis::3])) for axis in range(3)]
+		hi = [int(max(corners[axis::3])) for axis in range(3)]
+
+		# The face lies on the far side of its voxel for the positive directions:
+		face = voxelChunk.VOXEL_FACES[faceIndex]
+		axis = face["axis"]
+		lo[axis] -= max(0, face["dir"][axis])
+		hi[axis] = lo[axis] + 1
+
+		for x in range(lo[0], hi[0]):
+			for y in range(lo[1], hi[1]):
+				for z in range(lo[2], hi[2]):
+					cells.append((x, y, z, faceIndex))
+	return cells
+
+def meshCoverageCheck(voxelChunk, voxels, neighbour) -> dict:
+	"""
+	Meshes the voxels (with the neighbour grid on their +x side) with and without
+	greedy meshing, checking that both cover exactly the visible voxel faces found by
+	a brute force search, each one once.
+	"""
+	size = voxels.gridSize
+	expected = set()
+	for x in range(size):
+		for y in range(size):
+			for z in range(size):
+				if not voxels.get(x, y, z):
+					continue
+				for faceIndex, face in enumerate(voxelChunk.VOXEL_FACES):
+					nx, ny, nz = x + face["dir"][0], y + face["dir"][1], z + face["dir"][2]
+					if voxels.inBounds(nx, ny, nz):
+						hidden = voxels.get(nx, ny, nz)
+					else:
+						hidden = nx == size and neighbour.get(0, ny, nz)
+					if not hidden:
+						expected.add((x, y, z, faceIndex))
+
+	quads = {}
+	for greedy in (True, False):
+		mesher = voxelChunk.VoxelMesher(voxels, 16, greedy, {(1, 0): neighbour})
+		mesher.update()
+		buffers = mesher.getBuffers()
+		cells = getFaceCells(voxelChunk, buffers)
+
+		key = "greedy" if greedy else "naive"
+		if len(cells) != len(set(cells)):
+			raise AssertionError(f"The {key} mesh covers some voxel faces more than once.")
+		if set(cells) != expected:
+			raise AssertionError(f"The {key} mesh covers {len(cells)} voxel faces instead of the {len(expected)} visible ones.")
+		quads[key] = buffers.getQuadCount()
+
+	return {"visibleFaces": len(expected), "greedyQuads": quads["greedy"], "naiveQuads": quads["naive"]}
+
+def encodingCheck(voxelChunk, voxels) -> dict:
+	"""
+	Round trips the voxels through VoxelGrid.encode, a mesh through QuadBuffers.encode
+	and a whole chunk through encodeCache, checking that everything comes back the same.
+	"""
+	decoded = voxelChunk.VoxelGrid.decode(voxels.encode())
+	if decoded.data != voxels.data or decoded.solidCount != voxels.solidCount:
+		raise AssertionError("The voxels were decoded wrong.")
+
+	mesher = voxelChunk.VoxelMesher(voxels)
+	mesher.update()
+	buffers = mesher.getBuffers()
+	decodedBuffers, offset = voxelChunk.QuadBuffers.decode(b"pad" + buffers.encode(), 3)
+	for name in ("positions", "uvs", "faces"):
+		if getattr(decodedBuffers, name) != getattr(buffers, name):
+			raise AssertionError(f"The mesh {name} were decoded wrong.")
+
+	chunk = makeChunk(voxelChunk, voxels.copy())
+	cached = chunk.encodeCache()
+	if chunk.decodeCache(memoryview(cached), 1) is not None:
+		raise AssertionError("A chunk cached at LOD 0 was decoded at LOD 1.")
+
+	decodedVoxels, connectivity, (lod, lodVoxels, decodedMesher, collider), generated = chunk.decodeCache(memoryview(cached), 0)
+	if decodedVoxels.data != voxels.data or decodedMesher.getBuffers().encode() != buffers.encode():
+		raise AssertionError("The cached chunk was decoded wrong.")
+	return {"encodedBytes": len(voxels.encode()), "cacheBytes": len(cached)}
+
+def memoryCheck(voxelChunk, voxels) -> dict:
+	"""
+	Checks the bytes reported by VoxelChunk.getMemoryUsage against its voxels and mesh
+	buffers, and that releasing the chunk only keeps its encoded voxels, which rebuild
+	the same chunk.
+	"""
+	chunk = makeChunk(voxelChunk, voxels.copy())
+	meshBytes = sum(buffers.getMemoryUsage() for buffers in chunk.mesher.sections.values())
+	expected = voxels.getMemoryUsage() + meshBytes + chunk.collider.buffers.getMemoryUsage()
+	usage = chunk.getMemoryUsage()
+	if usage != expected:
+		raise AssertionError(f"The chunk reports {usage} bytes instead of {expected}.")
+
+	chunk.release()
+	released = chunk.getMemoryUsage()
+	if chunk.isReady() or released != len(voxels.encode()):
+		raise AssertionError(f"The released chunk keeps {released} bytes instead of its {len(voxels.encode())} encoded voxels.")
+
+	chunk.applyChunkData(chunk.buildReleasedData())
+	if chunk.voxels.data != voxels.data or chunk.getMemoryUsage() != usage:
+		raise AssertionError("The released chunk was rebuilt wrong.")
+	return {"bytes": usage, "releasedBytes": released}
+
+def pipelineCheck(voxelSpawner, voxelChunk, gridSize: int) -> dict:
+	"""
+	Runs chunk builds through a ChunkPipeline without workers, which must only run
+	them inside update (in submission order, skipping the replaced ones), and through
+	one with workers, which must hand back the same chunks.
+	"""
+	chunk = makeChunk(voxelChunk, voxelChunk.VoxelGrid(gridSize))
+	built = {}
+
+	for workers in (0, 2):
+		pipeline = voxelSpawner.ChunkPipeline(workers)
+		order = []
+		for key in ("a", "b", "a"):
+			# A second job with the same key replaces the first one:
+			pipeline.submit(key, lambda key=key: (key, chunk.buildChunkData()), lambda result: order.append(result))
+
+		if workers == 0 and (order or pipeline.getPendingCount() != 2):
+			raise AssertionError("The synchronous pipeline didn't wait for update to run its jobs.")
+		pipeline.flush()
+		pipeline.shutdown()
+
+		if sorted(key for key, data in order) != ["a", "b"] or (workers == 0 and [key for key, data in order] != ["b", "a"]):
+			raise AssertionError(f"The pipeline with {workers} workers completed {[key for key, data in order]} instead of b and a.")
+		built[workers] = [data[0].data for key, data in sorted(order, key=lambda result: result[0])]
+
+	if built[0] != built[2]:
+		raise AssertionError("The pipeline workers built other voxels than the synchronous pipeline.")
+	return {"jobs": len(built[0])}
+
+def raycastCheck(voxelSpawner, voxelChunk, gridSize: int, rays: int, seed: int = 0) -> dict:
+	"""
+	Casts random rays through a 2x2 chunk world with VoxelSpawner.raycastVoxels,
+	checking every hit against a brute force intersection of the ray with the boxes
+	of all the solid voxels in reach.
+	"""
+	rng = random.Random(seed)
+	chunks = {}
+	for cx in range(2):
+		for cz in range(2):
+			chunks[(cx, cz)] = makeChunk(voxelChunk, generate(voxelChunk, "caves", gridSize, cx * 2 + cz, seed))
+
+	# Only what raycastVoxels needs from the spawner (the chunks are found by coordinates):
+	spawner = voxelSpawner.VoxelSpawner()
+	spawner.gridSize = gridSize
+	spawner.getChunkAt = chunks.get
+
+	def bruteForce(origin, direction, maxDistance):
+		"""
+		Returns the (near, far, voxel, normals) of every solid voxel box the ray touches,
+		near and far being the distances it enters and leaves the box at and normals the
+		faces it may enter through (more than one if it enters through an edge or corner).
+		"""
+		boxes = []
+		lo = [int(math.floor(origin[axis] - maxDistance)) for axis in range(3)]
+		hi = [int(math.floor(origin[axis] + maxDistance)) + 1 for axis in range(3)]
+		for x in range(max(lo[0], 0), min(hi[0], gridSize * 2)):
+			for z in range(max(lo[2], 0), min(hi[2], gridSize * 2)):
+				for y in range(max(lo[1], 0), min(hi[1], gridSize)):
+					if not chunks[(x // gridSize, z // gridSize)].voxels.get(x % gridSize, y, z % gridSize):
+						continue
+
+					# Slab test, keeping the distance the ray enters each slab at:
+					near, far, enter = 0.0, maxDistance, [-math.inf] * 3
+					for axis, start in enumerate((x, y, z)):
+						if direction[axis] == 0.0:
+							if not start <= origin[axis] < start + 1:
+								far = -math.inf
+							continue
+						t0 = (start - origin[axis]) / direction[axis]
+						t1 = (start + 1 - origin[axis]) / direction[axis]
+						enter[axis] = min(t0, t1)
+						near, far = max(near, enter[axis]), min(far, max(t0, t1))
+					if near > far + 1e-9:
+						continue
+
+					normals = [(0, 0, 0)]
+					if near > 0.0:
+						normals = [
+							tuple((-1 if direction[axis] > 0 else 1) if i == axis else 0 for i in range(3))
+							for axis in range(3) if near - enter[axis] < 1e-9
+						]
+					boxes.append((near, far, (x, y, z), normals))
+		return boxes
+
+	hits, ties = 0, 0
+	for i in range(rays):
+		origin = (rng.uniform(0, gridSize * 2), rng.uniform(-2, gridSize + 2), rng.uniform(0, gridSize * 2))
+		direction = [rng.gauss(0, 1) for axis in range(3)]
+		if i % 4 == 0:
+			# Axis aligned and diagonal rays from voxel centers, which go through edges and corners:
+			origin = tuple(math.floor(value) + 0.5 for value in origin)
+			direction = [rng.choice((-1, 0, 1)) for axis in range(3)]
+			direction[rng.randrange(3)] = rng.choice((-1, 1))
+		length = math.sqrt(sum(d * d for d in direction))
+		direction = tuple(d / length for d in direction)
+
+		hit = spawner.raycastVoxels(Vector3(*origin), Vector3(*direction), 8.0)
+		boxes = bruteForce(origin, direction, 8.0)
+
+		# The boxes the ray goes through (not only along one of their edges) can't be missed:
+		crossed = [near for near, far, voxel, normals in boxes if far - near > 1e-9]
+		first = min(crossed) if crossed else None
+		if hit is None:
+			if first is not None:
+				raise AssertionError(f"The ray from {origin} along {direction} missed the voxels at {first}.")
+			continue
+
+		hits += 1
+		if first is not None and hit.distance > first + 1e-6:
+			raise AssertionError(f"The ray from {origin} along {direction} hit at {hit.distance} instead of {first}.")
+
+		# Rays that go exactly through an edge or corner may hit any of its voxels, through any of its faces:
+		atHit = [box for box in boxes if abs(box[0] - hit.distance) < 1e-6]
+		if not any(voxel == hit.block and hit.normal in normals for near, far, voxel, normals in atHit):
+			raise AssertionError(f"The ray from {origin} along {direction} hit {hit.block} {hit.normal} at {hit.distance}, which it doesn't enter there.")
+		if len(atHit) > 1 or any(len(normals) > 1 or far - near <= 1e-9 for near, far, voxel, normals in atHit):
+			ties += 1
+
+		if hit.blockType != chunks[(hit.block[0] // gridSize, hit.block[2] // gridSize)].voxels.get(hit.block[0] % gridSize, hit.block[1], hit.block[2] % gridSize):
+			raise AssertionError(f"The ray hit {hit.block} with the wrong block type.")
+
+	return {"rays": rays, "hits": hits, "ties": ties}
+
+def regionStoreCheck(voxelSpawner, saves: int, seed: int = 0) -> dict:
+	"""
+	Saves chunk data of random sizes over and over into a RegionStore (small regions,
+	compacted as soon as possible), checking that every chunk always loads back its
+	last data, also from a new store reading the same files, and that compaction
+	keeps the files from growing past twice the data they hold.
+	"""
+	rng = random.Random(seed)
+	saved = {}
+	with tempfile.TemporaryDirectory() as folder:
+		store = voxelSpawner.RegionStore(folder, 4)
+		store.compactBytes = 0
+
+		for i in range(saves):
+			coords = (rng.randrange(-6, 6), rng.randrange(-6, 6))
+			saved[coords] = bytes(rng.randrange(256) for j in range(rng.randrange(1, 300)))
+			store.save(coords, saved[coords])
+
+			region, slot = store.locate(coords)
+			used = sum(length for offset, length in store.getTable(region))
+			fileSize = os.path.getsize(store.getRegionPath(region))
+			if fileSize - store.getHeaderSize() > 2 * used:
+				raise AssertionError(f"The region file holds {fileSize} bytes for {used} bytes of chunks.")
+
+		for reader in (store, voxelSpawner.RegionStore(folder, 4)):
+			for x in range(-6, 6):
+				for z in range(-6, 6):
+					if reader.load((x, z)) != saved.get((x, z)) or reader.has((x, z)) != ((x, z) in saved):
+						raise AssertionError(f"The chunk {(x, z)} was loaded wrong from the regions.")
+	return {"saves": saves, "chunks": len(saved)}
+
+def chunkCacheCheck(voxelSpawner) -> dict:
+	"""
+	Checks that the ChunkCache rejects cached chunks saved for another world or with
+	a corrupt checksum, drops the saves started before an invalidation and never
+	raises on disk errors.
+	"""
+	data = bytes(range(256)) * 4
+	with tempfile.TemporaryDirectory() as folder:
+		cache = voxelSpawner.ChunkCache(folder, 1, 16)
+		if not cache.save((0, 0), 0, data) or cache.load((0, 0), 0, bytes) != data:
+			raise AssertionError("The cached chunk wasn't loaded back.")
+		if voxelSpawner.ChunkCache(folder, 2, 16).load((0, 0), 0, bytes) is not None:
+			raise AssertionError("A chunk cached for another world seed was loaded.")
+
+		# Flips a byte of the data, after the header:
+		path = cache.getPath((0, 0), 0)
+		with open(path, "r+b") as f:
+			f.seek(-1, os.SEEK_END)
+			last = f.read(1)[0]
+			f.seek(-1, os.SEEK_END)
+			f.write(bytes([last ^ 0xFF]))
+		if cache.load((0, 0), 0, bytes) is not None:
+			raise AssertionError("A cached chunk with a wrong checksum was loaded.")
+
+		generation = cache.getGeneration((1, 0))
+		cache.invalidate((1, 0), 0)
+		if cache.save((1, 0), 0, data, generation) or cache.load((1, 0), 0, bytes) is not None:
+			raise AssertionError("A chunk saved before its invalidation was cached.")
+		if not cache.save((1, 0), 0, data, cache.getGeneration((1, 0))):
+			raise AssertionError("A chunk saved after its invalidation wasn't cached.")
+
+		# A folder that can't be created (inside a file):
+		blocked = voxelSpawner.ChunkCache(os.path.join(path, "cache"), 1, 16)
+		if blocked.save((0, 0), 0, data) or blocked.load((0, 0), 0, bytes) is not None:
+			raise AssertionError("A cache without a usable folder saved or loaded a chunk.")
+	return {"hits": cache.hits, "misses": cache.misses}
+
+def simulationCheck(voxelSpawner, voxelChunk, gridSize: int, maxTicks: int = 500, seed: int = 0) -> dict:
+	"""
+	Drops water over rough terrain in a 2x2 chunk world, then sand (most of it over
+	the water), running the BlockSimulation until no cell is active after each. No
+	water may be left over an empty voxel and every flowing water block must be fed
+	by a stronger one beside or above it. Every sand block must be resting on
+	something solid, none lost and none left over the water.
+	"""
+	sim = voxelSpawner.BlockSimulation
+	rng = random.Random(seed)
+	grids = {}
+	for cx in range(2):
+		for cz in range(2):
+			grids[(cx, cz)] = generate(voxelChunk, "rough", gridSize, cx * 2 + cz, seed)
+
+	def getVoxel(x, y, z):
+		voxels = grids.get((x // gridSize, z // gridSize))
+		if voxels is None or not 0 <= y < gridSize:
+			return -1
+		return voxels.get(x % gridSize, y, z % gridSize)
+
+	def setVoxels(edits):
+		for x, y, z, value in edits:
+			grids[(x // gridSize, z // gridSize)].set(x % gridSize, y, z % gridSize, value)
+		simulation.activateSpans([(x, z, y, y + 1) for x, y, z, value in edits])
+
+	simulation = sim(gridSize, getVoxel, grids.get)
+
+	def countSand():
+		return sum(voxels.data.count(sim.SAND) for voxels in grids.values())
+
+	def settle():
+		ticks = 0
+		while simulation.getActiveCount():
+			ticks += 1
+			if ticks > maxTicks:
+				raise AssertionError(f"The blocks didn't settle in {maxTicks} ticks.")
+			setVoxels(simulation.tick(256, grids))
+		return ticks
+
+	def checkBlocks(checkFlow: bool) -> int:
+		water = 0
+		for x in range(gridSize * 2):
+			for z in range(gridSize * 2):
+				for y in range(gridSize):
+					block = getVoxel(x, y, z)
+					below = getVoxel(x, y - 1, z)
+					if block == sim.SAND and (below == 0 or simulation.getWaterLevel(below)):
+						raise AssertionError(f"The sand at {(x, y, z)} is floating.")
+
+					level = simulation.getWaterLevel(block)
+					if not level:
+						continue
+					water += 1
+					if below == 0:
+						raise AssertionError(f"The water at {(x, y, z)} is floating.")
+
+					# Flowing water falls from any water above it or spreads from stronger water beside it:
+					fed = simulation.getWaterLevel(getVoxel(x, y + 1, z)) or any(
+						simulation.getWaterLevel(getVoxel(x + dx, y, z + dz)) > level for dx, dz in sim.SIDES
+					)
+					if checkFlow and block != sim.WATER and not fed:
+						raise AssertionError(f"The flowing water at {(x, y, z)} has no stronger water around it.")
+		return water
+
+	# First water over the terrain:
+	setVoxels([(rng.randrange(gridSize * 2), gridSize - 1, rng.randrange(gridSize * 2), sim.WATER) for i in range(gridSize)])
+	ticks = settle()
+	water = checkBlocks(True)
+
+	# Then sand, some of it over the water, which it must sink through (the water
+	# never drains, so the displaced water may be left without a stronger one around):
+	edits = {}
+	for x in range(gridSize * 2):
+		for z in range(gridSize * 2):
+			top = max((y for y in range(gridSize) if getVoxel(x, y, z)), default=gridSize - 1)
+			if top < gridSize - 1 and rng.random() < (0.5 if simulation.getWaterLevel(getVoxel(x, top, z)) else 0.05):
+				edits[(x, z)] = (x, gridSize - 1, z, sim.SAND)
+	sand = countSand() + len(edits)
+	setVoxels(edits.values())
+	ticks += settle()
+
+	if countSand() != sand:
+		raise AssertionError(f"The simulation left {countSand()} sand blocks out of {sand}.")
+	checkBlocks(False)
+
+	return {"ticks": ticks, "sand": sand, "water": water}
+
+# -----------------------------------------------------------------------------
+# Benchmarks
+# -----------------------------------------------------------------------------
+
+def generate(voxelChunk, profile: str, gridSize: int, index: int, seed: int = 0):
+	"""
+	Builds the voxels of the chunk number index with the given terrain profile.
+	"""
+	voxels = voxelChunk.VoxelGrid(gridSize)
+	rng = random.Random(seed * 7919 + index)
+
+	if profile == "flat":
+		voxels.fillFromHeights([gridSize // 2] * (gridSize * gridSize))
+	elif profile == "hills":
+		voxelChunk.generateTerrain(voxels, index, 0, seed)
+	elif profile == "rough":
+		voxels.fillFromHeights([rng.randrange(1, gridSize + 1) for i in range(gridSize * gridSize)])
+	elif profile == "caves":
+		voxelChunk.generateTerrain(voxels, index, 0, seed)
+		for i in range(len(voxels.data) // 4):
+			x, y, z = rng.randrange(gridSize), rng.randrange(gridSize), rng.randrange(gridSize)
+			voxels.set(x, y, z, 0)
+	else:
+		raise ValueError(f"Unknown terrain profile: {profile}")
+	return voxels
+
+def timed(function, *args):
+	startTime = time.perf_counter()
+	result = function(*args)
+	return result, time.perf_counter() - startTime
+
+def makeChunk(voxelChunk, voxels, greedy: bool = True):
+	"""
+	Creates a real VoxelChunk component (on a stand-in Entity) holding the voxels.
+	"""
+	entity = Entity()
+	entity.properties.update({"gridSize": voxels.gridSize, "asyncBuild": True})
+
+	chunk = voxelChunk.VoxelChunk()
+	chunk.entity = entity
+	chunk.greedyMeshing = greedy
+	chunk.start(Scene())
+	chunk.applyChunkData((voxels, voxelChunk.VoxelConnectivity(voxels), chunk.buildLodData(0, None, voxels), True))
+	return chunk
+
+def benchEdits(chunk, rng, count: int):
+	"""
+	Returns the average latency (in ms) of single block edits (remesh and upload
+	included) and of just their mesh uploads, of a batched 4x4x4 box edit and of
+	the collider rebuild after it.
+	"""
+	size = chunk.gridSize
+
+	# Times the uploads of the single edits apart:
+	uploads = []
+	uploadMesh = chunk.uploadMesh
+	chunk.uploadMesh = lambda keys=None: uploads.append(timed(uploadMesh, keys)[1])
+
+	single = 0.0
+	for i in range(count):
+		pos = Vector3(rng.randrange(size), rng.randrange(size), rng.randrange(size))
+		value = 0 if chunk.getBlock(pos, True) else 1
+		single += timed(chunk.setBlock, value, pos, True)[1]
+	chunk.uploadMesh = uploadMesh
+
+	batch, collider = 0.0, 0.0
+	for i in range(count):
+		x, y, z = rng.randrange(size - 4), rng.randrange(size - 4), rng.randrange(size - 4)
+		spans = [(x + dx, z + dz, y, y + 4, i % 2) for dx in range(4) for dz in range(4)]
+
+		startTime = time.perf_counter()
+		chunk.editSpans(spans)
+		chunk.flushEdits()
+		batch += time.perf_counter() - startTime
+
+		collider += timed(chunk.collider.update)[1]
+
+	return single / count * 1000.0, sum(uploads) / count * 1000.0, batch / count * 1000.0, collider / count * 1000.0
+
+def runCase(voxelChunk, gridSize: int, profile: str, chunks: int, edits: int) -> dict:
+	rng = random.Random(gridSize)
+
+	grids, genTime = [], 0.0
+	for i in range(chunks):
+		voxels, elapsed = timed(generate, voxelChunk, profile, gridSize, i)
+		grids.append(voxels)
+		genTime += elapsed
+
+	result = {"gridSize": gridSize, "profile": profile, "chunks": chunks}
+	result["generateChunksPerSec"] = chunks / genTime
+
+	for greedy in (True, False):
+		faces, meshTime, uploadTime, meshBytes = 0, 0.0, 0.0, 0
+		for voxels in grids:
+			mesher = voxelChunk.VoxelMesher(voxels, 16, greedy)
+			elapsed = timed(mesher.update)[1]
+			buffers, concat = timed(mesher.getBuffers)
+			meshTime += elapsed + concat
+
+			faces += buffers.getQuadCount()
+			meshBytes += sum(len(a) * a.itemsize for a in (buffers.positions, buffers.uvs, buffers.faces))
+			uploadTime += timed(buffers.upload, Mesh())[1]
+
+		key = "greedy" if greedy else "naive"
+		result[key] = {
+			"facesPerChunk": faces / chunks,
+			"facesPerSec": faces / meshTime if meshTime > 0.0 else 0.0,
+			"meshChunksPerSec": chunks / meshTime,
+			"uploadMsPerChunk": uploadTime / chunks * 1000.0,
+			"meshBytesPerChunk": meshBytes / chunks,
+		}
+
+	colliderTime, boxes = 0.0, 0
+	for voxels in grids:
+		collider = voxelChunk.VoxelCollider(voxels)
+		colliderTime += timed(collider.update)[1]
+		boxes += len(collider.boxes)
+	result["colliderMsPerChunk"] = colliderTime / chunks * 1000.0
+	result["colliderBoxesPerChunk"] = boxes / chunks
+
+	connectivityTime = 0.0
+	for voxels in grids:
+		connectivityTime += timed(voxelChunk.VoxelConnectivity(voxels).update)[1]
+	result["connectivityMsPerChunk"] = connectivityTime / chunks * 1000.0
+
+	result["denseBytesPerChunk"] = voxelChunk.VoxelGrid.bytesPerChunk(gridSize)
+	result["encodedBytesPerChunk"] = sum(len(voxels.encode()) for voxels in grids) / chunks
+
+	chunk = makeChunk(voxelChunk, grids[0])
+	cached = chunk.encodeCache()
+	result["cacheBytesPerChunk"] = len(cached)
+	result["cacheLoadMs"] = timed(chunk.decodeCache, memoryview(cached), 0)[1] * 1000.0
+
+	single, upload, batch, collider = benchEdits(chunk, rng, edits)
+	result["editMs"] = single
+	result["editUploadMs"] = upload
+	result["batchEditMs"] = batch
+	result["colliderRebuildMs"] = collider
+	return result
+
+def printResult(result: dict):
+	greedy, naive = result["greedy"], result["naive"]
+	print(
+		f"{result['gridSize']:>4} {result['profile']:<6}"
+		f" gen {result['generateChunksPerSec']:8.1f} ch/s"
+		f" | greedy {greedy['facesPerSec']:9.0f} f/s {greedy['facesPerChunk']:7.0f} f/ch"
+		f" | naive {naive['facesPerSec']:9.0f} f/s {naive['facesPerChunk']:7.0f} f/ch"
+		f" | upload {greedy['uploadMsPerChunk']:6.2f} ms"
+		f" | bytes {result['denseBytesPerChunk']:6d} dense {result['encodedBytesPerChunk']:7.0f} enc {greedy['meshBytesPerChunk']:8.0f} mesh"
+		f" | edit {result['editMs']:6.2f} ms (upload {result['editUploadMs']:5.2f} ms) batch {result['batchEditMs']:6.2f} ms collider {result['colliderRebuildMs']:6.2f} ms"
+		f" | connectivity {result['connectivityMsPerChunk']:6.2f} ms"
+		f" | cache {result['cacheBytesPerChunk']:8d} bytes load {result['cacheLoadMs']:6.2f} ms"
+	)
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Voxel subsystem micro-benchmarks (no engine needed).")
+	parser.add_argument("--sizes", default="16,32", help="Comma separated grid sizes.")
+	parser.add_argument("--profiles", default=",".join(PROFILES), help="Comma separated terrain profiles: " + ", ".join(PROFILES))
+	parser.add_argument("--chunks", type=int, default=4, help="Chunks generated and meshed per case.")
+	parser.add_argument("--edits", type=int, default=20, help="Edits timed per case.")
+	parser.add_argument("--rays", type=int, default=200, help="Random rays checked against a brute force search.")
+	parser.add_argument("--json", help="Writes the results to this JSON file.")
+	args = parser.parse_args(argv)
+
+	installStandIn(API_STUBS)
+	voxelChunk = loadScript("VoxelChunk")
+	voxelSpawner = loadScript("VoxelSpawner")
+	checkSize = min(int(s) for s in args.sizes.split(","))
+
+	checks = {"mesh": [], "encoding": [], "memory": []}
+	for profile in args.profiles.split(","):
+		voxels = generate(voxelChunk, profile.strip(), checkSize, 0)
+		neighbour = generate(voxelChunk, profile.strip(), checkSize, 1)
+
+		mesh = meshCoverageCheck(voxelChunk, voxels, neighbour)
+		encoding = encodingCheck(voxelChunk, voxels)
+		memory = memoryCheck(voxelChunk, voxels)
+		checks["mesh"].append(mesh)
+		checks["encoding"].append(encoding)
+		checks["memory"].append(memory)
+		print(
+			f"checks: {checkSize:>4} {profile.strip():<6}"
+			f" | mesh OK: {mesh['visibleFaces']} faces, {mesh['greedyQuads']} greedy / {mesh['naiveQuads']} naive quads"
+			f" | encoding OK: {encoding['encodedBytes']} bytes, cache {encoding['cacheBytes']} bytes"
+			f" | memory OK: {memory['bytes']} bytes, {memory['releasedBytes']} released"
+		)
+
+	checks["pipeline"] = pipelineCheck(voxelSpawner, voxelChunk, checkSize)
+	print(f"checks: pipeline OK: {checks['pipeline']['jobs']} jobs, same chunks with and without workers")
+
+	checks["raycast"] = raycastCheck(voxelSpawner, voxelChunk, checkSize, args.rays)
+	print(f"checks: raycast OK: {checks['raycast']['rays']} rays, {checks['raycast']['hits']} hits ({checks['raycast']['ties']} through edges)")
+
+	checks["regions"] = regionStoreCheck(voxelSpawner, 500)
+	print(f"checks: regions OK: {checks['regions']['saves']} saves of {checks['regions']['chunks']} chunks")
+
+	checks["cache"] = chunkCacheCheck(voxelSpawner)
+	print(f"checks: chunk cache OK: {checks['cache']['hits']} hits, {checks['cache']['misses']} misses")
+
+	checks["simulation"] = simulationCheck(voxelSpawner, voxelChunk, checkSize)
+	print(
+		f"checks: simulation OK: {checks['simulation']['sand']} sand blocks and {checks['simulation']['water']} water blocks"
+		f" settled in {checks['simulation']['ticks']} ticks"
+	)
+
+	results = []
+	for size in [int(s) for s in args.sizes.split(",")]:
+		for profile in args.profiles.split(","):
+			result = runCase(voxelChunk, size, profile.strip(), args.chunks, args.edits)
+			printResult(result)
+			results.append(result)
+
+	if args.json:
+		cave_stand_in.saveResults(args.json, args, {"checks": checks, "results": results})
+	return results
+
+if __name__ == "__main__":
+	main()
@@ -1,123 +1,1533 @@
 import cave
+import math
+import random
+import re
+import struct
+import zlib
+from array import array
+
+class GradientNoise:
+	"""
+	Deterministic 2D gradient (Perlin) noise written in pure Python, so a whole
+	chunk can be generated without calling cave.random.perlin once per column.
+
+	The same seed always produces the same terrain and, unlike the engine's noise,
+	it works for negative coordinates as well.
+	"""
+
+	GRADIENTS = ((1, 1), (-1, 1), (1, -1), (-1, -1), (1, 0), (-1, 0), (0, 1), (0, -1))
+
+	_instances = {}
+
+	def __init__(self, seed: int = 0):
+		perm = list(range(256))
+		random.Random(seed).shuffle(perm)
+		self.perm = perm + perm
+
+	@classmethod
+	def get(cls, seed: int = 0) -> "GradientNoise":
+		"""
+		Returns a shared noise instance for the given seed.
+		"""
+		if seed not in cls._instances:
+			cls._instances[seed] = cls(seed)
+		return cls._instances[seed]
+
+	@staticmethod
+	def _lattice(coord: float):
+		"""
+		Returns the lattice cell, the offset inside it and the faded offset.
+		"""
+		cell = math.floor(coord)
+		f = coord - cell
+		return cell & 255, f, f * f * f * (f * (f * 6 - 15) + 10)
+
+	def noise(self, x: float, y: float) -> float:
+		"""
+		Samples the noise at a single point. The result is roughly in [-1, 1].
+		"""
+		return self.grid((x,), (y,))[0]
+
+	def grid(self, xs, ys) -> list:
+		"""
+		Samples the noise for every (x, y) combination of the given coordinates and
+		returns a flat list where result[i * len(ys) + j] is the sample at (xs[i], ys[j]).
+		The lattice terms of each row and column are computed only once.
+		"""
+		perm = self.perm
+		grads = self.GRADIENTS
+		yTerms = [self._lattice(y) for y in ys]
+		result = []
+
+		for xi, xf, u in map(self._lattice, xs):
+			a, b = perm[xi], perm[xi + 1]
+			xf1 = xf - 1
+
+			for yi, yf, v in yTerms:
+				yf1 = yf - 1
+				g00 = grads[perm[a + yi] & 7]
+				g10 = grads[perm[b + yi] & 7]
+				g01 = grads[perm[a + yi + 1] & 7]
+				g11 = grads[perm[b + yi + 1] & 7]
+
+				n00 = g00[0] * xf  + g00[1] * yf
+				n10 = g10[0] * xf1 + g10[1] * yf
+				n01 = g01[0] * xf  + g01[1] * yf1
+				n11 = g11[0] * xf1 + g11[1] * yf1
+
+				nx0 = n00 + u * (n10 - n00)
+				nx1 = n01 + u * (n11 - n01)
+				result.append(nx0 + v * (nx1 - nx0))
+		return result
+
+class VoxelGrid:
+	"""
+	Compact storage for the voxels of a cubic chunk. Each voxel is a single byte
+	(the block type, 0 means empty) inside one contiguous bytearray, instead of
+	a Python int boxed inside three levels of nested lists.
+
+	The memory is laid out as [x][z][y], so every vertical (x, z) column is a
+	contiguous slice and can be filled or read at once.
+
+	For storage and network transfer, the grid can be encoded into a compact
+	format (see encode) with a block type palette and run-length encoded columns.
+	"""
+
+	# Version of the encoded format and its flags (uniform grid, raw palette indices):
+	ENCODING_VERSION = 1
+	ENCODING_UNIFORM = 1
+	ENCODING_RAW = 2
+
+	# Matches a run of equal bytes:
+	RUN_PATTERN = re.compile(rb"(.)\1*", re.DOTALL)
+
+	def __init__(self, gridSize: int):
+		self.gridSize = gridSize
+		self.data = bytearray(gridSize * gridSize * gridSize)
+
+		# Index offset of one step along the x, y and z axes:
+		self.strides = (gridSize * gridSize, 1, gridSize)
+
+		# How many voxels are not empty, so fully empty/solid grids are detected in O(1):
+		self.solidCount = 0
+
+	@staticmethod
+	def bytesPerChunk(gridSize: int) -> int:
+		"""
+		Memory (in bytes) used by the voxel data of a chunk with this grid size.
+		"""
+		return gridSize * gridSize * gridSize
+
+	def getMemoryUsage(self) -> int:
+		return len(self.data)
+
+	def index(self, x: int, y: int, z: int) -> int:
+		return (x * self.gridSize + z) * self.gridSize + y
+
+	def columnIndex(self, x: int, z: int) -> int:
+		"""
+		Index of the bottom voxel (y = 0) of the given column.
+		"""
+		return (x * self.gridSize + z) * self.gridSize
+
+	def inBounds(self, x: int, y: int, z: int) -> bool:
+		size = self.gridSize
+		return 0 <= x < size and 0 <= y < size and 0 <= z < size
+
+	def get(self, x: int, y: int, z: int) -> int:
+		return self.data[(x * self.gridSize + z) * self.gridSize + y]
+
+	def set(self, x: int, y: int, z: int, value: int):
+		idx = (x * self.gridSize + z) * self.gridSize + y
+		if (self.data[idx] == 0) != (value == 0):
+			self.solidCount += 1 if value else -1
+		self.data[idx] = value
+
+	def isEmpty(self) -> bool:
+		return self.solidCount == 0
+
+	def isFull(self) -> bool:
+		return self.solidCount == len(self.data)
+
+	def countSolid(self, lo, hi) -> int:
+		"""
+		Counts the non empty voxels inside the [lo, hi) box, one column slice at a time.
+		"""
+		size = self.gridSize
+		data = self.data
+		height = hi[1] - lo[1]
+		empty = 0
+
+		for x in range(lo[0], hi[0]):
+			for z in range(lo[2], hi[2]):
+				base = (x * size + z) * size
+				empty += data.count(0, base + lo[1], base + hi[1])
+		return (hi[0] - lo[0]) * (hi[2] - lo[2]) * height - empty
+
+	def fillColumn(self, x: int, z: int, height: int, value: int = 1):
+		"""
+		Sets the voxels [0, height) of the column to value and the rest to empty.
+		"""
+		size = self.gridSize
+		height = max(0, min(size, height))
+		base = (x * size + z) * size
+
+		self.solidCount -= size - self.data.count(0, base, base + size)
+		self.data[base : base + size] = bytes((value,)) * height + bytes(size - height)
+		self.solidCount += height if value else 0
+
+	def fillSpan(self, x: int, z: int, minY: int, maxY: int, value: int, replace: int = None) -> bool:
+		"""
+		Sets the voxels [minY, maxY) of the column to value or, if replace is set, only
+		the ones of that block type. Returns True if any voxel changed.
+		"""
+		start = (x * self.gridSize + z) * self.gridSize
+		old = self.data[start + minY : start + maxY]
+		if replace is None:
+			new = bytes((value,)) * len(old)
+		else:
+			new = old.replace(bytes((replace,)), bytes((value,)))
+
+		if new == old:
+			return False
+
+		self.solidCount += old.count(0) - new.count(0)
+		self.data[start + minY : start + maxY] = new
+		return True
+
+	def fillFromHeights(self, heights, value: int = 1):
+		"""
+		Fills the entire grid from a heightmap, where heights[x * gridSize + z] is
+		the amount of solid voxels in the (x, z) column. Since the columns are
+		contiguous, the whole grid is written with a single slice assignment.
+		"""
+		size = self.gridSize
+		columns = [bytes((value,)) * h + bytes(size - h) for h in range(size + 1)]
+		heights = [max(0, min(size, h)) for h in heights]
+
+		self.data[:] = b"".join([columns[h] for h in heights])
+		self.solidCount = sum(heights) if value else 0
+
+	def copy(self) -> "VoxelGrid":
+		other = VoxelGrid(self.gridSize)
+		other.data[:] = self.data
+		other.solidCount = self.solidCount
+		return other
+
+	def downsample(self, factor: int) -> "VoxelGrid":
+		"""
+		Returns a grid factor times smaller along each axis (used for the distant chunk
+		LODs), where each voxel takes the value of the voxel at the center of the
+		factor³ block it covers. Since the columns are contiguous, every coarse column
+		is a single strided slice of a fine one.
+		"""
+		size = self.gridSize
+		half = factor // 2
+		coarse = VoxelGrid(size // factor)
+
+		columns = []
+		for x in range(half, size, factor):
+			for z in range(half, size, factor):
+				base = (x * size + z) * size
+				columns.append(self.data[base + half : base + size : factor])
+
+		coarse.data[:] = b"".join(columns)
+		coarse.solidCount = len(coarse.data) - coarse.data.count(0)
+		return coarse
+
+	def encode(self) -> bytes:
+		"""
+		Encodes the grid into a compact format, used both to save chunks to the disk
+		and to send them over the network:
+
+		- Header: version (u8), gridSize (u16), flags (u8) and palette size (u8).
+		- Palette: the block types present in the grid (one u8 each).
+		- If the grid is uniform (flags & ENCODING_UNIFORM), that's all: every voxel
+		  is the only palette entry. Otherwise, for each column (in memory order),
+		  its runs of equal voxels as (palette index: u8, run length: u8) pairs.
+		  Runs never cross columns and longer ones are split at 255 voxels.
+		- If the runs would take more space than the voxels themselves (very noisy
+		  grids, flags & ENCODING_RAW), the palette index of every voxel is stored.
+		"""
+		palette = sorted(set(self.data))
+		flags = self.ENCODING_UNIFORM if len(palette) == 1 else 0
+		header = struct.pack("<BHBB", self.ENCODING_VERSION, self.gridSize, flags, len(palette) - 1)
+
+		if flags & self.ENCODING_UNIFORM:
+			return header + bytes(palette)
+
+		# Maps every block type to its palette index:
+		table = bytearray(256)
+		for i, block in enumerate(palette):
+			table[block] = i
+		indices = self.data.translate(table)
+
+		size = self.gridSize
+		runs = bytearray()
+		for base in range(0, len(indices), size):
+			for match in self.RUN_PATTERN.finditer(indices, base, base + size):
+				start, end = match.span()
+				while end - start > 255:
+					runs += bytes((indices[start], 255))
+					start += 255
+				runs += bytes((indices[start], end - start))
+
+		if len(runs) >= len(indices):
+			header = struct.pack("<BHBB", self.ENCODING_VERSION, size, self.ENCODING_RAW, len(palette) - 1)
+			return header + bytes(palette) + bytes(indices)
+		return header + bytes(palette) + bytes(runs)
+
+	@classmethod
+	def decode(cls, encoded: bytes) -> "VoxelGrid":
+		"""
+		Builds a VoxelGrid back from the result of encode.
+		"""
+		version, gridSize, flags, paletteSize = struct.unpack_from("<BHBB", encoded)
+		if version != cls.ENCODING_VERSION:
+			raise ValueError(f"Unsupported voxel encoding version: {version}")
+
+		offset = struct.calcsize("<BHBB")
+		palette = encoded[offset : offset + paletteSize + 1]
+		offset += len(palette)
+
+		grid = cls(gridSize)
+		if flags & cls.ENCODING_UNIFORM:
+			grid.data[:] = palette * len(grid.data)
+		elif flags & cls.ENCODING_RAW:
+			table = bytearray(256)
+			table[:len(palette)] = palette
+			grid.data[:] = encoded[offset:].translate(table)
+		else:
+			runs = encoded[offset:]
+			grid.data[:] = b"".join([palette[runs[i] : runs[i] + 1] * runs[i + 1] for i in range(0, len(runs), 2)])
+
+		grid.solidCount = len(grid.data) - grid.data.count(0)
+		return grid
+
+# Cube face definitions
+VOXEL_FACES = [
+	{"dir": (0, 0,  1), "offsets": [(0, 1, 1), (1, 1, 1), (1, 0, 1), (0, 0, 1)]}, # Front
+	{"dir": (0, 0, -1), "offsets": [(1, 1, 0), (0, 1, 0), (0, 0, 0), (1, 0, 0)]}, # Back
+	{"dir": (0,  1, 0), "offsets": [(0, 1, 0), (1, 1, 0), (1, 1, 1), (0, 1, 1)]}, # Top
+	{"dir": (0, -1, 0), "offsets": [(0, 0, 1), (1, 0, 1), (1, 0, 0), (0, 0, 0)]}, # Bottom
+	{"dir": ( 1, 0, 0), "offsets": [(1, 0, 0), (1, 0, 1), (1, 1, 1), (1, 1, 0)]}, # Right
+	{"dir": (-1, 0, 0), "offsets": [(0, 0, 1), (0, 0, 0), (0, 1, 0), (0, 1, 1)]}  # Left
+]
+
+def _axisBetween(a, b) -> int:
+	return next(i for i in range(3) if a[i] != b[i])
+
+for _face in VOXEL_FACES:
+	# The axis of the face normal and the axes followed by the U and V texture coordinates:
+	_face["axis"] = next(i for i in range(3) if _face["dir"][i] != 0)
+	_face["uvAxes"] = (
+		_axisBetween(_face["offsets"][0], _face["offsets"][1]),
+		_axisBetween(_face["offsets"][1], _face["offsets"][2])
+	)
+
+	# The tangent follows the U texture coordinate, so it is known for every face:
+	_face["tangent"] = tuple(b - a for a, b in zip(_face["offsets"][0], _face["offsets"][1]))
+
+class QuadBuffers:
+	"""
+	Flat, typed buffers for a mesh made only of quads (as voxel meshes are): the
+	positions (3 floats per vertex), the UVs (2 floats per vertex) and the index of
+	the VOXEL_FACES direction of every quad, which gives the normal and tangent of
+	its four vertices. Since every quad is made of the same two triangles, the index
+	buffer only depends on the quad count (see getIndices).
+	"""
+
+	# The shared index buffer, grown as needed and sliced by getIndices:
+	QUAD_INDICES = array("I")
+
+	def __init__(self):
+		self.positions = array("f")
+		self.uvs = array("f")
+		self.faces = array("B")
+
+	# Bytes used by each quad once uploaded to an engine mesh: four vertices of eleven
+	# floats (position, normal, tangent and UV) and six 32 bit indices:
+	MESH_BYTES_PER_QUAD = 4 * 11 * 4 + 6 * 4
+
+	def getQuadCount(self) -> int:
+		return len(self.faces)
+
+	def getMemoryUsage(self) -> int:
+		"""
+		Returns the bytes used by the buffers themselves and by the engine mesh they are
+		uploaded to.
+		"""
+		buffers = (self.positions, self.uvs, self.faces)
+		return sum(len(values) * values.itemsize for values in buffers) + len(self.faces) * self.MESH_BYTES_PER_QUAD
+
+	def addQuad(self, faceIndex: int, base, extents, scale: int = 1):
+		"""
+		Adds one face quad. The quad starts at the base voxel and covers extents[i] voxels
+		along each axis (the extent along the face normal is always 1). UVs are scaled
+		by the extents, so the texture tiles once per voxel instead of stretching over
+		merged faces. Positions and UVs are multiplied by scale (the size of a voxel).
+		"""
+		face = VOXEL_FACES[faceIndex]
+		bx, by, bz = base
+		ex, ey, ez = extents
+		uAxis, vAxis = face["uvAxes"]
+
+		for ox, oy, oz in face["offsets"]:
+			self.positions.extend(((bx + ox * ex) * scale, (by + oy * ey) * scale, (bz + oz * ez) * scale))
+
+		# The UVs of the four offsets are (0, 0), (1, 0), (1, 1) and (0, 1), scaled:
+		u, v = extents[uAxis] * scale, extents[vAxis] * scale
+		self.uvs.extend((0.0, 0.0, u, 0.0, u, v, 0.0, v))
+		self.faces.append(faceIndex)
+
+	def extend(self, other: "QuadBuffers"):
+		self.positions.extend(other.positions)
+		self.uvs.extend(other.uvs)
+		self.faces.extend(other.faces)
+
+	def encode(self) -> bytes:
+		"""
+		Encodes the buffers as the quad count (u32) followed by the raw positions, UVs
+		and faces arrays (in the machine byte order, since they are only cached locally).
+		"""
+		header = struct.pack("<I", len(self.faces))
+		return header + self.positions.tobytes() + self.uvs.tobytes() + self.faces.tobytes()
+
+	@classmethod
+	def decode(cls, encoded, offset: int = 0):
+		"""
+		Reads buffers encoded with encode from any bytes-like object (such as a memory
+		mapped file), starting at the offset. Returns the buffers and the offset right
+		after them.
+		"""
+		quadCount, = struct.unpack_from("<I", encoded, offset)
+		offset += 4
+
+		buffers = cls()
+		for values, count in ((buffers.positions, quadCount * 12), (buffers.uvs, quadCount * 8), (buffers.faces, quadCount)):
+			size = count * values.itemsize
+			values.frombytes(encoded[offset : offset + size])
+			offset += size
+		return buffers, offset
+
+	@classmethod
+	def getIndices(cls, quadCount: int) -> array:
+		"""
+		Returns the index buffer for quadCount quads, with the triangles (0, 2, 1) and
+		(3, 2, 0) of each quad.
+		"""
+		indices = cls.QUAD_INDICES
+		for base in range(len(indices) // 6 * 4, quadCount * 4, 4):
+			indices.extend((base, base + 2, base + 1, base + 3, base + 2, base))
+		return indices[: quadCount * 6]
+
+	def upload(self, mesh: cave.Mesh, faceIndex: int = None):
+		"""
+		Replaces the mesh data with these buffers (only the quads facing the given
+		VOXEL_FACES direction, if a faceIndex is given). The position and UV objects are
+		reused for every vertex (appendVertex copies them) and the normal/tangent objects
+		are shared by every face in the same direction, so no engine objects are created
+		per vertex. The indices are set at once. It doesn't reload the mesh.
+		"""
+		mesh.reset()
+
+		position, uv = cave.Vector3(), cave.Vector2()
+		vectors = [(cave.Vector3(*face["dir"]), cave.Vector3(*face["tangent"])) for face in VOXEL_FACES]
+		appendVertex = mesh.appendVertex
+		positions, uvs = self.positions, self.uvs
+
+		quads = enumerate(self.faces)
+		if faceIndex is not None:
+			quads = [(quad, face) for quad, face in quads if face == faceIndex]
+		quadCount = 0
+
+		for quad, face in quads:
+			quadCount += 1
+			normal, tangent = vectors[face]
+			for vertex in range(quad * 4, quad * 4 + 4):
+				position.x = positions[vertex * 3]
+				position.y = positions[vertex * 3 + 1]
+				position.z = positions[vertex * 3 + 2]
+				uv.x = uvs[vertex * 2]
+				uv.y = uvs[vertex * 2 + 1]
+				appendVertex(position, normal, tangent, uv)
+
+		mesh.indices = self.getIndices(quadCount).tolist()
+
+# Version of the terrain generator. It must be bumped whenever generateTerrain changes,
+# since it invalidates the chunks cached on the disk (see VoxelChunk.encodeCache):
+TERRAIN_VERSION = 1
+
+def generateTerrain(voxels: VoxelGrid, posX: float = 0, posY: float = 0, seed: int = 0):
+	"""
+	Uses perlin noise to procedurally generate the voxels of the chunk at the given
+	chunk coordinates. The height of every column is sampled in a single batched
+	noise call.
+	"""
+	perlinScale = 1.1
+	size = voxels.gridSize
+
+	noise = GradientNoise.get(seed)
+	heights = noise.grid(
+		[(x / size + posX) * perlinScale for x in range(size)],
+		[(z / size + posY) * perlinScale for z in range(size)]
+	)
+
+	# Every voxel with y <= height is solid:
+	voxels.fillFromHeights([math.floor((h * 0.5 + 0.5) * size) + 1 for h in heights])
+
+class VoxelMesher:
+	"""
+	Builds the mesh of a VoxelGrid as plain Python data (no engine objects), which
+	means that it can also run outside of the main thread. The grid is meshed in
+	cubic sections that cache their own QuadBuffers, so edits only need
+	to remesh the sections they touch.
+	"""
+
+	def __init__(self, voxels: VoxelGrid, sectionSize: int = 16, greedy: bool = True, neighbours: dict = None, scale: int = 1):
+		self.voxels = voxels
+		self.gridSize = voxels.gridSize
+		self.sectionSize = sectionSize
+		self.greedy = greedy
+
+		# Size of each voxel in the mesh (greater than 1 for the downsampled LOD grids):
+		self.scale = scale
+
+		# The VoxelGrid of the neighbour chunks, mapped by their (x, z) chunk offset. Faces
+		# on the chunk borders are only visible if the neighbour voxel is empty (or unknown):
+		self.neighbours = dict(neighbours or {})
+
+		# For a mesher decoded from the cache, the checksum of the neighbour grids its
+		# borders were meshed against, until the actual neighbours are set:
+		self.cachedNeighbours = {}
+
+		# Each section caches its QuadBuffers:
+		self.sections = {}
+		self.dirtySections = set(self.getSectionKeys())
+
+	def getSectionKeys(self):
+		"""
+		Returns the (x, y, z) key of every section, in a stable order.
+		"""
+		count = self.getSectionCount()
+		return [(x, y, z) for x in range(count) for y in range(count) for z in range(count)]
+
+	def getSectionCount(self) -> int:
+		"""
+		How many sections the grid has along each axis.
+		"""
+		return -(-self.gridSize // self.sectionSize)
+
+	def getSectionBounds(self, key):
+		"""
+		Returns the (min, max) voxel coordinates covered by the section.
+		"""
+		lo = [k * self.sectionSize for k in key]
+		hi = [min(self.gridSize, v + self.sectionSize) for v in lo]
+		return lo, hi
+
+	def markAllDirty(self):
+		self.dirtySections.update(self.getSectionKeys())
+
+	def getBorderKeys(self, offset) -> list:
+		"""
+		Returns the keys of the sections on the chunk border facing the neighbour at the
+		(x, z) offset.
+		"""
+		axis = 0 if offset[0] else 2
+		side = 0 if offset[axis // 2] < 0 else self.getSectionCount() - 1
+		return [key for key in self.getSectionKeys() if key[axis] == side]
+
+	def markBorderDirty(self, offset):
+		"""
+		Flags the sections on the chunk border facing the neighbour at the (x, z) offset.
+		"""
+		self.dirtySections.update(self.getBorderKeys(offset))
+
+	def setNeighbour(self, offset, voxels: VoxelGrid) -> bool:
+		"""
+		Sets (or clears, with None) the voxels of the neighbour chunk at the (x, z) offset,
+		flagging the border facing it to be remeshed. Returns False if nothing changed.
+		"""
+		checksum = self.cachedNeighbours.get(offset)
+		if checksum is not None:
+			# Decoded from the cache: the border stays culled until the neighbour is known
+			# (the faces of a missing neighbour's side can't face the camera anyway) and
+			# is still valid if it's identical to the one it was meshed against:
+			if voxels is None:
+				return False
+			del self.cachedNeighbours[offset]
+			if zlib.crc32(voxels.data) == checksum:
+				self.neighbours[offset] = voxels
+				return False
+		elif self.neighbours.get(offset) is voxels:
+			return False
+
+		if voxels is None:
+			self.neighbours.pop(offset, None)
+		else:
+			self.neighbours[offset] = voxels
+		self.markBorderDirty(offset)
+		return True
+
+	def forgetCachedNeighbour(self, offset) -> bool:
+		"""
+		Flags the border that was culled against the cached neighbour at the (x, z)
+		offset to be remeshed, for when the neighbour turns out to be unusable (at
+		another LOD). Returns False if there was no such neighbour.
+		"""
+		if self.cachedNeighbours.pop(offset, None) is None:
+			return False
+		self.markBorderDirty(offset)
+		return True
+
+	def getNeighbourOffsets(self) -> set:
+		return set(self.neighbours) | set(self.cachedNeighbours)
+
+	def encode(self) -> bytes:
+		"""
+		Encodes the meshed sections (which must be up to date) and the checksum of the
+		neighbour grids the borders were meshed against, to cache them on the disk:
+		sectionSize (u16), greedy (u8), scale (u8), the neighbours count (u8) and their
+		(x offset: i8, z offset: i8, checksum: u32) and then the QuadBuffers of every
+		section, in the getSectionKeys order.
+		"""
+		checksums = dict(self.cachedNeighbours)
+		checksums.update((offset, zlib.crc32(voxels.data)) for offset, voxels in self.neighbours.items())
+
+		header = struct.pack("<HBBB", self.sectionSize, self.greedy, self.scale, len(checksums))
+		neighbours = b"".join(struct.pack("<bbI", dx, dz, checksum) for (dx, dz), checksum in checksums.items())
+		return header + neighbours + b"".join(self.sections[key].encode() for key in self.getSectionKeys())
+
+	@classmethod
+	def decode(cls, encoded, offset: int, voxels: VoxelGrid) -> "VoxelMesher":
+		"""
+		Builds a mesher for the voxels back from the result of encode, without meshing
+		anything. Its borders are only remeshed if the neighbours set later differ from
+		the ones they were meshed against.
+		"""
+		sectionSize, greedy, scale, neighbourCount = struct.unpack_from("<HBBB", encoded, offset)
+		offset += struct.calcsize("<HBBB")
+
+		mesher = cls(voxels, sectionSize, bool(greedy), None, scale)
+		for i in range(neighbourCount):
+			dx, dz, checksum = struct.unpack_from("<bbI", encoded, offset)
+			mesher.cachedNeighbours[(dx, dz)] = checksum
+			offset += struct.calcsize("<bbI")
+
+		for key in mesher.getSectionKeys():
+			mesher.sections[key], offset = QuadBuffers.decode(encoded, offset)
+		mesher.dirtySections.clear()
+		return mesher
+
+	def getBorderInfo(self, face):
+		"""
+		For faces pointing to a neighbour chunk, returns the neighbour voxel data (or None
+		if unknown) and the index offset that maps an index just outside this grid to the
+		same voxel inside the neighbour grid.
+		"""
+		dx, dy, dz = face["dir"]
+		neighbour = self.neighbours.get((dx, dz)) if dy == 0 else None
+		if neighbour is None:
+			return None, 0
+
+		axis = face["axis"]
+		return neighbour.data, face["dir"][axis] * self.gridSize * self.voxels.strides[axis]
+
+	def markBoxDirty(self, lo, hi):
+		"""
+		Flags every section touching the [lo, hi) voxel box to be remeshed, including
+		the sections just around it, since the visibility of their faces may also have
+		changed.
+		"""
+		size = self.sectionSize
+		last = self.getSectionCount() - 1
+		ranges = [range(max(0, (lo[i] - 1) // size), min(last, hi[i] // size) + 1) for i in range(3)]
+		self.dirtySections.update((x, y, z) for x in ranges[0] for y in ranges[1] for z in ranges[2])
+
+	def markDirty(self, x: int, y: int, z: int):
+		"""
+		Flags the section holding the voxel (x, y, z) to be remeshed. If the voxel
+		is on a section border, the neighbour section is flagged as well, since the
+		visibility of its faces may also have changed.
+		"""
+		size = self.sectionSize
+		count = self.getSectionCount()
+		key = (x // size, y // size, z // size)
+		self.dirtySections.add(key)
+
+		for axis, value in enumerate((x, y, z)):
+			if value % size == 0 and key[axis] > 0:
+				other = list(key)
+				other[axis] -= 1
+				self.dirtySections.add(tuple(other))
+			elif value % size == size - 1 and key[axis] < count - 1:
+				other = list(key)
+				other[axis] += 1
+				self.dirtySections.add(tuple(other))
+
+	def update(self) -> set:
+		"""
+		Remeshes the dirty sections. Returns the keys of the remeshed ones (empty if none).
+		"""
+		if not self.dirtySections:
+			return set()
+
+		for key in self.dirtySections:
+			self.sections[key] = self.buildSection(key)
+
+		# Borders remeshed without their cached neighbour are no longer culled against it:
+		for offset in list(self.cachedNeighbours):
+			if not self.dirtySections.isdisjoint(self.getBorderKeys(offset)):
+				del self.cachedNeighbours[offset]
+
+		remeshed = self.dirtySections
+		self.dirtySections = set()
+		return remeshed
+
+	def getBuffers(self) -> QuadBuffers:
+		"""
+		Concatenates the cached sections into the QuadBuffers of the whole grid.
+		"""
+		buffers = QuadBuffers()
+		for key in self.getSectionKeys():
+			buffers.extend(self.sections[key])
+		return buffers
+
+	def buildSection(self, key):
+		"""
+		Meshes a single section, returning its QuadBuffers.
+		"""
+		buffers = QuadBuffers()
+		lo, hi = self.getSectionBounds(key)
+
+		# Uniform sections: empty ones have no faces and solid ones only have faces
+		# if some voxel around them is empty:
+		if self.voxels.isEmpty():
+			return buffers
+		solid = self.voxels.countSolid(lo, hi)
+		volume = (hi[0] - lo[0]) * (hi[1] - lo[1]) * (hi[2] - lo[2])
+		if solid == 0 or (solid == volume and self.isEnclosed(lo, hi)):
+			return buffers
+
+		if self.greedy:
+			self.buildGreedyFaces(buffers, lo, hi)
+		else:
+			self.buildNaiveFaces(buffers, lo, hi)
+		return buffers
+
+	def isEnclosed(self, lo, hi) -> bool:
+		"""
+		Returns True if every voxel touching the outside of the [lo, hi) box is solid,
+		including the voxels of the neighbour chunks.
+		"""
+		size = self.gridSize
+		for face in VOXEL_FACES:
+			axis = face["axis"]
+			sign = face["dir"][axis]
+
+			# The one voxel thick layer just outside the box, on this face side:
+			layerLo, layerHi = list(lo), list(hi)
+			layerLo[axis] = hi[axis] if sign > 0 else lo[axis] - 1
+			layerHi[axis] = layerLo[axis] + 1
+			area = 1
+			for i in range(3):
+				area *= layerHi[i] - layerLo[i]
+
+			grid = self.voxels
+			if layerLo[axis] < 0 or layerLo[axis] >= size:
+				grid = self.neighbours.get((face["dir"][0], face["dir"][2])) if axis != 1 else None
+				if grid is None:
+					return False
+				layerLo[axis] -= sign * size
+				layerHi[axis] -= sign * size
+
+			if grid.countSolid(layerLo, layerHi) != area:
+				return False
+		return True
+
+	def buildNaiveFaces(self, buffers: QuadBuffers, lo, hi):
+		"""
+		Emits one quad for every visible voxel face inside the [lo, hi) region.
+		"""
+		size = self.gridSize
+		data = self.voxels.data
+
+		# Index offset of each face neighbour in the flat voxel array:
+		steps = [self.voxels.index(*face["dir"]) for face in VOXEL_FACES]
+		borders = [self.getBorderInfo(face) for face in VOXEL_FACES]
+
+		for x in range(lo[0], hi[0]):
+			for z in range(lo[2], hi[2]):
+				base = self.voxels.columnIndex(x, z)
+				for y in range(lo[1], hi[1]):
+					if data[base + y] == 0:
+						continue
+
+					for faceIndex, (face, step, (border, wrap)) in enumerate(zip(VOXEL_FACES, steps, borders)):
+						nx, ny, nz = x + face["dir"][0], y + face["dir"][1], z + face["dir"][2]
+						if 0 <= nx < size and 0 <= ny < size and 0 <= nz < size:
+							if data[base + y + step] != 0:
+								continue
+						elif border is not None and border[base + y + step - wrap] != 0:
+							# Hidden by the neighbour chunk:
+							continue
+						buffers.addQuad(faceIndex, (x, y, z), (1, 1, 1), self.scale)
+
+	def buildGreedyFaces(self, buffers: QuadBuffers, lo, hi):
+		"""
+		Emits the same visible surface as buildNaiveFaces, but merges coplanar faces
+		of the same block type into maximal rectangles. For each face direction, it
+		builds a 2D mask of the visible faces of every slice of the [lo, hi) region
+		and then greedily grows each rectangle first along the u axis and then along v.
+		"""
+		size = self.gridSize
+		data = self.voxels.data
+		strides = self.voxels.strides
+
+		for faceIndex, face in enumerate(VOXEL_FACES):
+			axis = face["axis"]
+			u, v = (axis + 1) % 3, (axis + 2) % 3
+			step = self.voxels.index(*face["dir"])
+			sign = face["dir"][axis]
+			border, wrap = self.getBorderInfo(face)
+
+			# Size of the 2D mask:
+			width, height = hi[u] - lo[u], hi[v] - lo[v]
+
+			for d in range(lo[axis], hi[axis]):
+				# Faces pointing outside the chunk are tested against the neighbour chunk
+				# voxels and, if there is none, they are always visible:
+				isBorder = d + sign < 0 or d + sign >= size
+				other, otherStep = data, step
+				if isBorder:
+					other, otherStep = border, step - wrap
+
+				mask = [0] * (width * height)
+				for j in range(height):
+					rowIdx = d * strides[axis] + (lo[v] + j) * strides[v] + lo[u] * strides[u]
+					for i in range(width):
+						idx = rowIdx + i * strides[u]
+						block = data[idx]
+						if block and (other is None or other[idx + otherStep] == 0):
+							mask[j * width + i] = block
+
+				for j in range(height):
+					i = 0
+					while i < width:
+						block = mask[j * width + i]
+						if block == 0:
+							i += 1
+							continue
+
+						# Grows along u while the block type is the same:
+						w = 1
+						while i + w < width and mask[j * width + i + w] == block:
+							w += 1
+
+						# Then grows along v while the entire row matches:
+						h = 1
+						row = [block] * w
+						while j + h < height and mask[(j + h) * width + i : (j + h) * width + i + w] == row:
+							h += 1
+
+						for k in range(j, j + h):
+							mask[k * width + i : k * width + i + w] = [0] * w
+
+						base = [0, 0, 0]
+						base[axis], base[u], base[v] = d, lo[u] + i, lo[v] + j
+						extents = [1, 1, 1]
+						extents[u], extents[v] = w, h
+						buffers.addQuad(faceIndex, base, extents, self.scale)
+
+						i += w
+
+class VoxelCollider:
+	"""
+	Builds the collision shape of a VoxelGrid, separately from its render mesh: the
+	solid voxels (of any block type) are merged into a small set of axis aligned
+	boxes, which are then turned into a triangle mesh. Box faces that are entirely
+	covered by solid voxels, or that lie on the bottom of the world, are skipped.
+	Like the VoxelMesher, it only produces plain Python data, so build() can also
+	run outside of the main thread.
+	"""
+
+	# Maps every block type to 1 (solid) except for the empty one:
+	SOLID_TABLE = bytes([0] + [1] * 255)
+
+	def __init__(self, voxels: VoxelGrid):
+		self.voxels = voxels
+
+		# The merged boxes, as ((minX, minY, minZ), (maxX, maxY, maxZ)) voxel coordinates,
+		# and the QuadBuffers of the collision mesh built from them:
+		self.boxes = []
+		self.buffers = QuadBuffers()
+		self.dirty = True
+
+	def markDirty(self):
+		self.dirty = True
+
+	def update(self) -> bool:
+		"""
+		Rebuilds the boxes and the collision mesh, if dirty. Returns True if it did.
+		"""
+		if not self.dirty:
+			return False
+
+		self.apply(self.build())
+		return True
+
+	def build(self):
+		"""
+		Returns the (boxes, buffers) for the current voxels, without storing them.
+		"""
+		boxes = self.mergeBoxes()
+		return boxes, self.buildBuffers(boxes)
+
+	def apply(self, data):
+		self.boxes, self.buffers = data
+		self.dirty = False
+
+	def mergeBoxes(self):
+		"""
+		Greedily merges the solid voxels into boxes: each box starts as a vertical run of
+		a column, then grows along z while the next column has the same run available,
+		and finally along x while the entire z/y rectangle of the next slice does.
+		"""
+		size = self.voxels.gridSize
+		free = self.voxels.data.translate(self.SOLID_TABLE)
+		boxes = []
+
+		for x in range(size):
+			for z in range(size):
+				base = (x * size + z) * size
+				start = free.find(1, base, base + size)
+
+				while start != -1:
+					end = free.find(0, start, base + size)
+					end = base + size if end == -1 else end
+					y0, y1 = start - base, end - base
+					run = free[start:end]
+
+					z1 = z + 1
+					while z1 < size and free[(x * size + z1) * size + y0 : (x * size + z1) * size + y1] == run:
+						z1 += 1
+
+					x1 = x + 1
+					while x1 < size and all(
+						free[(x1 * size + k) * size + y0 : (x1 * size + k) * size + y1] == run for k in range(z, z1)
+					):
+						x1 += 1
+
+					empty = bytes(y1 - y0)
+					for i in range(x, x1):
+						for k in range(z, z1):
+							idx = (i * size + k) * size
+							free[idx + y0 : idx + y1] = empty
+
+					boxes.append(((x, y0, z), (x1, y1, z1)))
+					start = free.find(1, end, base + size)
+		return boxes
+
+	def buildBuffers(self, boxes) -> QuadBuffers:
+		"""
+		Turns the boxes into the QuadBuffers of the collision mesh.
+		"""
+		buffers = QuadBuffers()
+		size = self.voxels.gridSize
+
+		for lo, hi in boxes:
+			extents = (hi[0] - lo[0], hi[1] - lo[1], hi[2] - lo[2])
+			for faceIndex, face in enumerate(VOXEL_FACES):
+				axis = face["axis"]
+				sign = face["dir"][axis]
+
+				# The one voxel thick layer just outside this face of the box:
+				layerLo, layerHi = list(lo), list(hi)
+				layerLo[axis] = hi[axis] if sign > 0 else lo[axis] - 1
+				layerHi[axis] = layerLo[axis] + 1
+
+				if axis == 1 and layerLo[axis] < 0:
+					# Nothing ever comes from below the world:
+					continue
+				if 0 <= layerLo[axis] < size:
+					area = 1
+					for i in range(3):
+						area *= layerHi[i] - layerLo[i]
+					if self.voxels.countSolid(layerLo, layerHi) == area:
+						continue
+
+				buffers.addQuad(faceIndex, lo, extents)
+		return buffers
+
+class VoxelConnectivity:
+	"""
+	Finds which faces of a VoxelGrid are connected to each other through its empty
+	voxels, used for the coarse occlusion culling of the chunks: if there is no path
+	of empty voxels from one face to another, nothing seen through the first can be
+	seen through the chunk. The empty runs of every column are the nodes, joined with
+	the overlapping runs of the next columns (union-find), so it's cheap enough to
+	run again after every edit. Like the VoxelCollider, build() can run outside of
+	the main thread.
+	"""
+
+	# Bit of each VOXEL_FACES direction and all of them together:
+	FACE_BITS = {face["dir"]: 1 << i for i, face in enumerate(VOXEL_FACES)}
+	ALL_FACES = (1 << len(VOXEL_FACES)) - 1
+
+	# Matches a run of empty voxels:
+	EMPTY_PATTERN = re.compile(rb"\x00+")
+
+	def __init__(self, voxels: VoxelGrid):
+		self.voxels = voxels
+
+		# For each face bit, the faces reachable from it (including itself, if any empty
+		# voxel touches it), and the (start, end, faces) empty runs of every column:
+		self.faceMasks = {bit: 0 for bit in self.FACE_BITS.values()}
+		self.columns = []
+		self.dirty = True
+
+	def markDirty(self):
+		self.dirty = True
+
+	def update(self) -> bool:
+		if not self.dirty:
+			return False
+
+		self.apply(self.build())
+		return True
+
+	def build(self):
+		"""
+		Returns the (faceMasks, columns) for the current voxels, without storing them.
+		"""
+		size = self.voxels.gridSize
+		data = self.voxels.data
+		bits = self.FACE_BITS
+
+		# The empty runs of every column, as (start, end, node), and the faces each node touches:
+		nodes, parents, columns = [], [], []
+		for x in range(size):
+			for z in range(size):
+				base = (x * size + z) * size
+				sides = 0
+				if x == 0:
+					sides |= bits[(-1, 0, 0)]
+				if x == size - 1:
+					sides |= bits[(1, 0, 0)]
+				if z == 0:
+					sides |= bits[(0, 0, -1)]
+				if z == size - 1:
+					sides |= bits[(0, 0, 1)]
+
+				runs = []
+				for match in self.EMPTY_PATTERN.finditer(data, base, base + size):
+					start, end = match.start() - base, match.end() - base
+					faces = sides
+					if start == 0:
+						faces |= bits[(0, -1, 0)]
+					if end == size:
+						faces |= bits[(0, 1, 0)]
+
+					runs.append((start, end, len(nodes)))
+					parents.append(len(nodes))
+					nodes.append(faces)
+				columns.append(runs)
+
+		def find(node):
+			while parents[node] != node:
+				parents[node] = parents[parents[node]]
+				node = parents[node]
+			return node
+
+		# Joins the overlapping runs of neighbour columns (along x and along z):
+		for x in range(size):
+			for z in range(size):
+				runs = columns[x * size + z]
+				for other in (columns[(x - 1) * size + z] if x else (), columns[x * size + z - 1] if z else ()):
+					i = j = 0
+					while i < len(runs) and j < len(other):
+						if runs[i][0] < other[j][1] and other[j][0] < runs[i][1]:
+							a, b = find(runs[i][2]), find(other[j][2])
+							if a != b:
+								parents[a] = b
+						if runs[i][1] < other[j][1]:
+							i += 1
+						else:
+							j += 1
+
+		# The faces touched by every connected region:
+		regions = {}
+		for node, faces in enumerate(nodes):
+			root = find(node)
+			regions[root] = regions.get(root, 0) | faces
+
+		faceMasks = {bit: 0 for bit in bits.values()}
+		for faces in regions.values():
+			for bit in faceMasks:
+				if faces & bit:
+					faceMasks[bit] |= faces
+
+		columns = [[(start, end, regions[find(node)]) for start, end, node in runs] for runs in columns]
+		return faceMasks, columns
+
+	def apply(self, data):
+		self.faceMasks, self.columns = data
+		self.dirty = False
+
+	def connects(self, fromDir, toDir) -> bool:
+		"""
+		Returns True if the faces in the given directions are connected by empty voxels.
+		"""
+		return bool(self.faceMasks[self.FACE_BITS[fromDir]] & self.FACE_BITS[toDir])
+
+	def getRegionFaces(self, x: int, y: int, z: int) -> int:
+		"""
+		Returns the face bits touched by the empty region around the voxel. A solid
+		voxel (or one out of the grid) sees nothing, so all faces are returned.
+		"""
+		size = self.voxels.gridSize
+		if 0 <= x < size and 0 <= y < size and 0 <= z < size:
+			for start, end, faces in self.columns[x * size + z]:
+				if start <= y < end:
+					return faces
+		return self.ALL_FACES
 
 class VoxelChunk(cave.Component):
 	"""
 	This Component will be responsible to build the Mesh and Physics for a given
-	chunk for the Map. It will also store, in the self.voxels variable, the current
-	state of each voxel.
+	chunk for the Map. It will also store, in the self.voxels variable (a VoxelGrid),
+	the current state of each voxel.
 	"""
 
+	# Merges coplanar faces of the same block type into bigger quads:
+	greedyMeshing = True
+
+	# Size (in voxels) of each cubic section that is remeshed independently:
+	sectionSize = 16
+
 	def start(self, scene: cave.Scene):
+		if getattr(self, "meshCmps", None) is not None:
+			# Reactivated after being unloaded by the VoxelSpawner, which rebuilds its data:
+			return
+
 		self.transf = self.entity.getTransform()
 
-		self.meshCmp : cave.MeshComponent = self.entity.add("MeshComponent")
-		self.meshCmp.material.setAsset("TestMAT Regular")
-		self.meshCmp.mesh.makeLocalNew()
-		self.meshCmp.reload()
+		# Every mesher section has its own MeshComponents (and meshes), one per VOXEL_FACES
+		# direction, mapped by (section key, face index). So an edit only uploads the
+		# sections it touched again, and the directions that can't face the camera are not
+		# drawn at all (see updateFaceBuckets). They are only added once they have faces:
+		self.meshCmps = {}
+		self.meshes = {}
+		self.faceVisible = {}
 
-		self.rbCmp : cave.RigidBodyComponent = self.entity.add("RigidBodyComponent")
+		# The collision mesh, built by a VoxelCollider independently of the render mesh.
+		# Distant (LOD) chunks leave it empty, since only the full resolution chunks
+		# around the player need collisions. Like the MeshComponents, the RigidBodyComponent
+		# is only added once it has faces, so chunks of air have no components at all:
+		self.rbCmp : cave.RigidBodyComponent = None
+		self.collisionMesh = cave.Mesh()
 
 		self.gridSize = self.entity.properties.get("gridSize", 32)
+		self.worldSeed = self.entity.properties.get("worldSeed", 0)
 
-		# The mesh:
-		self.mesh : cave.Mesh = self.meshCmp.mesh.get()
-		
-		# The 3D array for each voxel, 0 means empty
-		self.voxels = [[[0 for _ in range(self.gridSize)] for _ in range(self.gridSize)] for _ in range(self.gridSize)]
-		
+		# The position of this chunk in the chunk grid:
 		pos = self.transf.worldPosition
-		self.generateChunkVoxels(pos.x / self.gridSize, pos.z / self.gridSize)
-		self.buildVoxelMesh()
+		self.chunkPos = (pos.x / self.gridSize, pos.z / self.gridSize)
 		
-	def generateChunkVoxels(self, posX = 0, posY = 0):
+		# The flat array for each voxel (0 means empty) and its mesher. Both are only
+		# set once the chunk data is built. A released chunk only keeps its voxels
+		# encoded with VoxelGrid.encode (see release):
+		self.voxels : VoxelGrid = None
+		self.mesher : VoxelMesher = None
+		self.voxelData : bytes = None
+
+		# Level of detail: the mesh is built from lodVoxels, the voxels downsampled
+		# 2^lod times (at LOD 0, lodVoxels is the voxels grid itself):
+		self.lod = 0
+		self.lodVoxels : VoxelGrid = None
+
+		# The collision shape builder (only at LOD 0) and whether the collision mesh must
+		# be rebuilt. Edits only flag it, so it is rebuilt and uploaded to the Physics
+		# once per frame, no matter how many blocks changed. Chunks spawned by the
+		# VoxelSpawner rebuild it in its pipeline, otherwise it happens in update:
+		self.collider : VoxelCollider = None
+		self.colliderDirty = False
+		self.asyncBuild = self.entity.properties.get("asyncBuild", False)
+
+		# The [lo, hi) boxes edited since a LOD build started from a copy of the voxels
+		# (see beginLodBuild), flagged again once it is applied. None if there is no build:
+		self.lodEdits = None
+
+		# Which faces of the chunk see each other through empty voxels (see VoxelConnectivity),
+		# used by the VoxelSpawner occlusion culling. Rebuilt like the collider after edits:
+		self.connectivity : VoxelConnectivity = None
+		self.connectivityDirty = False
+
+		# Whether the chunk was edited since the mesh was last rebuilt (see flushEdits) and
+		# since it was built at all, and whether its voxels were generated instead of read
+		# back from saved data (only unedited, generated chunks are cached by the VoxelSpawner):
+		self.meshDirty = False
+		self.edited = False
+		self.generated = False
+
+		# The neighbour VoxelChunks, mapped by their (x, z) chunk offset (set by the VoxelSpawner):
+		self.neighbours = {}
+
+		# When spawned by the VoxelSpawner, the chunk data is built in a worker thread
+		# and handed back to applyChunkData. Otherwise, it is built right away:
+		if not self.asyncBuild:
+			self.applyChunkData(self.buildChunkData())
+
+	def isReady(self) -> bool:
 		"""
-		This method will use perlin noise to procedurally generate this chunk's voxels.
+		Returns True once the chunk voxels are available.
+		"""
+		return self.voxels is not None
+
+	def buildChunkData(self, voxelData: bytes = None, neighbours: dict = None, lod: int = 0):
+		"""
+		Generates the chunk voxels (or decodes the given voxelData, previously encoded
+		with VoxelGrid.encode) and meshes them into plain buffers at the given LOD,
+		culling the border faces hidden by the neighbours (VoxelGrids mapped by their
+		chunk offset). It also finds the connectivity of its faces and whether the voxels
+		were generated. It doesn't touch any engine object, so it is safe to call from a
+		worker thread.
+		"""
+		voxels = VoxelGrid.decode(voxelData) if voxelData else None
+		generated = not voxels or voxels.gridSize != self.gridSize
+		if generated:
+			voxels = VoxelGrid(self.gridSize)
+			generateTerrain(voxels, self.chunkPos[0], self.chunkPos[1], self.worldSeed)
+
+		connectivity = VoxelConnectivity(voxels)
+		connectivity.update()
+		return voxels, connectivity, self.buildLodData(lod, neighbours, voxels), generated
+
+	def buildReleasedData(self, neighbours: dict = None, lod: int = 0):
+		"""
+		Like buildChunkData, but from the voxels kept by release, so the chunk can be
+		applied again (it stays generated if it was). Safe to call from a worker thread.
+		"""
+		voxels, connectivity, lodData, generated = self.buildChunkData(self.voxelData, neighbours, lod)
+		return voxels, connectivity, lodData, self.generated
+
+	def release(self):
+		"""
+		Frees the voxel grids, mesher, collider and meshes of a deactivated chunk, only
+		keeping its voxels encoded with VoxelGrid.encode (a few hundred bytes for most
+		chunks). It isn't ready again until buildReleasedData is applied.
+		"""
+		if not self.isReady():
+			return
+
+		self.voxelData = self.voxels.encode()
+		self.voxels, self.lodVoxels, self.mesher, self.collider, self.connectivity = None, None, None, None, None
+		self.meshDirty = self.colliderDirty = self.connectivityDirty = False
+
+		for mesh in self.meshes.values():
+			mesh.reset()
+			mesh.reload()
+		self.uploadCollider()
+
+	def encodeVoxels(self) -> bytes:
+		"""
+		Returns the voxels encoded with VoxelGrid.encode (even if released), or None if
+		the chunk was never built.
+		"""
+		return self.voxels.encode() if self.voxels else self.voxelData
+
+	def buildLodData(self, lod: int, neighbours: dict = None, voxels: VoxelGrid = None):
+		"""
+		Downsamples the voxels (2^lod times) and meshes them, returning the data
+		expected by applyLodData. Like buildChunkData, it is safe to call from a
+		worker thread.
+		"""
+		voxels = voxels or self.voxels
+		factor = 2 ** lod
+		lodVoxels = voxels.downsample(factor) if lod else voxels
+
+		mesher = VoxelMesher(lodVoxels, self.sectionSize, self.greedyMeshing, neighbours, factor)
+		mesher.update()
+
+		collider = None
+		if lod == 0:
+			collider = VoxelCollider(voxels)
+			collider.update()
+		return lod, lodVoxels, mesher, collider
+
+	def encodeCache(self) -> bytes:
+		"""
+		Encodes the generated chunk, its voxels and its finished mesh at the current LOD,
+		so the VoxelSpawner can cache it on the disk and skip both the generation and
+		the meshing next time (see decodeCache). The mesh must be up to date:
+
+		- Header: the TERRAIN_VERSION (u16), the LOD (u8) and the voxels length (u32).
+		- The voxels, encoded with VoxelGrid.encode.
+		- The mesher sections, encoded with VoxelMesher.encode.
+		"""
+		voxels = self.voxels.encode()
+		header = struct.pack("<HBI", TERRAIN_VERSION, self.lod, len(voxels))
+		return header + voxels + self.mesher.encode()
+
+	def decodeCache(self, encoded, lod: int):
+		"""
+		Returns the same data as buildChunkData from the result of encodeCache (any
+		bytes-like object, such as a memory mapped file), or None if it was encoded
+		by another terrain generator version, for another LOD or with other meshing
+		settings. Like buildChunkData, it is safe to call from a worker thread.
 		"""
-		perlinScale = 1.1
+		version, cachedLod, length = struct.unpack_from("<HBI", encoded)
+		if version != TERRAIN_VERSION or cachedLod != lod:
+			return None
+
+		offset = struct.calcsize("<HBI")
+		voxels = VoxelGrid.decode(bytes(encoded[offset : offset + length]))
+		if voxels.gridSize != self.gridSize:
+			return None
+
+		lodVoxels = voxels.downsample(2 ** lod) if lod else voxels
+		mesher = VoxelMesher.decode(encoded, offset + length, lodVoxels)
+		if mesher.greedy != self.greedyMeshing or mesher.sectionSize != self.sectionSize:
+			return None
+
+		connectivity = VoxelConnectivity(voxels)
+		connectivity.update()
+
+		collider = None
+		if lod == 0:
+			collider = VoxelCollider(voxels)
+			collider.update()
+		return voxels, connectivity, (lod, lodVoxels, mesher, collider), True
+
+	def applyChunkData(self, data):
+		"""
+		Takes the result of buildChunkData and uploads it to the GPU and Physics.
+		This must be called from the main thread.
+		"""
+		self.voxels, self.connectivity, lodData, self.generated = data
+		self.voxelData = None
+		self.applyLodData(lodData)
+
+	def beginLodBuild(self) -> VoxelGrid:
+		"""
+		Returns a copy of the voxels for buildLodData to run on in a worker thread, and
+		starts recording the edits made meanwhile, so applyLodData can remesh them.
+		"""
+		self.lodEdits = []
+		return self.voxels.copy()
+
+	def applyLodData(self, data):
+		"""
+		Switches the chunk to the LOD built by buildLodData, uploading its mesh. Must
+		be called from the main thread.
+		"""
+		self.lod, self.lodVoxels, self.mesher, self.collider = data
+		edits, self.lodEdits = self.lodEdits or [], None
+
+		# Built from a copy of the voxels (see beginLodBuild), so at LOD 0 the mesher and
+		# collider are moved back to the live grid, which has the edits made meanwhile:
+		if self.lod == 0 and self.lodVoxels is not self.voxels:
+			self.lodVoxels = self.mesher.voxels = self.voxels
+			if self.collider:
+				self.collider.voxels = self.voxels
+		for lo, hi in edits:
+			self.markLodDirty(lo, hi)
+			if self.collider:
+				self.collider.markDirty()
+				self.colliderDirty = True
+
+		# Neighbours that changed while the chunk was being built:
+		for offset in self.mesher.getNeighbourOffsets() | set(self.neighbours):
+			self.syncNeighbour(offset, self.neighbours.get(offset))
+
+		self.mesher.update()
+		self.uploadMesh()
+		self.uploadCollider()
 
-		# Negative values will not work...
-		posX = abs(posX + 100.0)
-		posY = abs(posY + 100.0)
+	def getBorderVoxels(self, chunk: "VoxelChunk") -> VoxelGrid:
+		"""
+		Returns the grid of a neighbour chunk that this chunk can cull its border faces
+		against. Only chunks at the same LOD can, otherwise both keep their border faces,
+		which then work as skirts that close the seams between the two LODs.
+		"""
+		if chunk and chunk.isReady() and chunk.lod == self.lod:
+			return chunk.lodVoxels
+		return None
 
-		heights = []
+	def syncNeighbour(self, offset, chunk: "VoxelChunk") -> bool:
+		"""
+		Hands the border voxels of the neighbour chunk at the (x, z) offset to the
+		mesher. Returns True if the border must be remeshed.
+		"""
+		voxels = self.getBorderVoxels(chunk)
+		remesh = False
+		if voxels is None and chunk and chunk.isReady():
+			remesh = self.mesher.forgetCachedNeighbour(offset)
+		return self.mesher.setNeighbour(offset, voxels) or remesh
 
-		for x in range(self.gridSize):
-			for z in range(self.gridSize):
-				height = cave.random.perlin(
-					(x / self.gridSize + posX) * perlinScale, 
-					(z / self.gridSize + posY) * perlinScale
-				) * 0.5 + 0.5
-				heights.append(height)
-				height *= self.gridSize
+	def setNeighbour(self, offset, chunk: "VoxelChunk", remesh: bool = True):
+		"""
+		Sets (or clears, with None) the neighbour chunk at the (x, z) chunk offset. The
+		border facing it is remeshed right away, unless remesh is False.
+		"""
+		if chunk is None:
+			self.neighbours.pop(offset, None)
+		else:
+			self.neighbours[offset] = chunk
 
-				for y in range(self.gridSize):
-					self.voxels[z][y][x] = 1 if y <= height else 0 
+		if self.isReady():
+			if self.syncNeighbour(offset, chunk) and remesh:
+				self.updateVoxelMesh()
 		
-	def buildVoxelMesh(self):
+	def generateChunkVoxels(self, posX = 0, posY = 0):
 		"""
-		Given the self.voxels, it will build a custom mesh for them, submitting it to the GPU
-		and also using it as the Physics Mesh for the collisions.
+		This method will use perlin noise to procedurally generate this chunk's voxels.
 		"""
-		self.mesh.reset()
+		generateTerrain(self.voxels, posX, posY, self.worldSeed)
 		
-		self.vertices = []
-		self.indices = []
-
-		def addFace(offset, normal, tangent, uvOffsets):
-			vertexBase = len(self.vertices)
-			self.vertices.extend([
-				cave.Vertex(offset[0], normal, tangent, uvOffsets[0]),
-				cave.Vertex(offset[1], normal, tangent, uvOffsets[1]),
-				cave.Vertex(offset[2], normal, tangent, uvOffsets[2]),
-				cave.Vertex(offset[3], normal, tangent, uvOffsets[3])
-			])
-			self.indices.extend([
-				vertexBase, vertexBase + 2, vertexBase + 1,
-				vertexBase + 3, vertexBase + 2, vertexBase
-			])
-
-		# Cube face definitions
-		faces = [
-			{"dir": (0, 0,  1), "offsets": [(0, 1, 1), (1, 1, 1), (1, 0, 1), (0, 0, 1)]}, # Front
-			{"dir": (0, 0, -1), "offsets": [(1, 1, 0), (0, 1, 0), (0, 0, 0), (1, 0, 0)]}, # Back
-			{"dir": (0,  1, 0), "offsets": [(0, 1, 0), (1, 1, 0), (1, 1, 1), (0, 1, 1)]}, # Top
-			{"dir": (0, -1, 0), "offsets": [(0, 0, 1), (1, 0, 1), (1, 0, 0), (0, 0, 0)]}, # Bottom
-			{"dir": ( 1, 0, 0), "offsets": [(1, 0, 0), (1, 0, 1), (1, 1, 1), (1, 1, 0)]}, # Right
-			{"dir": (-1, 0, 0), "offsets": [(0, 0, 1), (0, 0, 0), (0, 1, 0), (0, 1, 1)]}  # Left
-		]
-
-		# Generate mesh
-		for x in range(self.gridSize):
-			for y in range(self.gridSize):
-				for z in range(self.gridSize):
-					if self.voxels[z][y][x] == 0:
+	def buildVoxelMesh(self):
+		"""
+		Given the self.voxels, it will remesh every section and submit the meshes to the GPU.
+		The Physics use a separate collision mesh, built by the VoxelCollider (see uploadCollider).
+		"""
+		self.mesher.markAllDirty()
+		self.updateVoxelMesh()
+
+	def updateVoxelMesh(self):
+		"""
+		Remeshes only the dirty sections and submits the meshes of those sections again.
+		"""
+		remeshed = self.mesher.update()
+		if remeshed:
+			self.uploadMesh(remeshed)
+
+	def addMeshComponent(self, key, faceIndex: int) -> cave.MeshComponent:
+		meshCmp : cave.MeshComponent = self.entity.add("MeshComponent")
+		meshCmp.material.setAsset("TestMAT Regular")
+		meshCmp.mesh.makeLocalNew()
+		meshCmp.reload()
+
+		self.meshCmps[(key, faceIndex)] = meshCmp
+		self.meshes[(key, faceIndex)] = meshCmp.mesh.get()
+		self.faceVisible[(key, faceIndex)] = True
+		return meshCmp
+
+	def uploadMesh(self, keys=None):
+		"""
+		Rebuilds the meshes (one per face direction) of the given mesher sections, or of
+		all of them if keys is None, and submits them to the GPU. The meshes of sections
+		the mesher doesn't have (at a coarser LOD) are emptied.
+		"""
+		if keys is None:
+			keys = self.mesher.getSectionKeys()
+			for key, faceIndex in self.meshes:
+				if not key in self.mesher.sections:
+					self.meshes[(key, faceIndex)].reset()
+					self.meshes[(key, faceIndex)].reload()
+
+		for key in keys:
+			buffers = self.mesher.sections[key]
+			for faceIndex in range(len(VOXEL_FACES)):
+				mesh = self.meshes.get((key, faceIndex))
+				if mesh is None:
+					if not faceIndex in buffers.faces:
 						continue
+					mesh = self.addMeshComponent(key, faceIndex).mesh.get()
 
-					for face in faces:
-						nx, ny, nz = x + face["dir"][0], y + face["dir"][1], z + face["dir"][2]
-						if nx < 0 or ny < 0 or nz < 0 or nx >= self.gridSize or ny >= self.gridSize or nz >= self.gridSize or self.voxels[nz][ny][nx] == 0:
-							offsets = [(cave.Vector3(v[0] + x, v[1] + y, v[2] + z)) for v in face["offsets"]]
-							uvOffsets = [cave.Vector2(0, 0), cave.Vector2(1, 0), cave.Vector2(1, 1), cave.Vector2(0, 1)]
-							addFace(offsets, cave.Vector3(*face["dir"]), cave.Vector3(1, 0, 0), uvOffsets)
+				# The tangents are known per face, so they don't need to be recalculated:
+				buffers.upload(mesh, faceIndex)
+
+				# Send Mesh to GPU:
+				mesh.reload()
 
-		for vertex in self.vertices:
-			self.mesh.appendVertex(vertex.position, vertex.normal, vertex.tangent, vertex.uv)
+	def updateFaceBuckets(self, cameraPos: cave.Vector3):
+		"""
+		Hides the face directions that can't face the camera from anywhere in the bounds
+		of their section: a face pointing to +X can only be seen from a camera past the
+		minimum X of the section, and so on. It's a few compares per section, done every
+		frame.
+		"""
+		pos = self.transf.worldPosition
+		camera = (cameraPos.x - pos.x, cameraPos.y - pos.y, cameraPos.z - pos.z)
+		extent = self.sectionSize * 2 ** self.lod
 
-		self.mesh.indices = self.indices
+		for (key, faceIndex), meshCmp in self.meshCmps.items():
+			face = VOXEL_FACES[faceIndex]
+			axis = face["axis"]
+			if face["dir"][axis] > 0:
+				visible = camera[axis] > key[axis] * extent
+			else:
+				visible = camera[axis] < (key[axis] + 1) * extent
 
-		self.mesh.recalculateTangents()
-		
-		# Send Mesh to GPU:
-		self.mesh.reload() 
+			if visible != self.faceVisible[(key, faceIndex)]:
+				self.faceVisible[(key, faceIndex)] = visible
+				meshCmp.visible = visible
 
-		# Updating the Physics:
-		self.rbCmp.mesh.makeWeakRef(self.mesh)
+	def uploadCollider(self):
+		"""
+		Rebuilds the collision mesh (if the voxels changed) and submits it to the Physics.
+		"""
+		if self.collider:
+			self.collider.update()
+			self.collider.buffers.upload(self.collisionMesh)
+		else:
+			self.collisionMesh.reset()
+
+		if self.rbCmp is None:
+			if not self.collider or not self.collider.buffers.getQuadCount():
+				return
+			self.rbCmp = self.entity.add("RigidBodyComponent")
+
+		self.rbCmp.mesh.makeWeakRef(self.collisionMesh)
 		self.rbCmp.reload()
 
+	def buildCollider(self):
+		"""
+		Rebuilds the collision shape data without applying it (safe to call from a worker
+		thread). The result must be handed to applyCollider.
+		"""
+		return self.collider.build() if self.collider else None
+
+	def applyCollider(self, data):
+		if self.collider and data:
+			self.collider.apply(data)
+			self.uploadCollider()
+
+	def buildConnectivity(self):
+		"""
+		Like buildCollider, rebuilds the face connectivity data (safe to call from a
+		worker thread) to be handed to applyConnectivity.
+		"""
+		return self.connectivity.build()
+
+	def applyConnectivity(self, data):
+		self.connectivity.apply(data)
+
+	def isConnected(self, fromDir, toDir) -> bool:
+		"""
+		Returns True if the chunk may be seen through from its face in the fromDir
+		direction to the one in toDir, both (x, y, z) unit directions. Chunks not
+		built yet are assumed to be fully open.
+		"""
+		if not self.connectivity:
+			return True
+		return self.connectivity.connects(fromDir, toDir)
+
+	def isRegionConnected(self, pos, toDir) -> bool:
+		"""
+		Returns True if the empty region around the local (x, y, z) voxel position
+		reaches the face of the chunk in the toDir direction.
+		"""
+		if not self.connectivity:
+			return True
+		faces = self.connectivity.getRegionFaces(*pos)
+		return bool(faces & VoxelConnectivity.FACE_BITS[toDir])
+
 	def normalizePos(self, pos : cave.Vector3, local=False) -> cave.Vector3:
 		"""
 		This methid will convert a regular, world position vector into a local 
-		one that can be used to access the self.voxels matrix.
+		one that can be used to access the self.voxels grid.
 		"""
 		if not local:
 			pos = self.transf.untransformVector(pos)
@@ -139,19 +1549,140 @@ class VoxelChunk(cave.Component):
 	
 	def setBlock(self, value: int, pos : cave.Vector3, local=False) -> bool:
 		pos = self.normalizePos(pos, local)
-		if not self.isValidPos(pos):
+		if not self.isReady() or not self.isValidPos(pos):
 			return False
 		
-		self.voxels[int(pos.z)][int(pos.y)][int(pos.x)] = value
+		x, y, z = int(pos.x), int(pos.y), int(pos.z)
+		self.editSpans([(x, z, y, y + 1, value)])
 
-		self.buildVoxelMesh()
+		# Single block edits are shown right away:
+		self.flushEdits()
+		for neighbour in self.neighbours.values():
+			neighbour.flushEdits()
 		return True	
+
+	def editSpans(self, spans, replace: int = None) -> bool:
+		"""
+		Applies a batch of edits, given as (x, z, minY, maxY, value) spans of local voxel
+		columns, from minY (inclusive) to maxY (exclusive). Each span is written at once
+		and, if replace is set, only the voxels of that block type are changed. Parts out
+		of the chunk are ignored. The mesh is only flagged to be rebuilt (once, by
+		flushEdits), so any amount of edits costs a single remesh. Returns True if any
+		voxel changed.
+		"""
+		if not self.isReady():
+			return False
+
+		size = self.gridSize
+		lo, hi = [size] * 3, [0] * 3
+		for x, z, minY, maxY, value in spans:
+			minY, maxY = max(0, minY), min(size, maxY)
+			if minY >= maxY or not (0 <= x < size and 0 <= z < size):
+				continue
+
+			if self.voxels.fillSpan(x, z, minY, maxY, value, replace):
+				lo = [min(lo[0], x), min(lo[1], minY), min(lo[2], z)]
+				hi = [max(hi[0], x + 1), max(hi[1], maxY), max(hi[2], z + 1)]
+
+		if hi[0] == 0:
+			return False
+
+		self.markEdited(lo, hi)
+		return True
+
+	def markEdited(self, lo, hi):
+		"""
+		Flags everything depending on the voxels inside the [lo, hi) box as outdated:
+		the collider, the face connectivity, the mesh sections (and the LOD grid) and
+		the border of the neighbour chunks.
+		"""
+		if self.collider:
+			self.collider.markDirty()
+			self.colliderDirty = True
+
+		self.connectivity.markDirty()
+		self.connectivityDirty = True
+
+		if self.lodEdits is not None:
+			self.lodEdits.append((lo, hi))
+		self.markLodDirty(lo, hi)
+		self.edited = True
+
+	def markLodDirty(self, lo, hi):
+		"""
+		Flags the mesh sections (of the LOD grid, sampled again) touching the voxels inside
+		the [lo, hi) box and the border of the neighbour chunks to be remeshed.
+		"""
+		if self.lod:
+			# Samples the LOD grid again and switches to its coordinates:
+			factor = 2 ** self.lod
+			downsampled = self.voxels.downsample(factor)
+			self.lodVoxels.data[:] = downsampled.data
+			self.lodVoxels.solidCount = downsampled.solidCount
+
+			lo = [v // factor for v in lo]
+			hi = [-(-v // factor) for v in hi]
+
+		self.mesher.markBoxDirty(lo, hi)
+		self.updateNeighbourBorders(lo, hi)
+		self.meshDirty = True
+
+	def flushEdits(self):
+		"""
+		Remeshes the chunk if it was edited since the last flush.
+		"""
+		if self.meshDirty:
+			self.meshDirty = False
+			self.updateVoxelMesh()
+
+	def updateNeighbourBorders(self, lo, hi):
+		"""
+		An edit on the chunk border may also change which faces of the neighbour chunk
+		are visible, so the neighbour sections touching the edited [lo, hi) box are
+		flagged to be remeshed as well. The coordinates are in the LOD grid, which
+		neighbours at the same LOD share.
+		"""
+		size = self.lodVoxels.gridSize
+		borders = []
+		if lo[0] == 0:
+			borders.append(((-1, 0), 0, size - 1))
+		if hi[0] == size:
+			borders.append(((1, 0), 0, 0))
+		if lo[2] == 0:
+			borders.append(((0, -1), 2, size - 1))
+		if hi[2] == size:
+			borders.append(((0, 1), 2, 0))
+
+		for offset, axis, layer in borders:
+			neighbour = self.neighbours.get(offset)
+			if neighbour and neighbour.isReady() and neighbour.lod == self.lod:
+				borderLo, borderHi = list(lo), list(hi)
+				borderLo[axis], borderHi[axis] = layer, layer + 1
+				neighbour.mesher.markBoxDirty(borderLo, borderHi)
+				neighbour.meshDirty = True
 	
 	def getBlock(self, pos : cave.Vector3, local=False) -> int:
 		pos = self.normalizePos(pos, local)
-		if not self.isValidPos(pos):
+		if not self.isReady() or not self.isValidPos(pos):
 			return -1
-		return self.voxels[int(pos.z)][int(pos.y)][int(pos.x)]
+		return self.voxels.get(int(pos.x), int(pos.y), int(pos.z))
+
+	def getMemoryUsage(self) -> int:
+		"""
+		Returns how many bytes this chunk uses to store its voxels and its meshes (the
+		section buffers and collision mesh, plus their engine copies), or only its
+		encoded voxels once released.
+		"""
+		if not self.isReady():
+			return len(self.voxelData) if self.voxelData else 0
+
+		usage = self.voxels.getMemoryUsage()
+		if self.lod:
+			usage += self.lodVoxels.getMemoryUsage()
+		usage += sum(buffers.getMemoryUsage() for buffers in self.mesher.sections.values())
+		if self.collider:
+			usage += self.collider.buffers.getMemoryUsage()
+		return usage
 
 	def addBlock(self, pos : cave.Vector3, local=False) -> bool:
 		return self.setBlock(1, pos, local)
@@ -161,6 +1692,21 @@ class VoxelChunk(cave.Component):
 
 	def update(self):
 		events = cave.getEvents()
+
+		# Edits made during the frame are meshed together:
+		self.flushEdits()
+
+		camera = self.entity.getScene().getCamera()
+		if camera:
+			self.updateFaceBuckets(camera.getWorldPosition())
+
+		if self.colliderDirty and not self.asyncBuild:
+			self.colliderDirty = False
+			self.uploadCollider()
+
+		if self.connectivityDirty and not self.asyncBuild:
+			self.connectivityDirty = False
+			self.connectivity.update()
 		
 	def end(self, scene: cave.Scene):
 		pass
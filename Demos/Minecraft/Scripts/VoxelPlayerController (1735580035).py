@@ -10,6 +10,13 @@ class VoxelPlayerController(cave.Component):
 	walkSpeed = 2.0
 	runSpeed = 6.0
 
+	# How far (in blocks) the player can reach to add or remove blocks:
+	reach = 6.0
+
+	# Block type added with the left mouse button. The 1, 2 and 3 keys switch between
+	# regular blocks, sand and water (see the spawner's BlockSimulation):
+	blockType = 1
+
 	def start(self, scene: cave.Scene):
 		self.transf = self.entity.getTransform()
 		self.character : cave.CharacterComponent = self.entity.get("Character")
@@ -79,39 +86,34 @@ class VoxelPlayerController(cave.Component):
 		events = cave.getEvents()
 		scene = self.entity.getScene()
 
-		origin = self.camTransf.worldPosition
-		target = origin - self.camTransf.getForwardVector(True) * 1000
+		if events.pressed(cave.event.KEY_1):
+			self.blockType = 1
+		elif events.pressed(cave.event.KEY_2):
+			self.blockType = self.spawner.blocks.SAND
+		elif events.pressed(cave.event.KEY_3):
+			self.blockType = self.spawner.blocks.WATER
 
-		mask = cave.BitMask()
-		mask.disable(0)
+		origin = self.camTransf.worldPosition
+		direction = -self.camTransf.getForwardVector(True)
 
-		res = scene.rayCast(origin, target, mask)
+		# Walks the voxels instead of using a physics rayCast, so it knows exactly which
+		# block (and which of its faces) is being aimed at, even on edges and chunk seams:
+		hit = self.spawner.raycastVoxels(origin, direction, self.reach)
 
-		if res.hit:
-			pos = res.position + res.normal * 0.1
-			pos.x = cave.math.floor(pos.x) + 0.5
-			pos.y = cave.math.floor(pos.y) + 0.5
-			pos.z = cave.math.floor(pos.z) + 0.5
+		if hit and hit.adjacent:
+			pos = cave.Vector3(hit.adjacent[0] + 0.5, hit.adjacent[1] + 0.5, hit.adjacent[2] + 0.5)
 			
 			transf = cave.Transform()
 			transf.position = pos
 			transf.setScale(0.5)
 			
-			scene.addDebugSphere(res.position, 0.1, cave.Vector3(1,0,0))
+			scene.addDebugSphere(origin + direction * hit.distance, 0.1, cave.Vector3(1,0,0))
 			scene.addDebugCube(transf, cave.Vector3(1,1,1))
 
-			cmp = res.entity.get("VoxelChunk", True)
-
 			if events.pressed(cave.event.MOUSE_LEFT):
-				chunk = self.spawner.getChunk(pos)
-				if chunk:
-					cmp = chunk.get("VoxelChunk", True)
-
-				if cmp:
-					cmp.addBlock(res.position + res.normal * 0.1)
+				self.spawner.setVoxel(*hit.adjacent, self.blockType)
 			elif events.pressed(cave.event.MOUSE_RIGHT):
-				if cmp:
-					cmp.removeBlock(res.position - res.normal * 0.1)
+				self.spawner.setVoxel(*hit.block, 0)
 			
 	def update(self):
 		self.updateMovement()
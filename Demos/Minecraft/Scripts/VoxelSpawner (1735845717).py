@@ -1,5 +1,557 @@
 import cave
 import cave.math
+import heapq
+import math
+import mmap
+import os
+import re
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+class ChunkPipeline:
+	"""
+	Runs chunk build jobs in worker threads. A job is any callable that only produces
+	plain Python data (such as VoxelChunk.buildChunkData) and its result is handed
+	to the job's onDone callback by update(), in the main thread, since uploading
+	Meshes and reloading rigid bodies can only happen there.
+
+	With zero workers, the jobs run synchronously inside update(), in submission
+	order, which is deterministic and handy for tests.
+	"""
+
+	def __init__(self, workers: int = 2):
+		self.executor = ThreadPoolExecutor(max_workers=workers) if workers > 0 else None
+
+		# Pending jobs, in submission order, mapped by key: (job, onDone, future)
+		self.jobs = {}
+
+	def submit(self, key, job, onDone):
+		"""
+		Schedules the job. If there is already a job with this key, it is cancelled.
+		"""
+		self.cancel(key)
+		future = self.executor.submit(job) if self.executor else None
+		self.jobs[key] = (job, onDone, future)
+
+	def cancel(self, key) -> bool:
+		"""
+		Cancels a pending job. A job that is already running can't be interrupted, but
+		its result will be discarded. Returns False if there was no such job.
+		"""
+		entry = self.jobs.pop(key, None)
+		if entry and entry[2]:
+			entry[2].cancel()
+		return entry is not None
+
+	def isPending(self, key) -> bool:
+		return key in self.jobs
+
+	def getPendingCount(self) -> int:
+		return len(self.jobs)
+
+	def update(self, budgetMs: float = 4.0) -> int:
+		"""
+		Hands the finished jobs back to their onDone callbacks until the time budget
+		(in milliseconds) is used. Returns how many jobs were completed.
+		"""
+		startTime = time.perf_counter()
+		completed = 0
+
+		for key in list(self.jobs):
+			job, onDone, future = self.jobs[key]
+			if future and not future.done():
+				continue
+
+			del self.jobs[key]
+			onDone(future.result() if future else job())
+			completed += 1
+
+			if (time.perf_counter() - startTime) * 1000.0 >= budgetMs:
+				break
+		return completed
+
+	def flush(self):
+		"""
+		Waits for and completes every pending job, ignoring the time budget.
+		"""
+		while self.jobs:
+			for job, onDone, future in list(self.jobs.values()):
+				if future:
+					future.exception()
+			self.update(float("inf"))
+
+	def shutdown(self):
+		for key in list(self.jobs):
+			self.cancel(key)
+		if self.executor:
+			self.executor.shutdown(wait=False, cancel_futures=True)
+
+class RegionStore:
+	"""
+	Stores chunk voxel data on disk, grouping regionSize x regionSize chunks per
+	region file. Each file starts with a header and an offset table with one
+	(offset, length) entry per chunk, followed by the chunk data itself (encoded
+	with VoxelGrid.encode, which is already compact).
+
+	Saving a chunk again overwrites its data in place if the new data fits, otherwise
+	it is appended and its table entry points to it. Once the file has more unused
+	bytes than used ones (and at least compactBytes), it is compacted. It is safe to
+	use from multiple threads.
+	"""
+
+	MAGIC = b"VXR1"
+
+	# Regions with less unused bytes than this are never compacted:
+	compactBytes = 1024 * 1024
+
+	def __init__(self, folder: str, regionSize: int = 32):
+		self.folder = folder
+		self.regionSize = regionSize
+		self.lock = threading.Lock()
+
+		# Cached offset tables, mapped by region coordinates:
+		self.tables = {}
+
+		os.makedirs(folder, exist_ok=True)
+
+	def getHeaderSize(self) -> int:
+		return len(self.MAGIC) + self.regionSize * self.regionSize * 8
+
+	def getRegionPath(self, region) -> str:
+		return os.path.join(self.folder, f"r.{region[0]}.{region[1]}.bin")
+
+	def locate(self, coords):
+		"""
+		Returns the region coordinates and the table slot of a chunk.
+		"""
+		size = self.regionSize
+		region = (coords[0] // size, coords[1] // size)
+		slot = (coords[0] % size) + (coords[1] % size) * size
+		return region, slot
+
+	def getTable(self, region) -> list:
+		if region not in self.tables:
+			table = [(0, 0)] * (self.regionSize * self.regionSize)
+			path = self.getRegionPath(region)
+
+			if os.path.exists(path):
+				with open(path, "rb") as f:
+					header = f.read(self.getHeaderSize())
+				if len(header) == self.getHeaderSize() and header.startswith(self.MAGIC):
+					table = list(struct.iter_unpack("<II", header[len(self.MAGIC):]))
+			self.tables[region] = table
+		return self.tables[region]
+
+	def has(self, coords) -> bool:
+		region, slot = self.locate(coords)
+		with self.lock:
+			return self.getTable(region)[slot][1] > 0
+
+	def save(self, coords, data: bytes):
+		region, slot = self.locate(coords)
+
+		with self.lock:
+			table = self.getTable(region)
+			path = self.getRegionPath(region)
+
+			if not os.path.exists(path):
+				with open(path, "wb") as f:
+					f.write(self.MAGIC + struct.pack("<II", 0, 0) * len(table))
+
+			with open(path, "r+b") as f:
+				offset, length = table[slot]
+				if len(data) > length:
+					f.seek(0, os.SEEK_END)
+					offset = f.tell()
+				else:
+					f.seek(offset)
+				f.write(data)
+
+				f.seek(len(self.MAGIC) + slot * 8)
+				f.write(struct.pack("<II", offset, len(data)))
+				fileSize = f.seek(0, os.SEEK_END)
+			table[slot] = (offset, len(data))
+
+			used = sum(length for offset, length in table)
+			unused = fileSize - self.getHeaderSize() - used
+			if unused > max(used, self.compactBytes):
+				self.compact(region)
+
+	def compact(self, region):
+		"""
+		Rewrites the region file with only the current data of its chunks, back to back.
+		It must be called with the lock held.
+		"""
+		table = self.getTable(region)
+		path = self.getRegionPath(region)
+
+		newTable = []
+		offset = self.getHeaderSize()
+		with open(path, "rb") as f:
+			blobs = []
+			for blobOffset, length in table:
+				f.seek(blobOffset)
+				blobs.append(f.read(length) if length else b"")
+				newTable.append((offset if length else 0, length))
+				offset += length
+
+		# Written to a temporary file first, so a crash never loses the old one:
+		temp = f"{path}.tmp"
+		with open(temp, "wb") as f:
+			f.write(self.MAGIC + b"".join(struct.pack("<II", *entry) for entry in newTable))
+			for blob in blobs:
+				f.write(blob)
+		os.replace(temp, path)
+		self.tables[region] = newTable
+
+	def load(self, coords) -> bytes:
+		"""
+		Returns the chunk data or None if it was never saved.
+		"""
+		region, slot = self.locate(coords)
+
+		with self.lock:
+			offset, length = self.getTable(region)[slot]
+			if length == 0:
+				return None
+
+			with open(self.getRegionPath(region), "rb") as f:
+				f.seek(offset)
+				return f.read(length)
+
+class ChunkCache:
+	"""
+	Caches the generated chunks (their voxels and finished mesh, encoded with
+	VoxelChunk.encodeCache) on the disk, one file per chunk and LOD, so the same
+	chunks don't need to be generated and meshed again every time the world starts.
+	Each file starts with a header holding the key it was saved for (world seed,
+	grid size, chunk coordinates and LOD), the data length and its checksum, and
+	it is read through a memory map. Files that don't match are ignored.
+
+	Only generated chunks belong here (the key has nothing about the world's saved
+	edits), so edited chunks must be invalidated. Saves and invalidations of the same
+	chunk are serialised: a save started before an invalidation (see getGeneration)
+	is dropped. It is safe to use from multiple threads. The cache is only an
+	optimization, so disk errors (such as a full or read-only folder) never raise:
+	the saves are skipped and the loads are misses.
+	"""
+
+	MAGIC = b"VXC1"
+
+	# Magic, world seed, grid size, chunk x, chunk z, LOD, data length and checksum:
+	HEADER = "<4sqHiiBII"
+
+	def __init__(self, folder: str, worldSeed: int, gridSize: int):
+		self.folder = folder
+		self.key = (worldSeed, gridSize)
+
+		# How many chunks were (and weren't) found in the cache, and the (coords, LOD) of
+		# the valid cached chunks loaded or saved in this session:
+		self.hits = 0
+		self.misses = 0
+		self.valid = set()
+
+		# How many times each chunk was invalidated, mapped by its coordinates:
+		self.generations = {}
+		self.lock = threading.Lock()
+
+		try:
+			os.makedirs(folder, exist_ok=True)
+		except OSError:
+			pass
+
+	def getPath(self, coords, lod: int) -> str:
+		return os.path.join(self.folder, f"c.{coords[0]}.{coords[1]}.{lod}.bin")
+
+	def has(self, coords, lod: int) -> bool:
+		"""
+		Returns True if the chunk is known to be cached at the LOD (files left by other
+		sessions are only known after being loaded).
+		"""
+		with self.lock:
+			return (coords, lod) in self.valid
+
+	def getGeneration(self, coords) -> int:
+		with self.lock:
+			return self.generations.get(coords, 0)
+
+	def save(self, coords, lod: int, data: bytes, generation: int = None) -> bool:
+		"""
+		Saves the chunk data, unless the chunk was invalidated since the given generation
+		(see getGeneration) was read, when the data was encoded. Returns True if saved,
+		False if dropped or if it couldn't be written.
+		"""
+		header = struct.pack(self.HEADER, self.MAGIC, *self.key, coords[0], coords[1], lod, len(data), zlib.crc32(data))
+		path = self.getPath(coords, lod)
+
+		# Written to a temporary file first, so a crash never leaves a partial file behind:
+		temp = f"{path}.{threading.get_ident()}.tmp"
+		try:
+			with open(temp, "wb") as f:
+				f.write(header)
+				f.write(data)
+
+			with self.lock:
+				if generation is not None and generation != self.generations.get(coords, 0):
+					os.remove(temp)
+					return False
+				os.replace(temp, path)
+				self.valid.add((coords, lod))
+			return True
+		except OSError:
+			try:
+				os.remove(temp)
+			except OSError:
+				pass
+			return False
+
+	def load(self, coords, lod: int, reader):
+		"""
+		Memory maps the cached chunk and hands its data (a memoryview, only valid while
+		reader runs) to reader, returning its result. Returns None if the chunk isn't
+		cached or if its file doesn't match the key or the checksum.
+		"""
+		result = None
+		try:
+			with open(self.getPath(coords, lod), "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+				with memoryview(mapped) as view:
+					result = self.read(view, coords, lod, reader)
+		except (OSError, ValueError, struct.error):
+			result = None
+
+		with self.lock:
+			if result is None:
+				self.misses += 1
+			else:
+				self.hits += 1
+				self.valid.add((coords, lod))
+		return result
+
+	def read(self, view, coords, lod: int, reader):
+		headerSize = struct.calcsize(self.HEADER)
+		magic, seed, gridSize, x, z, cachedLod, length, checksum = struct.unpack_from(self.HEADER, view)
+
+		if magic != self.MAGIC or (seed, gridSize) != self.key or (x, z, cachedLod) != (coords[0], coords[1], lod):
+			return None
+		if len(view) != headerSize + length:
+			return None
+
+		with view[headerSize:] as data:
+			if zlib.crc32(data) != checksum:
+				return None
+			return reader(data)
+
+	def invalidate(self, coords, maxLod: int):
+		"""
+		Removes the cached chunk, at every LOD, and drops its saves still in progress.
+		"""
+		with self.lock:
+			self.generations[coords] = self.generations.get(coords, 0) + 1
+			for lod in range(maxLod + 1):
+				self.valid.discard((coords, lod))
+				try:
+					os.remove(self.getPath(coords, lod))
+				except OSError:
+					pass
+
+class BlockSimulation:
+	"""
+	Simulates the blocks that move by themselves: sand falls until it lands (sinking
+	through water) and water falls and then spreads sideways, one level weaker per
+	block, until it runs out of levels. Water sources (WATER) have the full level and
+	flowing water is stored as WATER + 1 (the strongest) to WATER + WATER_LEVELS.
+
+	Only the active cells are ever looked at: each chunk has the set of its sand and
+	water cells that may move, and they only become active when something around them
+	changes (see activateSpans). So the work per tick follows the amount of blocks
+	moving, not the size of the world or of the edits.
+
+	The voxels are read through getVoxel, and getVoxels for whole chunk grids, and each
+	tick returns its changes as (x, y, z, value) edits, to be applied as a batch.
+	"""
+
+	SAND = 2
+	WATER = 3
+	WATER_LEVELS = 7
+
+	# Matches any simulated block type (sand and all the water levels):
+	SIMULATED_PATTERN = re.compile(b"[%c-%c]" % (SAND, WATER + WATER_LEVELS))
+
+	# Horizontal neighbour offsets, as (x, z):
+	SIDES = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+	def __init__(self, gridSize: int, getVoxel, getVoxels):
+		self.gridSize = gridSize
+		self.getVoxel = getVoxel
+		self.getVoxels = getVoxels
+
+		# The local (x, y, z) active cells of each chunk, mapped by its chunk coordinates:
+		self.activeCells = {}
+
+		# How many cells were stepped and changed in the last tick:
+		self.steps = 0
+		self.changes = 0
+
+	def getActiveCount(self) -> int:
+		return sum(len(cells) for cells in self.activeCells.values())
+
+	def activateSpans(self, spans):
+		"""
+		Makes the simulated blocks of the changed (x, z, minY, maxY, ...) world column
+		spans active, and the ones just around them, since they may start moving now.
+		The voxels are searched with a regex, right on the chunk grids, and the chunks
+		without any simulated block are skipped at once.
+		"""
+		size = self.gridSize
+		pattern = self.SIMULATED_PATTERN
+		grids = {}
+
+		def getGrid(coords):
+			if coords not in grids:
+				voxels = self.getVoxels(coords)
+				grids[coords] = voxels if voxels and pattern.search(voxels.data) else None
+			return grids[coords]
+
+		for span in spans:
+			x, z, minY, maxY = span[:4]
+
+			# Spans away from the chunk borders only touch their own chunk:
+			lx, lz = x % size, z % size
+			if 0 < lx < size - 1 and 0 < lz < size - 1 and not getGrid((x // size, z // size)):
+				continue
+
+			for dx, dz in ((0, 0),) + self.SIDES:
+				cx, cz = x + dx, z + dz
+				coords = (cx // size, cz // size)
+				voxels = getGrid(coords)
+				if not voxels:
+					continue
+
+				# Above and below the span, only its own column:
+				if dx == 0 and dz == 0:
+					start, end = max(0, minY - 1), min(size, maxY + 1)
+				else:
+					start, end = max(0, minY), min(size, maxY)
+
+				column = voxels.columnIndex(cx % size, cz % size)
+				for match in pattern.finditer(voxels.data, column + start, column + end):
+					self.activeCells.setdefault(coords, set()).add((cx % size, match.start() - column, cz % size))
+
+	def removeChunk(self, coords):
+		self.activeCells.pop(coords, None)
+
+	def getWaterLevel(self, block: int) -> int:
+		"""
+		Returns the level of a water block (WATER_LEVELS + 1 for sources) or 0 for other blocks.
+		"""
+		if block == self.WATER:
+			return self.WATER_LEVELS + 1
+		if self.WATER < block <= self.WATER + self.WATER_LEVELS:
+			return self.WATER + self.WATER_LEVELS + 1 - block
+		return 0
+
+	def getFlowingWater(self, level: int) -> int:
+		return self.WATER + self.WATER_LEVELS + 1 - level
+
+	def tick(self, budget: int, chunks) -> list:
+		"""
+		Steps up to budget active cells of the given chunks (the active cells of the
+		other chunks wait until they are given again) and returns the resulting edits.
+		Cells already changed in this tick are skipped, so a block moves once per tick.
+		"""
+		size = self.gridSize
+		changes = {}
+		self.steps = 0
+
+		def read(pos):
+			value = changes.get(pos)
+			return self.getVoxel(*pos) if value is None else value
+
+		for coords in list(self.activeCells):
+			if self.steps >= budget:
+				break
+			if coords not in chunks:
+				continue
+
+			cells = self.activeCells[coords]
+			baseX, baseZ = coords[0] * size, coords[1] * size
+			while cells and self.steps < budget:
+				x, y, z = cells.pop()
+				pos = (baseX + x, y, baseZ + z)
+				self.steps += 1
+				if pos not in changes:
+					self.step(pos, read, changes)
+
+			if not cells:
+				del self.activeCells[coords]
+
+		self.changes = len(changes)
+		return [(x, y, z, value) for (x, y, z), value in changes.items()]
+
+	def step(self, pos, read, changes):
+		block = read(pos)
+		if block == self.SAND:
+			self.stepSand(pos, read, changes)
+		elif self.getWaterLevel(block):
+			self.stepWater(pos, self.getWaterLevel(block), read, changes)
+
+	def stepSand(self, pos, read, changes):
+		x, y, z = pos
+		below = read((x, y - 1, z))
+
+		# Unknown voxels (-1, out of the world or of the loaded chunks) count as solid:
+		if below == 0 or self.getWaterLevel(below):
+			changes[(x, y - 1, z)] = self.SAND
+			changes[pos] = below
+
+	def stepWater(self, pos, level: int, read, changes):
+		x, y, z = pos
+		below = read((x, y - 1, z))
+
+		if below == 0:
+			# Falling water keeps its strength:
+			changes[(x, y - 1, z)] = self.getFlowingWater(self.WATER_LEVELS)
+			return
+		if below < 0 or self.getWaterLevel(below):
+			return
+
+		# On the ground, spreads to the empty (or weaker water) cells around it:
+		if level <= 1:
+			return
+		flowing = self.getFlowingWater(level - 1)
+		for dx, dz in self.SIDES:
+			side = (x + dx, y, z + dz)
+			block = read(side)
+			if block == 0 or (block != self.WATER and 0 < self.getWaterLevel(block) < level - 1):
+				changes[side] = flowing
+
+class VoxelRayHit:
+	"""
+	Result of VoxelSpawner.raycastVoxels. All the voxel positions are integer (x, y, z)
+	world coordinates.
+	"""
+
+	def __init__(self, block, blockType, normal, distance):
+		# The voxel that was hit and its block type:
+		self.block = block
+		self.blockType = blockType
+
+		# Normal of the face that was hit. It is (0, 0, 0) if the ray started inside the block:
+		self.normal = normal
+
+		# Distance from the ray origin to the hit point:
+		self.distance = distance
+
+		# The empty voxel in front of the face that was hit (where a new block would go):
+		self.adjacent = None
+		if normal != (0, 0, 0):
+			self.adjacent = (block[0] + normal[0], block[1] + normal[1], block[2] + normal[2])
 
 class VoxelSpawner(cave.Component):
 	"""
@@ -8,11 +560,69 @@ class VoxelSpawner(cave.Component):
 	build the world as you move around.
 	"""
 
+	# (x, z) chunk offsets of the four neighbours of a chunk:
+	NEIGHBOUR_OFFSETS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
 	gridSize   = 16
+	worldSeed  = 0
 	
 	spawnRange = 1
 	initialSpawnRange = 3
 
+	# Max time (in milliseconds) per frame spent spawning the queued chunks. Chunks are
+	# queued by distance, preferring the ones in front of the camera (forwardBias, from
+	# 0 to 1) and around where the player will be in prefetchSeconds at its current speed:
+	spawnBudgetMs = 2.0
+	forwardBias = 0.5
+	prefetchSeconds = 1.0
+
+	# Chunks are built by this many worker threads (0 builds them synchronously):
+	workerThreads = 2
+
+	# Max time (in milliseconds) per frame spent uploading the finished chunks:
+	uploadBudgetMs = 4.0
+
+	# Chunks that are still being built and get farther than this from the player are cancelled:
+	cancelRange = 4
+
+	# Chunks farther than this from the player are deactivated and kept in a cache. When the
+	# cache uses more than cacheMemoryMB (see VoxelChunk.getMemoryUsage) or has more than
+	# maxCachedChunks chunks (each one still an Entity with its components), the least recently
+	# used chunks are removed, saving the edited ones to disk (inside regionFolder). An empty
+	# regionFolder uses a temporary folder that is deleted when the game ends, otherwise the
+	# edited chunks are also saved there when the game ends:
+	unloadRange = 5
+	cacheMemoryMB = 32.0
+	maxCachedChunks = 256
+	regionFolder = ""
+
+	# Chunks farther than lodRange from the player are meshed from downsampled voxels
+	# and have no collider. The resolution halves every lodStep chunks, down to 2^maxLod
+	# times smaller (8x with maxLod = 3):
+	lodRange = 2
+	lodStep = 2
+	maxLod = 3
+
+	# Sand and water blocks (see BlockSimulation) are simulated at blockTickRate ticks per
+	# second, stepping at most blockTickBudget active cells per tick (the others wait for
+	# the next ticks). After a long frame, up to maxBlockTicks ticks run to catch up:
+	blockTickRate = 10.0
+	blockTickBudget = 512
+	maxBlockTicks = 4
+
+	# Generated chunks (voxels and meshes) are cached on the disk, inside chunkCacheFolder
+	# (or a folder in the system temporary one, if empty), so starting the world again
+	# doesn't generate and mesh them all again. Edited chunks are never cached:
+	chunkCache = True
+	chunkCacheFolder = ""
+
+	# Loaded chunks outside of the camera frustum (frustumCulling) or hidden behind other
+	# chunks (occlusionCulling) are deactivated until they can be seen again. Chunks up
+	# to cullSafeRange from the player are never culled, since it may collide with them:
+	frustumCulling = True
+	occlusionCulling = True
+	cullSafeRange = 1
+
 	def start(self, scene: cave.Scene):
 		self.transf = self.entity.getTransform()
 
@@ -21,43 +631,957 @@ class VoxelSpawner(cave.Component):
 
 		self.chunkBase = scene.get("ChunkBase")
 
-		self.spawnChunks(self.initialSpawnRange)
+		self.pipeline = ChunkPipeline(self.workerThreads)
 
-	def getChunk(self, worldPos) -> cave.Entity:
+		self.tempFolder = None if self.regionFolder else tempfile.mkdtemp(prefix="VoxelWorld")
+		folder = self.regionFolder or self.tempFolder
+		self.regions = RegionStore(os.path.join(folder, f"{self.worldSeed}-{self.gridSize}"))
+
+		self.cache = None
+		if self.chunkCache:
+			folder = self.chunkCacheFolder or os.path.join(tempfile.gettempdir(), "VoxelWorldCache")
+			self.cache = ChunkCache(os.path.join(folder, f"{self.worldSeed}-{self.gridSize}"), self.worldSeed, self.gridSize)
+
+		# Every chunk entity (pending, loaded or cached), mapped by its (x, z) chunk
+		# coordinates to its (Entity, VoxelChunk):
+		self.chunkIndex = {}
+
+		# Chunks that are still being built, mapped by their chunk coordinates:
+		self.pendingChunks = {}
+
+		# Active chunks and deactivated (cached) ones, from the least to the most recently used,
+		# and the memory used by each cached chunk when it was cached:
+		self.loadedChunks = {}
+		self.cachedChunks = OrderedDict()
+		self.cachedMemory = {}
+		self.cacheMemory = 0
+
+		# Voxels of the evicted chunks still being written to the regions (in the pipeline),
+		# mapped by their chunk coordinates. A chunk spawned meanwhile is built from them:
+		self.regionSaves = {}
+
+		# LOD level of the loaded chunks being rebuilt, mapped by their chunk coordinates,
+		# and the chunk the player was in when the LODs were last updated:
+		self.pendingLods = {}
+		self.lodCenter = None
+
+		# Chunks edited in the current frame, to be remeshed at its end:
+		self.editedChunks = set()
+
+		# Streaming state: the smoothed player velocity (in world units per second) used
+		# to prefetch chunks, the queue of missing chunks as a heap of (priority, coords)
+		# and the (center, prefetch center) it was built for:
+		self.lastPosition = self.transf.getWorldPosition()
+		self.velocity = (0.0, 0.0)
+		self.spawnQueue = []
+		self.queueCenters = None
+
+		# Streaming stats of the last frame, for tuning (see getStreamingStats):
+		self.spawnedChunks = 0
+		self.spawnTimeMs = 0.0
+
+		# The sand and water simulation, the time not simulated yet (in seconds) and the
+		# ticks run in the last frame:
+		self.blocks = BlockSimulation(self.gridSize, self.getVoxel, self.getChunkVoxels)
+		self.blockTime = 0.0
+		self.blockTicks = 0
+
+		# Loaded chunks deactivated by the culling and its stats of the last frame (see getCullingStats):
+		self.culledChunks = set()
+		self.cullingStats = {"drawn": 0, "culled": 0, "outsideFrustum": 0, "occluded": 0, "cullTimeMs": 0.0}
+
+		self.spawnChunks(self.initialSpawnRange, math.inf)
+
+	def getChunkCoords(self, worldPos) -> tuple:
+		"""
+		Returns the (x, z) chunk coordinates of a world position.
+		"""
 		pos = worldPos / self.gridSize
-		pos.x = cave.math.floor(pos.x)
-		pos.z = cave.math.floor(pos.z)
-		chunkName = f"{int(pos.x)}x{int(pos.z)}"
-		return self.chunks.getChild(chunkName, False)
+		return int(cave.math.floor(pos.x)), int(cave.math.floor(pos.z))
+
+	def getChunk(self, worldPos) -> cave.Entity:
+		entry = self.chunkIndex.get(self.getChunkCoords(worldPos))
+		return entry[0] if entry else None
+
+	def getChunkAt(self, coords) -> "VoxelChunk":
+		"""
+		Returns the VoxelChunk at the (x, z) chunk coordinates, or None if there is none.
+		"""
+		entry = self.chunkIndex.get(coords)
+		return entry[1] if entry else None
+
+	def resolvePosition(self, worldPos):
+		"""
+		Given a world position, returns the ready VoxelChunk containing it and the local
+		(x, y, z) voxel coordinates inside it. Returns (None, None) if there is no such
+		chunk or if the position is out of the chunk height.
+		"""
+		coords = self.getChunkCoords(worldPos)
+		entry = self.chunkIndex.get(coords)
+		if not entry or not entry[1].isReady():
+			return None, None
+
+		y = int(cave.math.floor(worldPos.y))
+		if y < 0 or y >= self.gridSize:
+			return None, None
+
+		x = int(cave.math.floor(worldPos.x)) - coords[0] * self.gridSize
+		z = int(cave.math.floor(worldPos.z)) - coords[1] * self.gridSize
+		return entry[1], (x, y, z)
+
+	def getVoxel(self, x: int, y: int, z: int) -> int:
+		"""
+		Returns the block type at the integer world voxel position, or -1 if its chunk isn't ready.
+		"""
+		size = self.gridSize
+		entry = self.chunkIndex.get((x // size, z // size))
+		if not entry or not entry[1].isReady() or y < 0 or y >= size:
+			return -1
+		return entry[1].voxels.get(x % size, y, z % size)
+
+	def getChunkVoxels(self, coords):
+		"""
+		Returns the VoxelGrid of the chunk at the given chunk coordinates, or None if it isn't ready.
+		"""
+		entry = self.chunkIndex.get(coords)
+		if not entry or not entry[1].isReady():
+			return None
+		return entry[1].voxels
+
+	def setVoxel(self, x: int, y: int, z: int, value: int) -> bool:
+		"""
+		Sets the block type at the integer world voxel position, remeshing its chunk.
+		"""
+		size = self.gridSize
+		coords = (x // size, z // size)
+		chunk = self.getChunkAt(coords)
+		if not chunk:
+			return False
+
+		edited = chunk.edited
+		if not chunk.setBlock(value, cave.Vector3(x % size, y, z % size), local=True):
+			return False
+		if not edited:
+			self.invalidateCache(coords)
+		self.blocks.activateSpans([(x, z, y, y + 1)])
+		return True
+
+	def editVoxels(self, spans, replace: int = None) -> int:
+		"""
+		Applies a batch of edits given as (x, z, minY, maxY, value) spans of world voxel
+		columns (maxY is exclusive), which may span any number of chunks. The spans are
+		grouped per chunk and written in bulk, and each edited chunk is remeshed once, at
+		the end of the frame. If replace is set, only voxels of that block type change.
+		The simulated blocks around the edited chunks' spans are woken up. Returns how
+		many chunks were edited.
+		"""
+		size = self.gridSize
+		chunkSpans = {}
+		for span in spans:
+			chunkSpans.setdefault((span[0] // size, span[1] // size), []).append(span)
+
+		edited = 0
+		for coords, worldSpans in chunkSpans.items():
+			chunk = self.getChunkAt(coords)
+			if not chunk:
+				continue
+
+			wasEdited = chunk.edited
+			if chunk.editSpans([(x % size, z % size, minY, maxY, value) for x, z, minY, maxY, value in worldSpans], replace):
+				self.editedChunks.add(chunk)
+				if not wasEdited:
+					self.invalidateCache(coords)
+				self.blocks.activateSpans(worldSpans)
+				edited += 1
+		return edited
+
+	def applyEdits(self, edits) -> int:
+		"""
+		Applies a list of (x, y, z, value) world voxel edits, as a single batch.
+		"""
+		return self.editVoxels([(x, z, y, y + 1, value) for x, y, z, value in edits])
+
+	def fillBox(self, lo, hi, value: int, replace: int = None) -> int:
+		"""
+		Fills the world voxels inside the box from lo (inclusive) to hi (exclusive), both
+		(x, y, z) integer positions, as a single batch.
+		"""
+		return self.editVoxels([
+			(x, z, lo[1], hi[1], value) for x in range(lo[0], hi[0]) for z in range(lo[2], hi[2])
+		], replace)
+
+	def fillSphere(self, center, radius: float, value: int, replace: int = None) -> int:
+		"""
+		Fills the world voxels whose centers are inside the sphere, as a single batch.
+		Every column of the sphere is a single span.
+		"""
+		cx, cy, cz = center
+		spans = []
+		for x in range(int(math.floor(cx - radius)), int(math.ceil(cx + radius)) + 1):
+			for z in range(int(math.floor(cz - radius)), int(math.ceil(cz + radius)) + 1):
+				dx, dz = x + 0.5 - cx, z + 0.5 - cz
+				height = radius * radius - dx * dx - dz * dz
+				if height < 0.0:
+					continue
+
+				height = math.sqrt(height)
+				minY = int(math.ceil(cy - height - 0.5))
+				maxY = int(math.floor(cy + height - 0.5)) + 1
+				if minY < maxY:
+					spans.append((x, z, minY, maxY, value))
+		return self.editVoxels(spans, replace)
+
+	def flushEdits(self):
+		"""
+		Remeshes the chunks edited in this frame (and the neighbours whose borders
+		they changed), once each.
+		"""
+		for chunk in self.editedChunks:
+			chunk.flushEdits()
+			for neighbour in chunk.neighbours.values():
+				neighbour.flushEdits()
+		self.editedChunks.clear()
+
+	def invalidateCache(self, coords):
+		"""
+		Removes a chunk from the chunk cache, once it's first edited.
+		"""
+		if self.cache:
+			self.pipeline.cancel(("cache", coords))
+			self.cache.invalidate(coords, self.maxLod)
+
+	def cacheChunk(self, coords, chunk, wait: bool = False):
+		"""
+		Saves a chunk to the chunk cache, unless it's already cached at its LOD, its mesh
+		isn't up to date or its voxels weren't generated (read back from the regions,
+		they may hold edits). Edited chunks are removed from the cache instead (edits
+		made through the VoxelChunk itself are only noticed here). The data is encoded
+		right away and written in the pipeline (or right away, if wait is True).
+		"""
+		if not self.cache or not chunk.isReady():
+			return
+		if chunk.edited:
+			self.invalidateCache(coords)
+			return
+		if not chunk.generated or chunk.mesher.dirtySections or self.cache.has(coords, chunk.lod):
+			return
+
+		lod, data = chunk.lod, chunk.encodeCache()
+		generation = self.cache.getGeneration(coords)
+		if wait:
+			self.cache.save(coords, lod, data, generation)
+		else:
+			self.pipeline.submit(("cache", coords), lambda: self.cache.save(coords, lod, data, generation), lambda result: None)
+
+	def updateBlocks(self):
+		"""
+		Runs the block simulation ticks due since the last frame, at the fixed
+		blockTickRate. The edits of every tick go through editVoxels, so each changed
+		chunk is still remeshed only once (by flushEdits, at the end of the frame).
+		"""
+		interval = 1.0 / self.blockTickRate
+		self.blockTime += cave.getDeltaTime()
+		self.blockTicks = 0
+
+		while self.blockTime >= interval and self.blockTicks < self.maxBlockTicks:
+			self.blockTime -= interval
+			self.blockTicks += 1
+
+			edits = self.blocks.tick(self.blockTickBudget, self.loadedChunks)
+			if edits:
+				self.applyEdits(edits)
+
+		# Too far behind (after a long frame), so the missed ticks are dropped:
+		self.blockTime = min(self.blockTime, interval)
+
+	def getSimulationStats(self) -> dict:
+		"""
+		Returns the block simulation numbers: the active cells waiting to be stepped,
+		the ticks run in the last frame and the cells stepped and changed in the last tick.
+		"""
+		return {
+			"active": self.blocks.getActiveCount(),
+			"ticks": self.blockTicks,
+			"steps": self.blocks.steps,
+			"changes": self.blocks.changes,
+		}
+
+	def raycastVoxels(self, origin: cave.Vector3, direction: cave.Vector3, maxDistance: float = 8.0) -> VoxelRayHit:
+		"""
+		Walks the voxel grid, one voxel at a time, from the origin along the direction
+		(Amanatides & Woo traversal), crossing the chunk borders as needed. Returns a
+		VoxelRayHit for the first solid voxel within maxDistance or None.
+		"""
+		length = direction.length()
+		if length == 0.0:
+			return None
 
-	def spawnChunks(self, spawnRange=1):
+		pos = (origin.x, origin.y, origin.z)
+		dir = (direction.x / length, direction.y / length, direction.z / length)
+		voxel = [int(math.floor(v)) for v in pos]
+
+		step, tMax, tDelta = [0, 0, 0], [math.inf] * 3, [math.inf] * 3
+		for axis in range(3):
+			if dir[axis] > 0:
+				step[axis] = 1
+				tMax[axis] = (voxel[axis] + 1 - pos[axis]) / dir[axis]
+				tDelta[axis] = 1 / dir[axis]
+			elif dir[axis] < 0:
+				step[axis] = -1
+				tMax[axis] = (voxel[axis] - pos[axis]) / dir[axis]
+				tDelta[axis] = -1 / dir[axis]
+
+		size = self.gridSize
+		normal = (0, 0, 0)
+		distance = 0.0
+		coords, chunk = None, None
+
+		while distance <= maxDistance:
+			x, y, z = voxel
+			if 0 <= y < size:
+				# Only looks the chunk up again when the ray enters a new one:
+				if coords != (x // size, z // size):
+					coords = (x // size, z // size)
+					chunk = self.getChunkAt(coords)
+					chunk = chunk if chunk and chunk.isReady() else None
+
+				if chunk:
+					block = chunk.voxels.get(x % size, y, z % size)
+					if block:
+						return VoxelRayHit((x, y, z), block, normal, distance)
+			elif (y < 0 and step[1] <= 0) or (y >= size and step[1] >= 0):
+				# Left the world height and will never come back:
+				return None
+
+			# Steps into the next voxel through the closest boundary:
+			axis = tMax.index(min(tMax))
+			distance = tMax[axis]
+			tMax[axis] += tDelta[axis]
+			voxel[axis] += step[axis]
+
+			normal = [0, 0, 0]
+			normal[axis] = -step[axis]
+			normal = tuple(normal)
+		return None
+
+	def updateVelocity(self):
+		"""
+		Tracks the horizontal speed of the player, smoothed over a few frames.
+		"""
+		pos = self.transf.getWorldPosition()
+		dt = cave.getDeltaTime()
+		if dt > 0.0:
+			blend = min(1.0, dt * 4.0)
+			vx = (pos.x - self.lastPosition.x) / dt
+			vz = (pos.z - self.lastPosition.z) / dt
+			self.velocity = (
+				self.velocity[0] + (vx - self.velocity[0]) * blend,
+				self.velocity[1] + (vz - self.velocity[1]) * blend
+			)
+		self.lastPosition = pos
+
+	def getPrefetchCenter(self, spawnRange: int) -> tuple:
+		"""
+		Returns the chunk coordinates where the player is expected to be in prefetchSeconds.
+		It never gets so far that its chunks would be cancelled or unloaded right away.
+		"""
+		pos = self.transf.worldPosition
+		maxOffset = max(0, min(self.cancelRange, self.unloadRange) - spawnRange) * self.gridSize
+
+		offsetX = self.velocity[0] * self.prefetchSeconds
+		offsetZ = self.velocity[1] * self.prefetchSeconds
+		length = math.hypot(offsetX, offsetZ)
+		if length > maxOffset:
+			offsetX, offsetZ = offsetX * maxOffset / length, offsetZ * maxOffset / length
+
+		return (
+			int(math.floor((pos.x + offsetX) / self.gridSize)),
+			int(math.floor((pos.z + offsetZ) / self.gridSize))
+		)
+
+	def getChunkPriority(self, coords, forward) -> float:
+		"""
+		Lower values are spawned first: the distance (in chunks) from the player to the chunk
+		center, reduced for chunks in front of the camera and increased for the ones behind.
+		"""
+		pos = self.transf.worldPosition
+		dx = coords[0] + 0.5 - pos.x / self.gridSize
+		dz = coords[1] + 0.5 - pos.z / self.gridSize
+		distance = math.hypot(dx, dz)
+		if distance == 0.0:
+			return 0.0
+
+		facing = (dx * forward[0] + dz * forward[1]) / distance
+		return distance * (1.0 - self.forwardBias * facing)
+
+	def getCameraForward(self) -> tuple:
+		"""
+		Returns the normalized horizontal (x, z) direction the camera is looking at.
+		"""
+		forward = -self.entity.getScene().getCamera().getForwardVector(True)
+		length = math.hypot(forward.x, forward.z)
+		if length == 0.0:
+			return (0.0, 0.0)
+		return (forward.x / length, forward.z / length)
+
+	def queueChunks(self, spawnRange: int):
+		"""
+		Rebuilds the queue with the missing chunks around the player and around the prefetch
+		center. It only does so when the player moves to another chunk (or is expected to),
+		or if there are still chunks left to spawn, since the camera may have turned.
+		"""
+		center = self.getChunkCoords(self.transf.worldPosition)
+		centers = (center, self.getPrefetchCenter(spawnRange), spawnRange)
+		if centers == self.queueCenters and not self.spawnQueue:
+			return
+		self.queueCenters = centers
+
+		missing = set()
+		for centerX, centerZ in set(centers[:2]):
+			for x in range(-spawnRange, spawnRange + 1):
+				for z in range(-spawnRange, spawnRange + 1):
+					coords = (centerX + x, centerZ + z)
+					if coords in self.cachedChunks or coords not in self.chunkIndex:
+						missing.add(coords)
+
+		forward = self.getCameraForward()
+		self.spawnQueue = [(self.getChunkPriority(coords, forward), coords) for coords in missing]
+		heapq.heapify(self.spawnQueue)
+
+	def spawnChunks(self, spawnRange=1, budgetMs: float = None):
+		"""
+		Spawns (or reactivates) the queued chunks, in priority order, until the time budget
+		(in milliseconds, spawnBudgetMs by default) is used. At least one chunk is spawned
+		per frame, so a tiny budget never stalls the streaming.
+		"""
+		self.queueChunks(spawnRange)
+		budgetMs = self.spawnBudgetMs if budgetMs is None else budgetMs
+
+		startTime = time.perf_counter()
+		self.spawnedChunks = 0
+
+		while self.spawnQueue:
+			priority, coords = heapq.heappop(self.spawnQueue)
+			if coords in self.cachedChunks:
+				self.reactivateChunk(coords)
+			elif coords not in self.chunkIndex:
+				self.spawnChunk(coords)
+			else:
+				continue
+			self.spawnedChunks += 1
+
+			if (time.perf_counter() - startTime) * 1000.0 >= budgetMs:
+				break
+
+		self.spawnTimeMs = (time.perf_counter() - startTime) * 1000.0
+
+	def getStreamingStats(self) -> dict:
+		"""
+		Returns the streaming numbers of the last frame, to help tuning the budgets:
+		the chunks still queued to spawn, being built and waiting for an upload, the
+		chunks spawned and how much of the spawn budget was used. It also has how
+		many chunks were found in the chunk cache (and weren't) so far.
+		"""
+		return {
+			"queued": len(self.spawnQueue),
+			"building": self.pipeline.getPendingCount(),
+			"spawned": self.spawnedChunks,
+			"spawnTimeMs": self.spawnTimeMs,
+			"spawnBudgetMs": self.spawnBudgetMs,
+			"budgetUsage": self.spawnTimeMs / self.spawnBudgetMs if self.spawnBudgetMs > 0 else 0.0,
+			"cacheHits": self.cache.hits if self.cache else 0,
+			"cacheMisses": self.cache.misses if self.cache else 0,
+		}
+
+	def spawnChunk(self, coords):
+		"""
+		Adds a new Chunk! Its voxels and mesh are built in the pipeline, so spawning
+		it here is cheap. Chunks that were unloaded before are read back from the disk.
+		"""
 		scene = self.entity.getScene()
 
-		pos = self.transf.worldPosition / self.gridSize
-		pos.x = cave.math.floor(pos.x)
-		pos.z = cave.math.floor(pos.z)
+		child = scene.copyEntity(self.chunkBase)
+		child.name = f"{coords[0]}x{coords[1]}"
+		child.getTransform().setPosition(coords[0] * self.gridSize, 0, coords[1] * self.gridSize)
+		child.setParent(self.chunks)
+		child.properties["gridSize"] = self.gridSize
+		child.properties["worldSeed"] = self.worldSeed
+		child.properties["asyncBuild"] = True
+		child.activate(scene)
+
+		chunk = child.get("VoxelChunk", True)
+		self.chunkIndex[coords] = (child, chunk)
+		self.pendingChunks[coords] = child
+
+		lod = self.getLod(coords)
+		neighbours = self.getNeighbourVoxels(coords, lod)
+		voxelData = self.regionSaves.get(coords)
+		self.pipeline.submit(coords, 
+			lambda: self.buildChunk(coords, chunk, neighbours, lod, voxelData), 
+			lambda data: self.onChunkBuilt(coords, chunk, data))
+
+	def buildChunk(self, coords, chunk, neighbours, lod: int, voxelData: bytes = None):
+		"""
+		Builds the chunk data (in a worker thread), from the given voxelData if any. Chunks
+		saved in the regions are read back from there, since they have edits. The others
+		are only decoded if they are found in the chunk cache, or generated.
+		"""
+		if voxelData is None:
+			voxelData = self.regions.load(coords)
+		if self.cache and voxelData is None:
+			data = self.cache.load(coords, lod, lambda encoded: chunk.decodeCache(encoded, lod))
+			if data:
+				return data
+		return chunk.buildChunkData(voxelData, neighbours, lod)
+
+	def getNeighbourChunks(self, coords) -> dict:
+		"""
+		Returns the loaded and ready VoxelChunks around the chunk coordinates, mapped by their offset.
+		"""
+		neighbours = {}
+		for dx, dz in self.NEIGHBOUR_OFFSETS:
+			other = (coords[0] + dx, coords[1] + dz)
+			if other in self.loadedChunks:
+				chunk = self.chunkIndex[other][1]
+				if chunk.isReady():
+					neighbours[(dx, dz)] = chunk
+		return neighbours
+
+	def getNeighbourVoxels(self, coords, lod: int) -> dict:
+		"""
+		Returns the LOD grids of the neighbours that are at the given LOD, mapped by their
+		offset, which a chunk built at that LOD can cull its border faces against.
+		"""
+		neighbours = self.getNeighbourChunks(coords).items()
+		return {offset: n.lodVoxels for offset, n in neighbours if n.lod == lod}
+
+	def getLod(self, coords) -> int:
+		"""
+		Returns the LOD level a chunk should have, given its distance to the player.
+		"""
+		centerX, centerZ = self.getChunkCoords(self.transf.worldPosition)
+		distance = max(abs(coords[0] - centerX), abs(coords[1] - centerZ))
+		if distance <= self.lodRange:
+			return 0
+
+		lod = min(self.maxLod, 1 + (distance - self.lodRange - 1) // max(1, self.lodStep))
+
+		# The downsampling factor must divide the grid size:
+		while lod > 0 and self.gridSize % (2 ** lod) != 0:
+			lod -= 1
+		return lod
 
-		for x in range(-spawnRange, spawnRange + 1):
-			for z in range(-spawnRange, spawnRange + 1):
-				chunkName = f"{int(pos.x + x)}x{int(pos.z + z)}"
-				child = self.chunks.getChild(chunkName, False)
+	def updateLods(self):
+		"""
+		When the player moves to another chunk, rebuilds the loaded chunks whose LOD changed.
+		"""
+		center = self.getChunkCoords(self.transf.worldPosition)
+		if center == self.lodCenter:
+			return
+		self.lodCenter = center
 
-				if not child:
-					# Needs to add a new Chunk!
-					child = scene.copyEntity(self.chunkBase)
-					child.name = chunkName
-					child.getTransform().setPosition((pos.x + x) * self.gridSize, 0, (pos.z + z) * self.gridSize)
-					child.setParent(self.chunks)
-					child.properties["gridSize"] = self.gridSize
-					child.activate(scene)
+		for coords in self.loadedChunks:
+			self.requestLod(coords)
 
-					# As an optimization, we can return from the funcion here to make sure 
-					# that only one chunk gets spawned per frame, avoding huge frame drops.
-					return
+	def requestLod(self, coords):
+		"""
+		Rebuilds the mesh of a loaded chunk at its expected LOD (in the pipeline), if needed.
+		"""
+		chunk = self.chunkIndex[coords][1]
+		lod = self.getLod(coords)
+
+		if lod == chunk.lod:
+			self.cancelLod(coords)
+			return
+		if self.pendingLods.get(coords) == lod:
+			return
+
+		# Built from a copy of the voxels, since they may be edited meanwhile:
+		self.pendingLods[coords] = lod
+		neighbours = self.getNeighbourVoxels(coords, lod)
+		voxels = chunk.beginLodBuild()
+		self.pipeline.submit(("lod", coords),
+			lambda: chunk.buildLodData(lod, neighbours, voxels),
+			lambda data: self.onLodBuilt(coords, chunk, data))
+
+	def cancelLod(self, coords):
+		if self.pendingLods.pop(coords, None) is not None:
+			self.pipeline.cancel(("lod", coords))
+			self.chunkIndex[coords][1].lodEdits = None
+
+	def onLodBuilt(self, coords, chunk, data):
+		"""
+		Switches the chunk to its new LOD and lets the neighbours know, since they can
+		only cull their border faces against chunks at the same LOD.
+		"""
+		del self.pendingLods[coords]
+		chunk.applyLodData(data)
+
+		for (dx, dz), neighbour in self.getNeighbourChunks(coords).items():
+			neighbour.setNeighbour((-dx, -dz), chunk)
+
+	def updateColliders(self):
+		"""
+		Rebuilds, in the pipeline, the collision shape of the loaded chunks edited since
+		their last rebuild. A chunk only has one rebuild pending at a time, so all the
+		edits made meanwhile are picked up together by the next one.
+		"""
+		for coords in self.loadedChunks:
+			chunk = self.chunkIndex[coords][1]
+			key = ("collider", coords)
+			if not chunk.colliderDirty or self.pipeline.isPending(key):
+				continue
+
+			chunk.colliderDirty = False
+			self.pipeline.submit(key, chunk.buildCollider, chunk.applyCollider)
+
+	def updateConnectivity(self):
+		"""
+		Same as updateColliders, for the face connectivity used by the occlusion culling.
+		"""
+		for coords in self.loadedChunks:
+			chunk = self.chunkIndex[coords][1]
+			key = ("connectivity", coords)
+			if not chunk.connectivityDirty or self.pipeline.isPending(key):
+				continue
+
+			chunk.connectivityDirty = False
+			self.pipeline.submit(key, chunk.buildConnectivity, chunk.applyConnectivity)
+
+	def getFrustumPlanes(self, camera):
+		"""
+		Returns the camera frustum as a list of (normal, distance) planes pointing inwards,
+		built from the camera vectors and field of view (the side planes go through the
+		camera position). Orthographic cameras only get the far plane.
+		"""
+		pos = camera.getWorldPosition()
+		pos = (pos.x, pos.y, pos.z)
+		look = -camera.getForwardVector(True)
+		up = camera.getUpVector(True)
+		right = camera.getRightVector(True)
+		look, up, right = (look.x, look.y, look.z), (up.x, up.y, up.z), (right.x, right.y, right.z)
+
+		def plane(normal):
+			return normal, -sum(n * p for n, p in zip(normal, pos))
+
+		planes = [plane(tuple(-v for v in look))]
+		planes[0] = (planes[0][0], planes[0][1] + camera.farPlane)
+
+		if camera.isPerspective():
+			size = cave.getWindowSize()
+			aspect = size.x / size.y if size.y > 0 else 1.0
+			halfV = math.radians(camera.getPerspectiveFov()) / 2.0
+			halfH = math.atan(math.tan(halfV) * aspect)
+
+			for axis, half in ((right, halfH), (up, halfV)):
+				cos, sin = math.cos(half), math.sin(half)
+				for sign in (1, -1):
+					planes.append(plane(tuple(sign * a * cos + l * sin for a, l in zip(axis, look))))
+		return planes
+
+	def isChunkInFrustum(self, coords, planes) -> bool:
+		"""
+		Tests the chunk bounds against the frustum planes: it's outside if its corner
+		farthest along the normal of any plane is still behind it.
+		"""
+		size = self.gridSize
+		lo = (coords[0] * size, 0, coords[1] * size)
+		for normal, distance in planes:
+			farthest = sum(n * (l + size if n > 0 else l) for n, l in zip(normal, lo))
+			if farthest + distance < 0.0:
+				return False
+		return True
+
+	def findVisibleChunks(self, camera, planes) -> set:
+		"""
+		Flood fills the loaded chunks from the one with the camera, crossing from a chunk
+		to its neighbour only if the chunk is in the frustum and its face the flood came
+		through connects (by empty voxels) to the face towards the neighbour. Like in
+		other voxel engines, the flood never goes back against a direction it already
+		took. The top of the world is open sky: once the flood reaches it, every chunk
+		(in the frustum) is also seen from above.
+		"""
+		pos = camera.getWorldPosition()
+		start = self.getChunkCoords(pos)
+		entry = self.chunkIndex.get(start)
+		if start not in self.loadedChunks or not entry[1].isReady():
+			return None
+
+		size = self.gridSize
+		local = (
+			int(math.floor(pos.x)) - start[0] * size,
+			int(math.floor(pos.y)),
+			int(math.floor(pos.z)) - start[1] * size
+		)
+		up = (0, 1, 0)
+		inSky = local[1] >= size or entry[1].isRegionConnected(local, up)
+
+		visible = {start}
+		queue = []
+		for dx, dz in self.NEIGHBOUR_OFFSETS:
+			if local[1] >= size or entry[1].isRegionConnected(local, (dx, 0, dz)):
+				queue.append(((start[0] + dx, start[1] + dz), (-dx, 0, -dz), {(dx, dz)}))
+
+		seen = {start}
+		seen.update(coords for coords, fromDir, taken in queue)
+		skySeeded = False
+
+		while True:
+			if inSky and not skySeeded:
+				# Every chunk is seen from above, entering it through its top:
+				skySeeded = True
+				for coords in self.loadedChunks:
+					if coords not in seen:
+						seen.add(coords)
+						queue.append((coords, up, set()))
+			if not queue:
+				break
+
+			nextQueue = []
+			for coords, fromDir, taken in queue:
+				if coords not in self.loadedChunks or not self.isChunkInFrustum(coords, planes):
+					continue
+
+				chunk = self.chunkIndex[coords][1]
+				visible.add(coords)
+				if chunk.isConnected(fromDir, up):
+					inSky = True
+
+				for dx, dz in self.NEIGHBOUR_OFFSETS:
+					other = (coords[0] + dx, coords[1] + dz)
+					if other in seen or (-dx, -dz) in taken or not chunk.isConnected(fromDir, (dx, 0, dz)):
+						continue
+					seen.add(other)
+					nextQueue.append((other, (-dx, 0, -dz), taken | {(dx, dz)}))
+			queue = nextQueue
+		return visible
+
+	def cullChunks(self):
+		"""
+		Deactivates the loaded chunks that can't be seen (see frustumCulling and
+		occlusionCulling) and reactivates the ones that can again, so only the visible
+		chunks are drawn.
+		"""
+		startTime = time.perf_counter()
+		scene = self.entity.getScene()
+		camera = scene.getCamera()
+
+		planes = self.getFrustumPlanes(camera) if self.frustumCulling else []
+		visible = self.findVisibleChunks(camera, planes) if self.occlusionCulling else None
+
+		centerX, centerZ = self.getChunkCoords(self.transf.worldPosition)
+		outsideFrustum, occluded = 0, 0
+
+		for coords, child in self.loadedChunks.items():
+			show = max(abs(coords[0] - centerX), abs(coords[1] - centerZ)) <= self.cullSafeRange
+			if not show and planes and not self.isChunkInFrustum(coords, planes):
+				outsideFrustum += 1
+			elif not show and visible is not None and coords not in visible:
+				occluded += 1
+			else:
+				show = True
+
+			if show and coords in self.culledChunks:
+				self.culledChunks.discard(coords)
+				child.activate(scene)
+			elif not show and coords not in self.culledChunks:
+				self.culledChunks.add(coords)
+				child.deactivate(scene)
+
+		self.cullingStats = {
+			"drawn": len(self.loadedChunks) - len(self.culledChunks),
+			"culled": len(self.culledChunks),
+			"outsideFrustum": outsideFrustum,
+			"occluded": occluded,
+			"cullTimeMs": (time.perf_counter() - startTime) * 1000.0,
+		}
+
+	def getCullingStats(self) -> dict:
+		"""
+		Returns the culling numbers of the last frame: the loaded chunks drawn and
+		culled (either outside of the camera frustum or occluded by other chunks).
+		"""
+		return dict(self.cullingStats)
+
+	def linkChunk(self, coords, chunk, data):
+		"""
+		Connects a chunk that was just built to its neighbours (both ways), so each one
+		can cull the faces on its border that are hidden by the other. The chunk data is
+		applied here, after its neighbours are known, to upload it only once.
+		"""
+		neighbours = self.getNeighbourChunks(coords)
+		for offset in self.NEIGHBOUR_OFFSETS:
+			chunk.setNeighbour(offset, neighbours.get(offset), remesh=False)
+
+		chunk.applyChunkData(data)
+
+		for (dx, dz), neighbour in neighbours.items():
+			neighbour.setNeighbour((-dx, -dz), chunk)
+
+	def unlinkChunk(self, coords, chunk):
+		"""
+		Disconnects an unloaded chunk from its neighbours, which get their border faces back.
+		"""
+		for (dx, dz), neighbour in self.getNeighbourChunks(coords).items():
+			neighbour.setNeighbour((-dx, -dz), None)
+
+		for offset in self.NEIGHBOUR_OFFSETS:
+			chunk.setNeighbour(offset, None, remesh=False)
+
+	def onChunkBuilt(self, coords, chunk, data):
+		self.loadedChunks[coords] = self.pendingChunks.pop(coords)
+		self.linkChunk(coords, chunk, data)
+
+		# The player may have moved while it was being built:
+		self.requestLod(coords)
+
+	def reactivateChunk(self, coords):
+		"""
+		Brings a cached chunk back. Its meshes were released along with its voxels (see
+		VoxelChunk.release), so it is rebuilt in the pipeline, like a spawned one.
+		"""
+		child = self.cachedChunks.pop(coords)
+		chunk = self.chunkIndex[coords][1]
+		self.cacheMemory -= self.cachedMemory.pop(coords)
+
+		child.activate(self.entity.getScene())
+		self.pendingChunks[coords] = child
+
+		lod = self.getLod(coords)
+		neighbours = self.getNeighbourVoxels(coords, lod)
+		self.pipeline.submit(coords,
+			lambda: chunk.buildReleasedData(neighbours, lod),
+			lambda data: self.onChunkBuilt(coords, chunk, data))
+
+	def cacheReleasedChunk(self, coords, child):
+		"""
+		Keeps a deactivated chunk in the cache, released to its encoded voxels.
+		"""
+		chunk = self.chunkIndex[coords][1]
+		chunk.release()
+		self.editedChunks.discard(chunk)
+
+		self.cachedChunks[coords] = child
+		self.cachedMemory[coords] = chunk.getMemoryUsage()
+		self.cacheMemory += self.cachedMemory[coords]
+
+	def unloadFarChunks(self):
+		"""
+		Deactivates the chunks beyond the unloadRange, moving them to the cache (only their
+		encoded voxels), and then evicts the least recently used cached chunks until it
+		fits in the cacheMemoryMB and maxCachedChunks.
+		"""
+		scene = self.entity.getScene()
+		centerX, centerZ = self.getChunkCoords(self.transf.worldPosition)
+
+		farChunks = [coords for coords in self.loadedChunks 
+			if max(abs(coords[0] - centerX), abs(coords[1] - centerZ)) > self.unloadRange]
+
+		# All far chunks leave the loaded ones first, so they don't remesh each other's borders:
+		farChunks = [(coords, self.loadedChunks.pop(coords)) for coords in farChunks]
+
+		for coords, child in farChunks:
+			chunk = self.chunkIndex[coords][1]
+			self.cancelLod(coords)
+			if self.pipeline.cancel(("collider", coords)):
+				chunk.colliderDirty = True
+			if self.pipeline.cancel(("connectivity", coords)):
+				chunk.connectivityDirty = True
+
+			# Cached while its mesh is still culled against its neighbours:
+			self.cacheChunk(coords, chunk)
+			self.unlinkChunk(coords, chunk)
+
+			# Culled chunks are already deactivated:
+			if coords in self.culledChunks:
+				self.culledChunks.discard(coords)
+			else:
+				child.deactivate(scene)
+			self.cacheReleasedChunk(coords, child)
+
+		while self.cachedChunks and (self.cacheMemory > self.cacheMemoryMB * 1024 * 1024 or len(self.cachedChunks) > self.maxCachedChunks):
+			coords, child = self.cachedChunks.popitem(last=False)
+			self.evictChunk(coords, child)
+
+	def evictChunk(self, coords, child):
+		"""
+		Removes a cached chunk, saving its voxels to the disk if the player edited it
+		(the others are generated again, or already in the regions).
+		"""
+		chunk = self.chunkIndex.pop(coords)[1]
+		self.cacheMemory -= self.cachedMemory.pop(coords)
+		self.editedChunks.discard(chunk)
+
+		if chunk.edited:
+			self.saveRegion(coords, chunk.encodeVoxels())
+		self.blocks.removeChunk(coords)
+		child.kill()
+
+	def saveRegion(self, coords, voxelData: bytes):
+		"""
+		Writes the chunk voxels to the regions in the pipeline, keeping them in regionSaves
+		until it's done.
+		"""
+		self.regionSaves[coords] = voxelData
+
+		def onSaved(result):
+			if self.regionSaves.get(coords) is voxelData:
+				del self.regionSaves[coords]
+
+		self.pipeline.submit(("region", coords), lambda: self.regions.save(coords, voxelData), onSaved)
+
+	def saveWorld(self):
+		"""
+		Saves every chunk edited by the player to the disk right away (including the
+		released ones still being rebuilt and the evicted ones still being written).
+		"""
+		for coords, voxelData in self.regionSaves.items():
+			self.regions.save(coords, voxelData)
+
+		for coords, (child, chunk) in self.chunkIndex.items():
+			voxelData = chunk.encodeVoxels()
+			if chunk.edited and voxelData:
+				self.regions.save(coords, voxelData)
+
+	def cancelFarChunks(self):
+		"""
+		Cancels the chunks that moved out of the cancelRange before being built. Released
+		chunks that were being rebuilt go back to the cache, since they may have edits.
+		"""
+		centerX, centerZ = self.getChunkCoords(self.transf.worldPosition)
+
+		for coords in list(self.pendingChunks):
+			if max(abs(coords[0] - centerX), abs(coords[1] - centerZ)) > self.cancelRange:
+				self.pipeline.cancel(coords)
+				child = self.pendingChunks.pop(coords)
+				if self.chunkIndex[coords][1].voxelData is not None:
+					child.deactivate(self.entity.getScene())
+					self.cacheReleasedChunk(coords, child)
+				else:
+					child.kill()
+					del self.chunkIndex[coords]
 
 	def update(self):
+		self.updateVelocity()
 		self.spawnChunks(self.spawnRange)
+		self.cancelFarChunks()
+		self.unloadFarChunks()
+		self.updateLods()
+		self.updateBlocks()
+		self.flushEdits()
+		self.updateColliders()
+		self.updateConnectivity()
+		self.pipeline.update(self.uploadBudgetMs)
+		self.cullChunks()
 		
 	def end(self, scene: cave.Scene):
-		pass
+		self.pipeline.shutdown()
+
+		for coords in self.loadedChunks:
+			self.cacheChunk(coords, self.chunkIndex[coords][1], wait=True)
+
+		if self.regionFolder:
+			self.saveWorld()
+		if self.tempFolder:
+			shutil.rmtree(self.tempFolder, ignore_errors=True)
 	
\ No newline at end of file
@@ -0,0 +1,635 @@
+"""
+Round-trip checks and bandwidth report for the network packets of the Online Game
+demo, runnable with a regular Python interpreter (no Cave Engine needed):
+
+	python "Demos/Online Game/Benchmarks/packet_benchmark.py" --json results.json
+
+The OnlineServer script is loaded against a lightweight stand-in for the cave module
+(see Demos/Benchmarks/cave_stand_in.py), whose network.Package writes the same format
+documented in the API stubs (each value prefixed by its type char).
+
+First, random player states are encoded, wrapped into Packages, unwrapped and
+decoded again, checking that every value comes back within the quantization
+precision. Then it reports the bytes per player per tick (per peer) of the old
+type-tagged packets and of the new fixed layout, and what a server sends per tick
+for a few player counts.
+
+Next, it streams delta snapshots to a simulated client, with some of the players
+idle and some of the packets (and acks) lost, checking that the client always
+rebuilds the right snapshot and reporting their bytes per player per tick. The
+snapshots are also split into small parts, some of them lost. Full snapshots are
+batched with other messages into MTU sized Packages, reporting how many Packages
+the server sends per tick, and mixed size deltas are batched into Packages of
+random sizes, none of which may go over.
+
+Then the network clock runs at a few frame rates, reporting its ticks (and sends)
+per second and how far the players' interpolation gets in a tenth of a second.
+Last, it checks the interest grid against a brute force search and reports how
+many players each client receives (and the time to find them) for a few player
+counts spread over a map. ENet, UDP and IP headers are not included.
+"""
+
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+SCRIPTS = os.path.join(ROOT, "Demos", "Online Game", "Scripts")
+API_STUBS = os.path.join(ROOT, "cave")
+
+sys.path.insert(0, os.path.join(ROOT, "Demos", "Benchmarks"))
+import cave_stand_in
+
+# -----------------------------------------------------------------------------
+# cave stand-in
+# -----------------------------------------------------------------------------
+
+class Vector3:
+	def __init__(self, x=0.0, y=None, z=None):
+		if y is None:
+			y = z = x
+		self.x, self.y, self.z = float(x), float(y), float(z)
+
+	def __repr__(self):
+		return f"Vector3({self.x}, {self.y}, {self.z})"
+
+	def copy(self):
+		return Vector3(self.x, self.y, self.z)
+
+	def __add__(self, other):
+		return Vector3(self.x + other.x, self.y + other.y, self.z + other.z)
+
+class Component:
+	pass
+
+class Entity:
+	pass
+
+class Scene:
+	pass
+
+class PackageException(Exception):
+	def __init__(self, _msg=""):
+		self.msg = _msg
+
+	def what(self):
+		return self.msg
+
+class Package:
+	"""
+	Writes and reads the documented Package format: each value is prefixed by its
+	type char and written with its native size, with no header.
+	"""
+
+	READ = 0
+	WRITE = 1
+
+	TYPE_INVALID = 0
+	TYPE_INT = 1
+	TYPE_LONG_INT = 2
+	TYPE_FLOAT = 3
+	TYPE_BOOL = 4
+	TYPE_VEC3 = 5
+	TYPE_STRING = 6
+
+	# Struct format of each type:
+	_FORMATS = {TYPE_INT: "=i", TYPE_LONG_INT: "=Q", TYPE_FLOAT: "=f", TYPE_BOOL: "=?", TYPE_VEC3: "=3f"}
+
+	def __init__(self, data=False, len=None):
+		if isinstance(data, Package):
+			self._buffer, self._mode, self._offset = bytearray(data._buffer), data._mode, data._offset
+		elif len is not None:
+			self._buffer, self._mode, self._offset = bytearray(data[:len]), Package.READ, 0
+		else:
+			self._buffer, self._mode, self._offset = bytearray(), Package.READ if data else Package.WRITE, 0
+
+	def _write(self, dataType, *values):
+		if self._mode != Package.WRITE:
+			raise PackageException("The Package is not in WRITE mode.")
+		self._buffer += struct.pack("=B", dataType) + struct.pack(self._FORMATS[dataType], *values)
+
+	def _read(self, dataType):
+		if self.getNextDataType() != dataType:
+			raise PackageException("Unexpected data type.")
+		values = struct.unpack_from(self._FORMATS[dataType], self._buffer, self._offset + 1)
+		self._offset += 1 + struct.calcsize(self._FORMATS[dataType])
+		return values
+
+	def writeInt(self, value):
+		self._write(Package.TYPE_INT, value)
+
+	def writeLongInt(self, value):
+		self._write(Package.TYPE_LONG_INT, value)
+
+	def writeFloat(self, value):
+		self._write(Package.TYPE_FLOAT, value)
+
+	def writeBool(self, value):
+		self._write(Package.TYPE_BOOL, value)
+
+	def writeVector3(self, value):
+		self._write(Package.TYPE_VEC3, value.x, value.y, value.z)
+
+	def readInt(self):
+		return self._read(Package.TYPE_INT)[0]
+
+	def readLongInt(self):
+		return self._read(Package.TYPE_LONG_INT)[0]
+
+	def readFloat(self):
+		return self._read(Package.TYPE_FLOAT)[0]
+
+	def readBool(self):
+		return self._read(Package.TYPE_BOOL)[0]
+
+	def readVector3(self):
+		return Vector3(*self._read(Package.TYPE_VEC3))
+
+	def getNextDataType(self):
+		if self._mode != Package.READ or self._offset >= len(self._buffer):
+			return Package.TYPE_INVALID
+		return self._buffer[self._offset]
+
+	def getBufferSize(self):
+		return len(self._buffer)
+
+class ServerPeer:
+	def __init__(self, peer=None):
+		self._address = peer or ""
+
+	def getAddress(self):
+		return self._address
+
+class ServerPackage:
+	def __init__(self, sndr=None, pkg=None):
+		self.sender = sndr or ServerPeer()
+		self.package = pkg or Package()
+
+def lerp(a, b, value):
+	return a + (b - a) * value
+
+# Names provided by the stand-in, per stub module and class:
+STAND_IN = {
+	"__init__": {"classes": [Vector3, Component, Entity, Scene], "functions": []},
+	"math": {"classes": [], "functions": [lerp]},
+	"network": {"classes": [PackageException, Package, ServerPeer, ServerPackage], "functions": []},
+}
+
+def installStandIn(stubFolder: str):
+	return cave_stand_in.installStandIn(STAND_IN, stubFolder)
+
+def loadScript(name: str):
+	return cave_stand_in.loadScript(SCRIPTS, name)
+
+# -----------------------------------------------------------------------------
+# Checks and report
+# -----------------------------------------------------------------------------
+
+def randomState(rng, id: int, extent: float) -> dict:
+	position = Vector3(rng.uniform(-extent, extent), rng.uniform(-extent, extent), rng.uniform(-extent, extent))
+	return {"id": id, "position": position, "yaw": rng.uniform(-180.0, 180.0)}
+
+def angleError(a: float, b: float) -> float:
+	return abs((a - b + 180.0) % 360.0 - 180.0)
+
+def transmit(onlineServer, data: bytes) -> bytes:
+	"""
+	Wraps the bytes into a Package, "sends" its buffer and reads them back on the other side.
+	"""
+	sent = onlineServer.makePackage(data)
+	return onlineServer.readPackage(Package(bytes(sent._buffer), sent.getBufferSize()))
+
+def roundTrip(onlineServer, precision: float, count: int, seed: int = 0) -> dict:
+	"""
+	Encodes count random states into packets (one per state and a batched one),
+	sends them through Packages and checks the decoded values. Returns the largest
+	position and yaw errors.
+	"""
+	rng = random.Random(seed)
+	schema = onlineServer.PacketSchema(onlineServer.PLAYER_STATE_FIELDS, precision)
+	extent = 32767 * precision
+
+	states = [randomState(rng, rng.randrange(256), extent) for i in range(count)]
+	packets = [[state] for state in states] + [states[:255]]
+
+	posError, yawError = 0.0, 0.0
+	for packet in packets:
+		data = transmit(onlineServer, schema.encode(packet))
+		decoded = schema.decode(data)[0]
+
+		if data[0] != onlineServer.CMD_STATES or len(decoded) != len(packet):
+			raise AssertionError(f"Expected {len(packet)} states, got {len(decoded)} (command {data[0]}).")
+
+		for before, after in zip(packet, decoded):
+			if before["id"] != after["id"]:
+				raise AssertionError(f"Player id {before['id']} came back as {after['id']}.")
+			a, b = before["position"], after["position"]
+			posError = max(posError, abs(a.x - b.x), abs(a.y - b.y), abs(a.z - b.z))
+			yawError = max(yawError, angleError(before["yaw"], after["yaw"]))
+
+	# Positions are rounded to the nearest step and angles to the nearest 1/65536 turn:
+	if posError > precision * 0.5 + 1e-9 or yawError > 360.0 / 65536.0 * 0.5 + 1e-9:
+		raise AssertionError(f"Round trip error too big: position {posError}, yaw {yawError}.")
+
+	# Out of range positions are clamped, and truncated packets raise struct.error:
+	far = {"id": 1, "position": Vector3(extent * 4.0, -extent * 4.0, 0.0), "yaw": 0.0}
+	clamped = schema.decode(schema.encode([far]))[0][0]["position"]
+	if abs(clamped.x - 32767 * precision) > 1e-9 or abs(clamped.y + 32768 * precision) > 1e-9:
+		raise AssertionError(f"Position not clamped: {clamped}.")
+	try:
+		schema.decode(schema.encode(states[:2])[:-1])
+		raise AssertionError("A truncated packet was decoded.")
+	except struct.error:
+		pass
+
+	return {"precision": precision, "states": count, "maxPositionError": posError, "maxYawError": yawError}
+
+def legacyPackage(state: dict) -> Package:
+	"""
+	The packet the demo used to send per player: its id, the command, the position
+	and the yaw, each one prefixed by its type.
+	"""
+	pkg = Package()
+	pkg.writeInt(state["id"])
+	pkg.writeInt(0)
+	pkg.writeVector3(state["position"])
+	pkg.writeFloat(state["yaw"])
+	return pkg
+
+def bandwidth(onlineServer, players: list) -> dict:
+	rng = random.Random(1)
+	schema = onlineServer.PacketSchema(onlineServer.PLAYER_STATE_FIELDS)
+	state = randomState(rng, 1, 100.0)
+
+	legacy = legacyPackage(state).getBufferSize()
+	packed = onlineServer.makePackage(schema.encode([state])).getBufferSize()
+
+	# Every player's state goes to every other player, each tick:
+	perTick = {n: {"legacy": legacy * n * (n - 1), "packed": packed * n * (n - 1)} for n in players}
+	return {
+		"recordBytes": schema.size,
+		"legacyBytesPerPlayerPerTick": legacy,
+		"packedBytesPerPlayerPerTick": packed,
+		"serverBytesPerTick": perTick,
+	}
+
+def simulateSnapshots(onlineServer, players: int, moving: float, loss: float, ticks: int, maxSize: int = 0, seed: int = 0) -> dict:
+	"""
+	Streams the snapshots of the players (the moving fraction of them walking around,
+	the others idle) from a SnapshotChannel to a SnapshotReceiver, split into parts of
+	up to maxSize bytes, losing the given fraction of the parts and of the acks (which
+	arrive one tick later). Every snapshot received must match the one sent.
+	"""
+	rng = random.Random(seed)
+	schema = onlineServer.PacketSchema(onlineServer.PLAYER_STATE_FIELDS)
+	channel = onlineServer.SnapshotChannel()
+	receiver = onlineServer.SnapshotReceiver()
+
+	states = [randomState(rng, id, 50.0) for id in range(1, players + 1)]
+	walkers = set(rng.sample(range(players), round(players * moving)))
+
+	sentBytes, fullSnapshots, received = 0, 0, 0
+	pendingAck = None
+	for seq in range(1, ticks + 1):
+		seq &= 0xFFFF
+
+		# About 5 units per second, at 60 ticks per second:
+		for i in walkers:
+			state = states[i]
+			state["position"] = state["position"] + Vector3(rng.uniform(-0.1, 0.1), 0.0, rng.uniform(-0.1, 0.1))
+			state["yaw"] = (state["yaw"] + rng.uniform(-3.0, 3.0) + 180.0) % 360.0 - 180.0
+		snapshot = {state["id"]: tuple(schema.quantize(state)) for state in states}
+
+		if pendingAck is not None:
+			channel.ack(pendingAck)
+			pendingAck = None
+
+		messages = channel.encode(schema, seq, snapshot, maxSize)
+		header = onlineServer.SNAPSHOT_HEADER.unpack_from(messages[0])
+		if header[1] == header[2]:
+			fullSnapshots += 1
+
+		for data in messages:
+			sentBytes += onlineServer.makePackage(data).getBufferSize()
+			if rng.random() < loss:
+				continue
+
+			rebuilt = receiver.decode(schema, transmit(onlineServer, data))[0]
+			if rebuilt is not None:
+				received += 1
+				if rebuilt != snapshot:
+					raise AssertionError(f"Snapshot {seq} was rebuilt wrong.")
+				if rng.random() >= loss:
+					pendingAck = receiver.lastSeq
+
+	return {
+		"players": players,
+		"moving": moving,
+		"loss": loss,
+		"maxSize": maxSize,
+		"ticks": ticks,
+		"received": received,
+		"fullSnapshots": fullSnapshots,
+		"bytesPerPlayerPerTick": sentBytes / (ticks * players),
+	}
+
+def aggregationReport(onlineServer, players: list, maxPackageSize: int) -> dict:
+	"""
+	Sends a full snapshot of every player to every peer through their PacketOutbox,
+	batched with an (unreliable) ack as the demo does, and returns the Packages (and
+	bytes) sent per tick against one Package per opponent per peer (as the demo first
+	did). The same is measured with one reliable message more per peer, which needs
+	a Package of its own. Every Package must fit in maxPackageSize bytes and unpack
+	back into the whole snapshot.
+	"""
+	schema = onlineServer.PacketSchema(onlineServer.PLAYER_STATE_FIELDS)
+	maxPayload = onlineServer.getMaxPayload(maxPackageSize)
+	rng = random.Random(0)
+
+	perTick = {}
+	for n in players:
+		snapshot = {id: tuple(schema.quantize(randomState(rng, id, 50.0))) for id in range(1, n + 1)}
+		perTick[n] = {"legacyPackages": n * (n - 1)}
+
+		for key, withReliable in (("packages", False), ("reliablePackages", True)):
+			packages, sentBytes = 0, 0
+			for peer in range(n):
+				outbox = onlineServer.PacketOutbox()
+				outbox.add(onlineServer.ACK_MESSAGE.pack(onlineServer.CMD_ACK, 0))
+				if withReliable:
+					outbox.add(onlineServer.ACK_MESSAGE.pack(onlineServer.CMD_ACK, 0), reliable=True)
+				for message in onlineServer.SnapshotChannel().encode(schema, 1, snapshot, maxPayload):
+					outbox.add(message)
+
+				receiver = onlineServer.SnapshotReceiver()
+				rebuilt = None
+				for data, reliable in outbox.flush(maxPayload, rng.randrange(1 << 32)):
+					pkg = onlineServer.makePackage(data)
+					if pkg.getBufferSize() > maxPackageSize:
+						raise AssertionError(f"A Package of {pkg.getBufferSize()} bytes is over {maxPackageSize}.")
+					packages += 1
+					sentBytes += pkg.getBufferSize()
+
+					# Unpacking every message in the Package, as OnlineServer.parsePackages does:
+					data = transmit(onlineServer, data)
+					offset = 0
+					while offset < len(data) and data[offset] != onlineServer.CMD_NONE:
+						if data[offset] == onlineServer.CMD_SNAPSHOT:
+							states, offset = receiver.decode(schema, data, offset)
+							rebuilt = states if states is not None else rebuilt
+						elif data[offset] == onlineServer.CMD_TICK:
+							offset += onlineServer.TICK_MESSAGE.size
+						else:
+							offset += onlineServer.ACK_MESSAGE.size
+				if rebuilt != snapshot:
+					raise AssertionError(f"The snapshot of {n} players was unpacked wrong.")
+
+			perTick[n][key] = packages
+			if not withReliable:
+				perTick[n]["bytes"] = sentBytes
+
+		# Batching must never cost more Packages than sending one per opponent:
+		if n > 1 and perTick[n]["packages"] > perTick[n]["legacyPackages"]:
+			raise AssertionError(f"Batching {n} players sent more Packages than one per opponent.")
+
+	return {
+		"maxPackageSize": maxPackageSize,
+		"maxPayload": maxPayload,
+		"perTick": perTick,
+	}
+
+def mixedPackagesCheck(onlineServer, rounds: int, seed: int = 0) -> dict:
+	"""
+	Sends delta snapshots with records of every size (moved players, turned ones,
+	removed and new ones) batched with acks through a PacketOutbox, for random
+	Package sizes. Every Package must fit in its size, tick header included, and
+	unpack back into the whole snapshot.
+	"""
+	rng = random.Random(seed)
+	schema = onlineServer.PacketSchema(onlineServer.PLAYER_STATE_FIELDS)
+
+	packages, largest = 0, 0.0
+	for i in range(rounds):
+		maxPackageSize = rng.randrange(64, 1500)
+		maxPayload = onlineServer.getMaxPayload(maxPackageSize)
+		channel = onlineServer.SnapshotChannel()
+		receiver = onlineServer.SnapshotReceiver()
+
+		states = {id: randomState(rng, id, 50.0) for id in range(1, rng.randrange(2, 256))}
+		for seq in range(1, 4):
+			for id in list(states):
+				change = rng.random()
+				if change < 0.3:
+					states[id]["position"] = states[id]["position"] + Vector3(rng.uniform(-1.0, 1.0), 0.0, 0.0)
+				elif change < 0.6:
+					states[id]["yaw"] = rng.uniform(-180.0, 180.0)
+				elif change < 0.7:
+					del states[id]
+			for id in rng.sample(range(1, 256), 10):
+				states.setdefault(id, randomState(rng, id, 50.0))
+			snapshot = {id: tuple(schema.quantize(state)) for id, state in states.items()}
+
+			outbox = onlineServer.PacketOutbox()
+			for message in channel.encode(schema, seq, snapshot, maxPayload):
+				outbox.add(message)
+				if rng.random() < 0.2:
+					outbox.add(onlineServer.ACK_MESSAGE.pack(onlineServer.CMD_ACK, seq), reliable=rng.random() < 0.5)
+
+			rebuilt = None
+			for data, reliable in outbox.flush(maxPayload, seq):
+				size = onlineServer.makePackage(data).getBufferSize()
+				if size > maxPackageSize:
+					raise AssertionError(f"A Package of {size} bytes is over {maxPackageSize}.")
+				packages += 1
+				largest = max(largest, size / maxPackageSize)
+
+				data = transmit(onlineServer, data)
+				if data[0] != onlineServer.CMD_TICK or onlineServer.TICK_MESSAGE.unpack_from(data)[1] != seq:
+					raise AssertionError(f"A Package of snapshot {seq} doesn't start with its tick.")
+				offset = onlineServer.TICK_MESSAGE.size
+				while offset < len(data) and data[offset] != onlineServer.CMD_NONE:
+					if data[offset] == onlineServer.CMD_SNAPSHOT:
+						decoded, offset = receiver.decode(schema, data, offset)
+						rebuilt = decoded if decoded is not None else rebuilt
+					else:
+						offset += onlineServer.ACK_MESSAGE.size
+			if rebuilt != snapshot:
+				raise AssertionError(f"Snapshot {seq} was unpacked wrong, in Packages of {maxPackageSize} bytes.")
+			channel.ack(seq)
+
+	return {"rounds": rounds, "packages": packages, "largestPackageFill": largest}
+
+def clockReport(onlineServer, tickRate: float, frameRates: list, seconds: float = 10.0, seed: int = 0) -> dict:
+	"""
+	Runs a NetworkClock at the tick rate for the given seconds at each frame rate (with
+	the frame times randomly off by up to 20%), counting the ticks and the frames that
+	would send packets. Also lerps a value from 0 towards 1 for a tenth of a second, with the
+	per frame lerp of the demo (0.2) and with getBlend, returning how far it got.
+	"""
+	rng = random.Random(seed)
+
+	perFrameRate = {}
+	for frameRate in frameRates:
+		clock = onlineServer.NetworkClock(tickRate)
+		frames, sendFrames, elapsed = 0, 0, 0.0
+		while elapsed < seconds:
+			dt = rng.uniform(0.8, 1.2) / frameRate
+			elapsed += dt
+			frames += 1
+			if clock.advance(dt) > 0:
+				sendFrames += 1
+
+		legacy, blended = 0.0, 0.0
+		for i in range(round(frameRate * 0.1)):
+			legacy += (1.0 - legacy) * 0.2
+			blended += (1.0 - blended) * onlineServer.getBlend(0.2, 1.0 / frameRate)
+
+		perFrameRate[frameRate] = {
+			"frames": frames,
+			"ticksPerSecond": clock.tick / elapsed,
+			"sendsPerSecond": sendFrames / elapsed,
+			"legacyLerpAfter100ms": legacy,
+			"lerpAfter100ms": blended,
+		}
+
+	return {
+		"tickRate": tickRate,
+		"seconds": seconds,
+		"perFrameRate": perFrameRate,
+	}
+
+def interestReport(onlineServer, players: int, mapSize: float, radius: float, cellSize: float, seed: int = 0) -> dict:
+	"""
+	Spreads the players over a square map, finds the ones around each of them with the
+	InterestGrid (checked against testing every pair) and returns the average players
+	found per client and the time (in ms) to find them for all the clients.
+	"""
+	rng = random.Random(seed)
+	positions = {id: Vector3(rng.uniform(0.0, mapSize), 0.0, rng.uniform(0.0, mapSize)) for id in range(1, players + 1)}
+
+	grid = onlineServer.InterestGrid(cellSize)
+	startTime = time.perf_counter()
+	for id, position in positions.items():
+		grid.add(id, position)
+	found = {id: grid.query(position, radius) for id, position in positions.items()}
+	gridTime = time.perf_counter() - startTime
+
+	for id, position in positions.items():
+		expected = set(
+			other for other, p in positions.items()
+			if (p.x - position.x) ** 2 + (p.z - position.z) ** 2 <= radius * radius
+		)
+		if set(other for other, distanceSq in found[id]) != expected:
+			raise AssertionError(f"The interest grid found the wrong players around {id}.")
+
+	return {
+		"players": players,
+		"mapSize": mapSize,
+		"radius": radius,
+		# The player itself is always found, but never sent:
+		"relevantPerClient": sum(len(ids) - 1 for ids in found.values()) / players,
+		"gridMs": gridTime * 1000.0,
+	}
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Network packet round trip and bandwidth report (no engine needed).")
+	parser.add_argument("--precisions", default="0.01,0.05", help="Comma separated position precisions.")
+	parser.add_argument("--states", type=int, default=1000, help="Random states round-tripped per precision.")
+	parser.add_argument("--players", default="2,8,32,64", help="Comma separated player counts for the report.")
+	parser.add_argument("--ticks", type=int, default=600, help="Ticks of each delta snapshot simulation.")
+	parser.add_argument("--map-size", type=float, default=400.0, help="Side of the square map (in world units) for the interest report.")
+	parser.add_argument("--radius", type=float, default=50.0, help="Interest radius (in world units) for the interest report.")
+	parser.add_argument("--max-package-size", type=int, default=1200, help="Package size limit (in bytes) for the aggregation report.")
+	parser.add_argument("--tick-rate", type=float, default=30.0, help="Network tick rate (in Hz) for the clock report.")
+	parser.add_argument("--json", help="Writes the results to this JSON file.")
+	args = parser.parse_args(argv)
+
+	installStandIn(API_STUBS)
+	onlineServer = loadScript("OnlineServer")
+
+	roundTrips = []
+	for precision in [float(p) for p in args.precisions.split(",")]:
+		result = roundTrip(onlineServer, precision, args.states)
+		roundTrips.append(result)
+		print(
+			f"round trip: precision {precision:g}, {result['states']} states OK"
+			f" | max error: position {result['maxPositionError']:.5f} yaw {result['maxYawError']:.5f} deg"
+		)
+
+	report = bandwidth(onlineServer, [int(n) for n in args.players.split(",")])
+	print(
+		f"bytes per player per tick: legacy {report['legacyBytesPerPlayerPerTick']}"
+		f" | packed {report['packedBytesPerPlayerPerTick']} ({report['recordBytes']} bytes per record)"
+	)
+	for n, perTick in report["serverBytesPerTick"].items():
+		print(f"{n:>4} players: server sends {perTick['legacy']:8d} bytes/tick legacy | {perTick['packed']:8d} packed")
+
+	snapshots = []
+	for moving in (0.0, 0.25, 1.0):
+		for loss in (0.0, 0.1):
+			result = simulateSnapshots(onlineServer, 32, moving, loss, args.ticks)
+			snapshots.append(result)
+			print(
+				f"delta snapshots: 32 players, {moving:4.0%} moving, {loss:3.0%} loss"
+				f" | {result['bytesPerPlayerPerTick']:5.2f} bytes/player/tick"
+				f" | {result['received']} received, {result['fullSnapshots']} full"
+			)
+
+	# Splitting the snapshots into small parts, so most of them need a few:
+	for loss in (0.0, 0.1):
+		result = simulateSnapshots(onlineServer, 32, 1.0, loss, args.ticks, maxSize=128)
+		snapshots.append(result)
+		print(
+			f"split snapshots: 32 players, 100% moving, {loss:3.0%} loss, parts of 128 bytes"
+			f" | {result['bytesPerPlayerPerTick']:5.2f} bytes/player/tick"
+			f" | {result['received']} received, {result['fullSnapshots']} full"
+		)
+
+	aggregation = aggregationReport(onlineServer, [int(n) for n in args.players.split(",")] + [255], args.max_package_size)
+	for n, perTick in aggregation["perTick"].items():
+		print(
+			f"aggregation: {n:>4} players, full snapshot + ack per peer, packages of up to {args.max_package_size} bytes"
+			f" | {perTick['packages']:6d} packages/tick (was {perTick['legacyPackages']:6d}), {perTick['bytes']:8d} bytes"
+			f" | {perTick['reliablePackages']:6d} with 1 reliable message more per peer (sent apart)"
+		)
+
+	mixed = mixedPackagesCheck(onlineServer, 200)
+	print(
+		f"mixed packages: {mixed['rounds']} random package sizes, {mixed['packages']} packages OK"
+		f" | largest {mixed['largestPackageFill']:.0%} of its size"
+	)
+
+	clock = clockReport(onlineServer, args.tick_rate, [30, 60, 144, 300])
+	for frameRate, result in clock["perFrameRate"].items():
+		print(
+			f"clock: {args.tick_rate:g} Hz at {frameRate:>3} fps | {result['ticksPerSecond']:5.1f} ticks/s, {result['sendsPerSecond']:5.1f} sends/s"
+			f" | lerp after 0.1 s: {result['lerpAfter100ms']:.4f} (was {result['legacyLerpAfter100ms']:.4f})"
+		)
+
+	interest = []
+	for n in [int(n) for n in args.players.split(",")] + [255]:
+		result = interestReport(onlineServer, n, args.map_size, args.radius, 25.0)
+		interest.append(result)
+		print(
+			f"interest: {n:>4} players on a {args.map_size:g}x{args.map_size:g} map, radius {args.radius:g}"
+			f" | {result['relevantPerClient']:6.2f} players per client (of {n - 1})"
+			f" | {result['gridMs']:6.2f} ms for all clients"
+		)
+
+	if args.json:
+		cave_stand_in.saveResults(args.json, args, {
+			"roundTrips": roundTrips,
+			"bandwidth": report,
+			"snapshots": snapshots,
+			"aggregation": aggregation,
+			"mixedPackages": mixed,
+			"clock": clock,
+			"interest": interest,
+		})
+	return roundTrips, report, snapshots, aggregation, mixed, clock, interest
+
+if __name__ == "__main__":
+	main()
@@ -1,8 +1,480 @@
 import cave
 import cave.math
 import cave.network
+import struct
+
+# A Package carries a sequence of messages, each one starting with its command. The
+# CMD_NONE (zero) ends the sequence, so the padding of makePackage is skipped:
+CMD_NONE = 0
+CMD_STATES = 1
+CMD_SNAPSHOT = 2
+CMD_ACK = 3
+CMD_TICK = 4
+
+# A CMD_STATES message: the command and how many full state records follow it:
+PACKET_HEADER = struct.Struct("<BB")
+
+# A CMD_SNAPSHOT message: the command, the snapshot number, the number of the snapshot
+# it is a delta against (the same number for full snapshots), which part of the snapshot
+# it is and of how many (big snapshots are split to fit in the packets) and how many
+# delta records (see PacketSchema.encodeDelta) follow it:
+SNAPSHOT_HEADER = struct.Struct("<BHHBBH")
+
+# A CMD_ACK message: the command and the number of the last snapshot received:
+ACK_MESSAGE = struct.Struct("<BH")
+
+# A CMD_TICK message, starting every packet: the command and the sender's network tick:
+TICK_MESSAGE = struct.Struct("<BI")
+
+# Each delta record starts with the record id and the mask of the fields that follow it:
+DELTA_RECORD = struct.Struct("<BB")
+DELTA_REMOVED = 0x80
+
+# Raw bytes travel inside a Package as 64 bit words, each one laid out exactly as
+# Package.writeLongInt would write it (its type char followed by the 8 bytes):
+PACKAGE_WORD = struct.Struct("=BQ")
+
+def makePackage(data: bytes) -> cave.network.Package:
+	"""
+	Wraps raw bytes into a Package, through its raw buffer constructor, so they are
+	not written field by field (each one tagged with its type and at full width).
+	The bytes are padded to a multiple of 8, costing 9 bytes per 8 on the wire.
+	"""
+	data = bytes(data) + bytes(-len(data) % 8)
+	words = struct.unpack(f"={len(data) // 8}Q", data)
+
+	buffer = bytearray(len(words) * PACKAGE_WORD.size)
+	for i, word in enumerate(words):
+		PACKAGE_WORD.pack_into(buffer, i * PACKAGE_WORD.size, cave.network.Package.TYPE_LONG_INT, word)
+	return cave.network.Package(bytes(buffer), len(buffer))
+
+def getMaxPayload(packageSize: int) -> int:
+	"""
+	How many bytes of messages fit in a Package of up to packageSize bytes (see
+	makePackage), leaving room for the CMD_TICK message starting every packet.
+	"""
+	return max(1, packageSize // PACKAGE_WORD.size) * 8 - TICK_MESSAGE.size
+
+def readPackage(pkg: cave.network.Package) -> bytes:
+	"""
+	Reads back the raw bytes of a Package made by makePackage (padding included).
+	"""
+	words = []
+	while pkg.getNextDataType() == cave.network.Package.TYPE_LONG_INT:
+		words.append(pkg.readLongInt())
+	return struct.pack(f"={len(words)}Q", *words)
+
+class PacketSchema:
+	"""
+	Fixed binary layout of the records sent over the network, declared as a list of
+	(name, kind) fields and packed with a single struct, without any type tags. The
+	values are quantized according to their kind:
+
+	- "id": a small integer (0 to 255), such as the player ids;
+	- "position": a cave.Vector3, in steps of `precision` world units, as three 16
+	  bit integers (so with the default 0.01, it covers +-327 units in each axis);
+	- "angle": an angle in degrees, in 16 bits (a step of about 0.0055 degrees).
+	"""
+
+	# Struct format of each field kind:
+	KINDS = {"id": "B", "position": "3h", "angle": "H"}
+
+	def __init__(self, fields, precision: float = 0.01):
+		self.fields = fields
+		self.precision = precision
+		self.layout = struct.Struct("<" + "".join(self.KINDS[kind] for name, kind in fields))
+		self.size = self.layout.size
+
+		# The layout of each field alone and the slice of its values in the quantized list:
+		self.fieldLayouts = []
+		self.fieldSlices = []
+		start = 0
+		for name, kind in fields:
+			layout = struct.Struct("<" + self.KINDS[kind])
+			count = len(layout.unpack(bytes(layout.size)))
+			self.fieldLayouts.append(layout)
+			self.fieldSlices.append(slice(start, start + count))
+			start += count
+		self.valueCount = start
+
+	def quantize(self, state: dict) -> list:
+		"""
+		Converts the state values (mapped by field name) into the integers of the layout.
+		"""
+		values = []
+		for name, kind in self.fields:
+			value = state[name]
+			if kind == "position":
+				values += [max(-32768, min(32767, round(v / self.precision))) for v in (value.x, value.y, value.z)]
+			elif kind == "angle":
+				values.append(round(value / 360.0 * 65536.0) & 0xFFFF)
+			else:
+				values.append(value)
+		return values
+
+	def dequantize(self, values) -> dict:
+		state = {}
+		i = 0
+		for name, kind in self.fields:
+			if kind == "position":
+				state[name] = cave.Vector3(values[i] * self.precision, values[i + 1] * self.precision, values[i + 2] * self.precision)
+				i += 3
+				continue
+
+			value = values[i]
+			if kind == "angle":
+				# Back to the (-180, 180] range of the euler angles:
+				value = value * 360.0 / 65536.0
+				if value > 180.0:
+					value -= 360.0
+			state[name] = value
+			i += 1
+		return state
+
+	def encode(self, states: list) -> bytes:
+		"""
+		Encodes a CMD_STATES message with the full states (up to 255 of them).
+		"""
+		buffer = bytearray(PACKET_HEADER.size + self.size * len(states))
+		PACKET_HEADER.pack_into(buffer, 0, CMD_STATES, len(states))
+		for i, state in enumerate(states):
+			self.layout.pack_into(buffer, PACKET_HEADER.size + i * self.size, *self.quantize(state))
+		return bytes(buffer)
+
+	def decode(self, data, offset: int = 0):
+		"""
+		Decodes the CMD_STATES message made by encode at the offset, returning its states
+		and the offset right after it. Raises struct.error if the message is truncated.
+		"""
+		cmd, count = PACKET_HEADER.unpack_from(data, offset)
+		offset += PACKET_HEADER.size
+
+		states = []
+		for i in range(count):
+			states.append(self.dequantize(self.layout.unpack_from(data, offset)))
+			offset += self.size
+		return states, offset
+
+	def encodeDelta(self, buffer: bytearray, values: tuple, base: tuple = None) -> bool:
+		"""
+		Appends the delta record of the quantized values (the first one is the record id)
+		to the buffer, with only the fields that differ from the base values (all of them,
+		if there is no base), and returns True. If nothing changed, nothing is appended.
+		"""
+		mask = 0
+		for i in range(1, len(self.fields)):
+			part = self.fieldSlices[i]
+			if base is None or values[part] != base[part]:
+				mask |= 1 << (i - 1)
+		if not mask:
+			return False
+
+		buffer += DELTA_RECORD.pack(values[0], mask)
+		for i in range(1, len(self.fields)):
+			if mask & (1 << (i - 1)):
+				buffer += self.fieldLayouts[i].pack(*values[self.fieldSlices[i]])
+		return True
+
+	def decodeDelta(self, data, offset: int, base: dict):
+		"""
+		Decodes the delta record at the offset, filling the missing fields from the base
+		values of the same id. Returns the id, its quantized values (None if the record
+		was removed) and the offset right after it.
+		"""
+		id, mask = DELTA_RECORD.unpack_from(data, offset)
+		offset += DELTA_RECORD.size
+		if mask & DELTA_REMOVED:
+			return id, None, offset
+
+		values = list(base.get(id) or (id,) + (0,) * (self.valueCount - 1))
+		for i in range(1, len(self.fields)):
+			if mask & (1 << (i - 1)):
+				values[self.fieldSlices[i]] = self.fieldLayouts[i].unpack_from(data, offset)
+				offset += self.fieldLayouts[i].size
+		return id, tuple(values), offset
+
+def isNewerSnapshot(seq: int, other: int) -> bool:
+	"""
+	Whether the (16 bit, wrapping) snapshot number seq comes after other.
+	"""
+	return other is None or 0 < (seq - other) & 0xFFFF < 0x8000
+
+class SnapshotHistory:
+	"""
+	Ring buffer with the last snapshots (quantized record values, mapped by id), mapped
+	by their numbers. Older snapshots are overwritten by the newer ones.
+	"""
+
+	def __init__(self, size: int = 32):
+		self.size = size
+		self.slots = [None] * size
+
+	def add(self, seq: int, states: dict):
+		self.slots[seq % self.size] = (seq, states)
+
+	def get(self, seq: int) -> dict:
+		slot = self.slots[seq % self.size] if seq is not None else None
+		return slot[1] if slot and slot[0] == seq else None
+
+class InterestGrid:
+	"""
+	Uniform grid that buckets ids by their (x, z) positions, so finding the ids near a
+	position only looks at the cells around it, instead of at every id.
+	"""
+
+	def __init__(self, cellSize: float):
+		self.cellSize = cellSize
+		self.cells = {}
+		self.positions = {}
+
+	def clear(self):
+		self.cells.clear()
+		self.positions.clear()
+
+	def add(self, id: int, position: cave.Vector3):
+		cell = (int(position.x // self.cellSize), int(position.z // self.cellSize))
+		self.cells.setdefault(cell, []).append(id)
+		self.positions[id] = (position.x, position.z)
+
+	def query(self, position: cave.Vector3, radius: float) -> list:
+		"""
+		Returns the (id, squared distance) of the ids within the radius of the position.
+		"""
+		x, z = position.x, position.z
+		minX, maxX = int((x - radius) // self.cellSize), int((x + radius) // self.cellSize)
+		minZ, maxZ = int((z - radius) // self.cellSize), int((z + radius) // self.cellSize)
+		radiusSq = radius * radius
+
+		found = []
+		for cx in range(minX, maxX + 1):
+			for cz in range(minZ, maxZ + 1):
+				for id in self.cells.get((cx, cz), ()):
+					px, pz = self.positions[id]
+					distanceSq = (px - x) * (px - x) + (pz - z) * (pz - z)
+					if distanceSq <= radiusSq:
+						found.append((id, distanceSq))
+		return found
+
+class PacketOutbox:
+	"""
+	The messages waiting to be sent to a peer (or to the server). They are packed
+	together into as few packets as possible, of up to maxSize bytes of messages each
+	(a bigger message goes alone) after the CMD_TICK message (see getMaxPayload),
+	instead of one Package per message, saving the Package headers and the send calls.
+	Reliable and unreliable messages are batched apart, so the unreliable ones are
+	never resent along with a lost reliable Package. That costs a Package more, so
+	only what can't be superseded by the next tick should be queued as reliable (the
+	acks and states are not).
+	"""
+
+	def __init__(self):
+		self.reliable = []
+		self.unreliable = []
+
+	def add(self, message: bytes, reliable: bool = False):
+		(self.reliable if reliable else self.unreliable).append(message)
+
+	def flush(self, maxSize: int, tick: int = 0) -> list:
+		"""
+		Returns the (data, reliable) packets with all the queued messages, emptying the
+		outbox. Each packet starts with a CMD_TICK message with the tick number.
+		"""
+		header = TICK_MESSAGE.pack(CMD_TICK, tick & 0xFFFFFFFF)
+
+		packets = []
+		for reliable, messages in ((True, self.reliable), (False, self.unreliable)):
+			data = bytearray()
+			for message in messages:
+				if data and len(data) + len(message) > maxSize:
+					packets.append((header + data, reliable))
+					data = bytearray()
+				data += message
+
+			if data:
+				packets.append((header + data, reliable))
+			messages.clear()
+		return packets
+
+class NetworkClock:
+	"""
+	Counts the network ticks at a fixed rate (in Hz), no matter the frame rate: the
+	time of every frame is accumulated and each 1/rate seconds of it is a tick. After
+	a long frame, at most maxCatchUp ticks are counted and the rest are dropped.
+	"""
+
+	def __init__(self, rate: float, maxCatchUp: int = 4):
+		self.interval = 1.0 / rate
+		self.maxCatchUp = maxCatchUp
+		self.time = 0.0
+		self.tick = 0
+
+	def advance(self, dt: float) -> int:
+		"""
+		Moves the clock dt seconds forward, returning how many ticks it went through.
+		"""
+		self.time += dt
+		ticks = 0
+
+		while self.time >= self.interval and ticks < self.maxCatchUp:
+			self.time -= self.interval
+			ticks += 1
+
+		# Too far behind (after a long frame), so the missed ticks are dropped:
+		self.time = min(self.time, self.interval)
+		self.tick += ticks
+		return ticks
+
+def getBlend(fraction: float, dt: float) -> float:
+	"""
+	Returns the lerp factor that covers the same part of the way in dt seconds as
+	lerping by the fraction every 1/60 of a second does, so the smoothing doesn't
+	change with the frame rate.
+	"""
+	return 1.0 - (1.0 - fraction) ** (dt * 60.0)
+
+class SnapshotChannel:
+	"""
+	The snapshots sent to one peer. Each one is a delta against the last snapshot the
+	peer acknowledged: only the records that changed since then, with only their changed
+	fields, plus the removed ones. So idle players cost nothing. If the peer didn't
+	acknowledge any snapshot still in the history (after losing too many), a full
+	snapshot is sent instead.
+	"""
+
+	def __init__(self, historySize: int = 32):
+		self.history = SnapshotHistory(historySize)
+		self.acked = None
+
+		# The states of the last snapshot sent:
+		self.lastStates = {}
+
+	def ack(self, seq: int):
+		if isNewerSnapshot(seq, self.acked):
+			self.acked = seq
+
+	def encode(self, schema: PacketSchema, seq: int, states: dict, maxSize: int = 0) -> list:
+		"""
+		Encodes the CMD_SNAPSHOT messages of the states (quantized values mapped by id),
+		split into parts of up to maxSize bytes (0 for a single part), and keeps them in
+		the history, as a future baseline.
+		"""
+		base = self.history.get(self.acked)
+
+		records = []
+		for id, values in states.items():
+			record = bytearray()
+			if schema.encodeDelta(record, values, base.get(id) if base is not None else None):
+				records.append(record)
+
+		if base is not None:
+			for id in base:
+				if not id in states:
+					records.append(DELTA_RECORD.pack(id, DELTA_REMOVED))
+
+		# There is always at least one part, even if nothing changed:
+		parts = [[]]
+		size = SNAPSHOT_HEADER.size
+		for record in records:
+			if maxSize and parts[-1] and size + len(record) > maxSize:
+				parts.append([])
+				size = SNAPSHOT_HEADER.size
+			parts[-1].append(record)
+			size += len(record)
+
+		self.history.add(seq, states)
+		self.lastStates = states
+
+		baseSeq = seq if base is None else self.acked
+		return [
+			SNAPSHOT_HEADER.pack(CMD_SNAPSHOT, seq, baseSeq, i, len(parts), len(part)) + b"".join(part)
+			for i, part in enumerate(parts)
+		]
+
+class SnapshotReceiver:
+	"""
+	Rebuilds the snapshots sent by a SnapshotChannel, keeping the received ones as the
+	baselines of the next deltas. The number of the newest one (lastSeq) is what has
+	to be acknowledged back. A snapshot split into parts only counts as received once
+	all of them arrive.
+	"""
+
+	def __init__(self, historySize: int = 32):
+		self.history = SnapshotHistory(historySize)
+		self.lastSeq = None
+
+		# The records of the parts received so far of the incomplete snapshots, by number:
+		self.pending = {}
+
+	def decode(self, schema: PacketSchema, data, offset: int = 0):
+		"""
+		Decodes the CMD_SNAPSHOT message at the offset, returning the full snapshot (None
+		if it is still incomplete, older than the last one or its baseline is gone) and
+		the offset right after it. Raises struct.error if the message is truncated.
+		"""
+		cmd, seq, baseSeq, part, parts, count = SNAPSHOT_HEADER.unpack_from(data, offset)
+		offset += SNAPSHOT_HEADER.size
+
+		base = {} if baseSeq == seq else self.history.get(baseSeq)
+		records = []
+		for i in range(count):
+			id, values, offset = schema.decodeDelta(data, offset, base or {})
+			records.append((id, values))
+
+		if base is None:
+			return None, offset
+
+		received = self.pending.setdefault(seq, {})
+		received[part] = records
+		if len(received) < parts:
+			# Only the last few incomplete snapshots are kept:
+			while len(self.pending) > self.history.size:
+				del self.pending[next(iter(self.pending))]
+			return None, offset
+		del self.pending[seq]
+
+		states = dict(base)
+		for records in received.values():
+			for id, values in records:
+				if values is None:
+					states.pop(id, None)
+				else:
+					states[id] = values
+
+		self.history.add(seq, states)
+		if not isNewerSnapshot(seq, self.lastSeq):
+			return None, offset
+		self.lastSeq = seq
+		return states, offset
+
+# The position and rotation of a player (the id 0 means the packet's sender):
+PLAYER_STATE_FIELDS = [("id", "id"), ("position", "position"), ("yaw", "angle")]
 
 class OnlineServer(cave.Component):
+	# Precision (in world units) of the positions sent over the network:
+	positionPrecision = 0.01
+
+	# How many of the last snapshots are kept as baselines for the deltas. If a client
+	# hasn't acknowledged any of them, it gets a full snapshot:
+	snapshotHistory = 32
+
+	# Each client only receives the players within interestRadius (in world units) of its
+	# own (0 sends all of them), found with a grid of interestCellSize cells. The ones
+	# farther than farRadius are only updated every farUpdateInterval snapshots:
+	interestRadius = 50.0
+	interestCellSize = 25.0
+	farRadius = 25.0
+	farUpdateInterval = 3
+
+	# The messages to each peer are batched into Packages of up to maxPackageSize bytes
+	# (on the wire), below the usual internet MTU, so they aren't fragmented:
+	maxPackageSize = 1200
+
+	# The packets are only sent on the ticks of a network clock running at tickRate (in
+	# Hz), independent of the frame rate. The other players move towards their received
+	# positions by interpolation of the way every 1/60 of a second:
+	tickRate = 30.0
+	interpolation = 0.2
+
 	def start(self, scene: cave.Scene):
 		self.transf = self.entity.getTransform()
 
@@ -21,6 +493,35 @@ class OnlineServer(cave.Component):
 		# The other players, mapped by address:
 		self.opponents = {}
 
+		# Small player ids given by the Server (to fit in a byte), mapped by address:
+		self.playerIds = {}
+
+		self.schema = PacketSchema(PLAYER_STATE_FIELDS, self.positionPrecision)
+
+		# Server: the number of the last snapshot and the snapshots sent to each peer, by address:
+		self.snapshotSeq = 0
+		self.channels = {}
+
+		# Server: the players (by id) bucketed by their positions, to find the ones near each client:
+		self.interest = InterestGrid(self.interestCellSize)
+
+		# Client: the snapshots received and the player states (quantized) last applied, by id:
+		self.receiver = SnapshotReceiver(self.snapshotHistory)
+		self.appliedStates = {}
+
+		# The messages waiting to be sent to the server (client) or to each peer, by address (server):
+		self.outbox = PacketOutbox()
+		self.outboxes = {}
+
+		# The network clock (see NetworkClock) and the last tick received from each sender, by address:
+		self.clock = NetworkClock(self.tickRate)
+		self.remoteTicks = {}
+
+		# Bytes, Packages and player states sent in the last tick (see getNetworkStats):
+		self.bytesSent = 0
+		self.packagesSent = 0
+		self.statesSent = 0
+
 		self.server : cave.network.Server = None
 		self.client : cave.network.Client = None
 
@@ -41,89 +542,266 @@ class OnlineServer(cave.Component):
 			self.initialize()
 			self.initialized = True
 
+		# The packets are only sent if the network clock ticked in this frame:
+		dt = cave.getDeltaTime()
+		ticked = self.clock.advance(dt) > 0
+
 		if self.isServer():
-			self.updateServer()
+			self.updateServer(ticked)
 		else:
-			self.updateClient()
+			self.updateClient(ticked)
 
 		# Lerping the Position and Rotations:		
+		blend = getBlend(self.interpolation, dt)
 		for ent in self.opponents.values():
 			transf = ent.getTransform()
 
 			pos = ent.properties.get("targetPos", transf.getPosition())
 			rot = ent.properties.get("targetRot", 0)
 
-			transf.setPosition(transf.getPosition().lerp(pos, 0.2))
-			transf.setEuler(0, cave.math.lerp(transf.getEuler().y, rot, 0.2), 0)
+			transf.setPosition(transf.getPosition().lerp(pos, blend))
+			transf.setEuler(0, cave.math.lerp(transf.getEuler().y, rot, blend), 0)
 
 		# Remove all opponents that haven't been updated in a while:
 		toRemove = [addr for addr in self.opponents if self.opponents[addr].properties["lastUpdated"].get() > 5.0]
 		for addr in toRemove:
+			self.playerIds.pop(self.opponents[addr].properties["addr"], None)
 			self.opponents[addr].kill()
 			del self.opponents[addr]
 
-	def getPackagePosition(self, ent: cave.Entity, id: int=0) -> cave.network.Package:
+	def getPlayerId(self, addr: str) -> int:
+		"""
+		Returns the small id (1 to 255) of the player at this address, giving it the lowest free one.
+		If all of them are taken (the server is full), it returns None.
+		"""
+		if not addr in self.playerIds:
+			used = set(self.playerIds.values())
+			id = next((id for id in range(1, 256) if not id in used), None)
+			if id is None:
+				return None
+			self.playerIds[addr] = id
+		return self.playerIds[addr]
+
+	def getPlayerState(self, ent: cave.Entity, id: int=0) -> dict:
 		transf  = ent.getTransform()
 		transf2 = ent.getChild("Proto Mesh").getTransform()
 
-		pkg = cave.network.Package()
-		pkg.writeInt(id) # Player ID 
-
-		pkg.writeInt(0)  # Command for Position and Rotation!
-		pkg.writeVector3(transf.getPosition())
-		pkg.writeFloat(transf2.getWorldEuler().y)
-
-		return pkg
+		return {"id": id, "position": transf.getPosition(), "yaw": transf2.getWorldEuler().y}
+
+	def getPlayerPosition(self, ent: cave.Entity) -> cave.Vector3:
+		return ent.properties.get("targetPos", ent.getTransform().getPosition())
+
+	def getChannel(self, addr: str) -> SnapshotChannel:
+		if not addr in self.channels:
+			self.channels[addr] = SnapshotChannel(self.snapshotHistory)
+		return self.channels[addr]
+
+	def getRelevantStates(self, addr: str, world: dict) -> dict:
+		"""
+		Returns the states (quantized values, by id) of the players the peer at the address
+		should receive: the ones in its area of interest, except its own. The far ones
+		keep the values last sent to it between their updates (so they aren't in the deltas).
+		"""
+		ent = self.opponents.get(addr)
+		if self.interestRadius <= 0.0 or ent is None:
+			return {id: values for id, (entAddr, values) in world.items() if entAddr != addr}
+
+		lastStates = self.getChannel(addr).lastStates
+		farRadiusSq = self.farRadius * self.farRadius
+		states = {}
+		for id, distanceSq in self.interest.query(self.getPlayerPosition(ent), self.interestRadius):
+			entAddr, values = world[id]
+			if entAddr == addr:
+				continue
+
+			# Staggered by id, so the far players don't all update in the same snapshot:
+			if distanceSq > farRadiusSq and id in lastStates and (self.snapshotSeq + id) % self.farUpdateInterval:
+				values = lastStates[id]
+			states[id] = values
+		return states
+
+	def getMaxPayload(self) -> int:
+		"""
+		How many bytes of messages fit in a Package of maxPackageSize bytes (see makePackage).
+		"""
+		return getMaxPayload(self.maxPackageSize)
+
+	def queueMessage(self, addr: str, message: bytes, reliable: bool = False):
+		"""
+		Queues the message to the peer at the address (server), to be sent at the end of
+		the frame, batched with the others.
+		"""
+		if not addr in self.outboxes:
+			self.outboxes[addr] = PacketOutbox()
+		self.outboxes[addr].add(message, reliable)
+
+	def sendOutbox(self, outbox: PacketOutbox, send):
+		for data, reliable in outbox.flush(self.getMaxPayload(), self.clock.tick):
+			pkg = makePackage(data)
+			send(pkg, reliable=reliable)
+
+			self.bytesSent += pkg.getBufferSize()
+			self.packagesSent += 1
+
+	def getNetworkStats(self) -> dict:
+		"""
+		Returns the bytes, Packages and player states sent in the last tick (to all the
+		peers) and the bytes per player state, i.e., per player, per peer and per tick.
+		"""
+		return {
+			"bytesSent": self.bytesSent,
+			"packagesSent": self.packagesSent,
+			"statesSent": self.statesSent,
+			"bytesPerPlayer": self.bytesSent / self.statesSent if self.statesSent else 0.0,
+		}
 	
+	def getOpponent(self, id: str, addr: str) -> cave.Entity:
+		if not id in self.opponents:
+			ent = self.entity.getScene().addFromTemplate("Online Player")
+			ent.properties["hasControl"] = False
+			ent.properties["addr"] = addr
+			ent.properties["lastUpdated"] = cave.SceneTimer()
+			self.opponents[id] = ent
+
+		ent : cave.Entity = self.opponents[id]
+		ent.properties["lastUpdated"].reset()
+		return ent
+
+	def applySnapshot(self, addr: str, states: dict):
+		"""
+		Updates the opponents from a full snapshot (quantized player states, by id). The
+		players entering this client's area of interest (or joining) are spawned right at
+		their positions and the ones leaving it (or disconnecting) are despawned.
+		"""
+		for id, values in states.items():
+			entered = not str(id) in self.opponents
+			ent = self.getOpponent(str(id), addr)
+
+			# Only the players that changed since the last snapshot applied:
+			if entered or self.appliedStates.get(id) != values:
+				state = self.schema.dequantize(values)
+				ent.properties["targetPos"] = state["position"]
+				ent.properties["targetRot"] = state["yaw"]
+
+			if entered:
+				ent.getTransform().setPosition(state["position"])
+				ent.getTransform().setEuler(0, state["yaw"], 0)
+
+		for id in self.appliedStates:
+			if not id in states and str(id) in self.opponents:
+				self.opponents.pop(str(id)).kill()
+		self.appliedStates = states
+
 	def parsePackages(self, packages):
 		for pkg in packages:
 			addr = pkg.sender.getAddress()
-			id = pkg.package.readInt()
 
-			if id == 0:
-				id = addr
-			else:
-				id = str(id)
-
-			if not id in self.opponents:
-				ent = self.entity.getScene().addFromTemplate("Online Player")
-				ent.properties["hasControl"] = False
-				ent.properties["addr"] = addr
-				ent.properties["lastUpdated"] = cave.SceneTimer()
-				self.opponents[id] = ent
-
-			ent : cave.Entity = self.opponents[id]
-			ent.properties["lastUpdated"].reset()
-
-			cmd = pkg.package.readInt()
-
-			if cmd == 0: # Position and Rotation!
-				ent.properties["targetPos"] = pkg.package.readVector3()
-				ent.properties["targetRot"] = pkg.package.readFloat()
-
-	def updateServer(self):
+			# There is no way to refuse a connection, so the server ignores the players it has no id for:
+			if self.isServer() and self.getPlayerId(addr) is None:
+				continue
+
+			data = memoryview(readPackage(pkg.package))
+			offset = 0
+
+			# States from a packet older than the last one received from the sender (out of order):
+			stale = False
+
+			try:
+				while offset < len(data) and data[offset] != CMD_NONE:
+					cmd = data[offset]
+
+					if cmd == CMD_TICK:
+						tick = TICK_MESSAGE.unpack_from(data, offset)[1]
+						offset += TICK_MESSAGE.size
+						# Packets don't arrive a second late, so going further back means the sender restarted:
+						stale = 0 < self.remoteTicks.get(addr, tick) - tick < self.tickRate
+						if not stale:
+							self.remoteTicks[addr] = tick
+
+					elif cmd == CMD_STATES: # Position and Rotation!
+						states, offset = self.schema.decode(data, offset)
+						if stale:
+							continue
+						for state in states:
+							ent = self.getOpponent(addr if state["id"] == 0 else str(state["id"]), addr)
+							ent.properties["targetPos"] = state["position"]
+							ent.properties["targetRot"] = state["yaw"]
+
+					elif cmd == CMD_SNAPSHOT:
+						states, offset = self.receiver.decode(self.schema, data, offset)
+						if states is not None:
+							self.applySnapshot(addr, states)
+
+					elif cmd == CMD_ACK:
+						seq = ACK_MESSAGE.unpack_from(data, offset)[1]
+						offset += ACK_MESSAGE.size
+						if addr in self.channels:
+							self.channels[addr].ack(seq)
+
+					else:
+						break
+			except struct.error:
+				# Truncated Package, the rest of it is ignored:
+				pass
+
+	def updateServer(self, ticked: bool):
 		self.gameText.setText(f"[Server] {min(self.server.getNumClients(), len(self.opponents))} Clients Connected")
 
 		# Parsing all Incoming messages:
 		self.parsePackages(self.server.popPackages())		
 
-		# Sending all Positions back to all peers:
-		entities = [self.player] + list(self.opponents.values())
-		peers = self.server.getPeers()
-		for ent in entities:
-			entAddr = ent.properties.get("addr", "")
-			pkg = self.getPackagePosition(ent, hash(entAddr) & 0xFFFFFF)
-
-			for peer in peers:
-				if peer.getAddress() == entAddr:
-					continue
-				peer.send(pkg, reliable=False)
+		if ticked:
+			self.sendSnapshots()
 
 		# You MUST call this at the end of every 
 		# frame for the Server to function properly:
 		self.server.update()
 
-	def updateClient(self):
+	def sendSnapshots(self):
+		self.bytesSent = 0
+		self.packagesSent = 0
+		self.statesSent = 0
+
+		# The quantized state of every player and its address, by player id:
+		world = {}
+		self.interest.clear()
+		for ent in [self.player] + list(self.opponents.values()):
+			entAddr = ent.properties.get("addr", "")
+			id = self.getPlayerId(entAddr)
+			if id is None:
+				continue
+			world[id] = (entAddr, tuple(self.schema.quantize(self.getPlayerState(ent, id))))
+			self.interest.add(id, self.getPlayerPosition(ent))
+
+		# Sending the Positions back to all peers (only the players around them), as snapshot deltas
+		# numbered by the tick:
+		self.snapshotSeq = self.clock.tick & 0xFFFF
+		peers = self.server.getPeers()
+		for peer in peers:
+			addr = peer.getAddress()
+			if not addr in self.playerIds:
+				continue
+			states = self.getRelevantStates(addr, world)
+			self.statesSent += len(states)
+
+			for message in self.getChannel(addr).encode(self.schema, self.snapshotSeq, states, self.getMaxPayload()):
+				self.queueMessage(addr, message)
+
+		# Sending everything queued to each peer, in as few Packages as possible:
+		for peer in peers:
+			if peer.getAddress() in self.outboxes:
+				self.sendOutbox(self.outboxes[peer.getAddress()], peer.send)
+
+		# Forgetting the snapshots and messages of the disconnected peers:
+		addresses = set(peer.getAddress() for peer in peers)
+		for addr in [addr for addr in self.channels if not addr in addresses]:
+			del self.channels[addr]
+		for addr in [addr for addr in self.outboxes if not addr in addresses]:
+			del self.outboxes[addr]
+		for addr in [addr for addr in self.remoteTicks if not addr in addresses]:
+			del self.remoteTicks[addr]
+
+	def updateClient(self, ticked: bool):
 		if self.client.isConnected():
 			self.gameText.setText("[Client] Connected!")
 
@@ -132,9 +810,18 @@ class OnlineServer(cave.Component):
 			packages = [cave.network.ServerPackage(cave.network.ServerPeer(), pkg) for pkg in packages]
 			self.parsePackages(packages)
 
-			# Sending Client Position to Server:
-			pkg = self.getPackagePosition(self.player)
-			self.client.send(pkg, reliable=False)
+			if ticked:
+				self.bytesSent = 0
+				self.packagesSent = 0
+				self.statesSent = 1
+
+				# Acknowledging the last snapshot received, so the Server sends the next deltas against it:
+				if self.receiver.lastSeq is not None:
+					self.outbox.add(ACK_MESSAGE.pack(CMD_ACK, self.receiver.lastSeq))
+
+				# Sending Client Position to Server:
+				self.outbox.add(self.schema.encode([self.getPlayerState(self.player)]))
+				self.sendOutbox(self.outbox, self.client.send)
 		else:
 			self.gameText.setText("[Client] Connecting...")
 